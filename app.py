@@ -20,17 +20,29 @@ import streamlit as st
 from plotly.subplots import make_subplots
 
 from core.assets import POPULAR_ASSETS, AUTO_SCAN_TICKERS, get_asset_name, classify_asset
-from core.market_data import get_data_raw, validate_ticker, clear_cache
-from core.portfolio import get_portfolio_summary, get_historical_portfolio_value, compute_first_buy_dates
+from core.market_data import (
+    get_data_raw, iter_data, get_close_panel, session_returns, validate_ticker, clear_cache,
+)
+from core.portfolio import (
+    get_positions, get_realized_pnl, get_historical_portfolio_value, compute_first_buy_dates,
+    cost_basis_method,
+)
+from core.lots import COST_METHODS
 from core.storage import (
-    load_transactions, add_transaction, update_transaction, delete_transaction,
+    load_transactions, add_transaction, bulk_edit_transactions,
     load_watchlist, save_watchlist, add_to_watchlist, remove_from_watchlist,
     load_settings, set_setting, get_setting,
 )
 from core.excel_report import generate_excel_report
+from core import metrics
 from core.auth import is_authenticated, render_login_page, logout
-from engine.indicators import compute_indicators
-from engine.scoring import analyze, portfolio_advice, AnalysisResult
+from engine.indicators import compute_indicators_cached
+from engine.scoring import AnalysisResult
+from engine.result_cache import cached_analysis, cached_advice, scan_cached, stream_scan
+from engine.result_cache import invalidate as invalidate_results
+from engine.warmup import start_warmup
+from engine.snapshot import ScanSnapshot, read_snapshot
+from engine.snapshot import discard as discard_snapshot
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
@@ -64,6 +76,34 @@ def _start_telegram():
 
 _start_telegram()
 
+
+@st.cache_resource
+def _start_metrics():
+    port = os.environ.get("INVESTAI_METRICS_PORT", "").strip()
+    if not port:
+        return None
+    try:
+        return metrics.start_http_server(int(port))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Endpoint metriche non avviato: {e}")
+        return None
+
+_start_metrics()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Warm-up in background (singleton)
+# ─────────────────────────────────────────────────────────────────────────────
+@st.cache_resource
+def _start_warmup():
+    try:
+        return start_warmup()
+    except Exception as e:
+        logger.info(f"Warm-up non avviato: {e}")
+        return None
+
+_start_warmup()
+
 # ─────────────────────────────────────────────────────────────────────────────
 # CSS moderno
 # ─────────────────────────────────────────────────────────────────────────────
@@ -199,8 +239,42 @@ def _get_market_data(tickers: tuple[str, ...]) -> dict:
     return get_data_raw(list(tickers))
 
 def get_market_data(tickers: list[str]) -> dict:
+    # Snapshot del warm-up se copre tutti i ticker richiesti: nessun download sul percorso della richiesta
+    warm = _start_warmup()
+    if warm is not None:
+        frames = warm.frames_for(tickers)
+        if frames is not None:
+            return frames
     return _get_market_data(tuple(sorted(set(tickers))))
 
+def iter_market_data(tickers: list[str]):
+    """Come get_market_data, ma a gruppi appena disponibili (per le scansioni progressive)."""
+    warm = _start_warmup()
+    if warm is not None:
+        frames = warm.frames_for(tickers)
+        if frames is not None:
+            yield frames
+            return
+    yield from iter_data(tickers)
+
+def refresh_market_data(tickers: list[str]) -> None:
+    """Refresh forzato dei soli `tickers`: dati grezzi e risultati di analisi degli altri restano in cache."""
+    clear_cache(tickers)
+    invalidate_results(tickers)
+    discard_snapshot(tickers)
+    warm = _start_warmup()
+    if warm is not None:
+        warm.invalidate(tickers)
+        warm.request_refresh()
+    # Il wrapper st.cache_data è indicizzato per lista di ticker: si svuota solo lui,
+    # i download degli altri ticker restano nella cache di core.market_data
+    _get_market_data.clear()
+
+def scan_snapshot_for(tickers: list[str]) -> ScanSnapshot | None:
+    """Snapshot della scansione su disco (engine.snapshot) se valido e se copre tutti i `tickers`."""
+    snap = read_snapshot()
+    return snap if snap is not None and snap.covers(tickers) else None
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Helpers UI
@@ -472,6 +546,35 @@ def _create_price_chart(df: pd.DataFrame, ticker: str, trend_label: str) -> go.F
 # ─────────────────────────────────────────────────────────────────────────────
 # Pagina: Analisi Mercato
 # ─────────────────────────────────────────────────────────────────────────────
+def _render_scan_results(opportunities: list[AnalysisResult], analyzed: int, final: bool = False) -> None:
+    """Contatori e card delle opportunità trovate finora (ordinate per priorità e score)."""
+    if not opportunities:
+        if final:
+            st.info("Nessun segnale forte rilevato nella watchlist in questo momento.")
+        return
+    prio = {"BUY_STRONG": 3, "BUY": 2, "SELL_PARTIAL": 1}
+    ranked = sorted(opportunities, key=lambda r: (prio.get(r.signal, 0), r.confidence_score), reverse=True)
+    if final and any(r.signal == "BUY_STRONG" for r in ranked):
+        st.balloons()
+        st.success("💎 TROVATA UN'OPPORTUNITÀ D'ORO!")
+
+    # Riepilogo contatori
+    n_gold = sum(1 for r in ranked if r.signal == "BUY_STRONG")
+    n_buy  = sum(1 for r in ranked if r.signal == "BUY")
+    n_sell = sum(1 for r in ranked if r.signal == "SELL_PARTIAL")
+    ca, cb, cc, cd = st.columns(4)
+    ca.metric("💎 Golden",   n_gold)
+    cb.metric("🛒 Acquisto", n_buy)
+    cc.metric("💰 Sell",     n_sell)
+    cd.metric("📊 Analizzati", analyzed)
+
+    st.divider()
+    cols = st.columns(3)
+    for i, res in enumerate(ranked):
+        with cols[i % 3]:
+            render_opportunity_card(res)
+
+
 def page_market():
     st.title("📊 Analisi Mercato")
     _disclaimer()
@@ -496,56 +599,52 @@ def page_market():
             only_strong = st.toggle("Solo segnali forti (Score ≥ 55)", value=False)
 
         if scan_btn:
+            types = {t: classify_asset(t) for t in wl_tickers}
+            # Qualsiasi click (anche questo) riesegue lo script e interrompe la scansione in corso
+            st.button("⏹️ Interrompi", key="scan_stop")
             prog = st.progress(0, text="Download dati in corso…")
-            with st.spinner(""):
-                mdata = get_market_data(wl_tickers)
-            prog.progress(40, text="Calcolo indicatori…")
+            live = st.empty()
 
             opportunities: list[AnalysisResult] = []
-            for i, t in enumerate(wl_tickers):
-                if t not in mdata:
-                    continue
-                df_ind = compute_indicators(mdata[t])
-                if df_ind is None:
-                    continue
-                res = analyze(df_ind, t, classify_asset(t))
+            analyzed = 0
+
+            def on_progress(done: int) -> None:
+                # Conta ogni ticker elaborato, anche quelli senza dati sufficienti
+                nonlocal analyzed
+                analyzed = done
+                # Risultati parziali mostrati dopo un'interruzione (rerun)
+                st.session_state["scan_partial"] = (opportunities, analyzed)
+                prog.progress(min(99, int(100 * analyzed / max(n_assets, 1))),
+                              text=f"Analizzati {analyzed}/{n_assets}…")
+
+            def from_snapshot(snap):
+                for i, t in enumerate(wl_tickers, 1):
+                    on_progress(i)
+                    if t.upper() in snap.results:
+                        yield snap.results[t.upper()]
+
+            snap = scan_snapshot_for(wl_tickers)
+            results = (from_snapshot(snap) if snap is not None
+                       else stream_scan(iter_market_data(wl_tickers), asset_types=types, progress=on_progress))
+            for res in results:
                 if res.signal in ("BUY_STRONG", "BUY", "SELL_PARTIAL"):
                     if only_strong and res.confidence_score < 55:
                         continue
                     opportunities.append(res)
-                prog.progress(40 + int(55 * (i + 1) / max(len(wl_tickers), 1)))
+                    with live.container():
+                        _render_scan_results(opportunities, analyzed)
 
+            st.session_state.pop("scan_partial", None)
             prog.progress(100, text="Analisi completata!")
             time.sleep(0.3)
             prog.empty()
+            with live.container():
+                _render_scan_results(opportunities, analyzed, final=True)
 
-            if opportunities:
-                prio = {"BUY_STRONG": 3, "BUY": 2, "SELL_PARTIAL": 1}
-                opportunities.sort(
-                    key=lambda r: (prio.get(r.signal, 0), r.confidence_score),
-                    reverse=True,
-                )
-                if any(r.signal == "BUY_STRONG" for r in opportunities):
-                    st.balloons()
-                    st.success("💎 TROVATA UN'OPPORTUNITÀ D'ORO!")
-
-                # Riepilogo contatori
-                n_gold = sum(1 for r in opportunities if r.signal == "BUY_STRONG")
-                n_buy  = sum(1 for r in opportunities if r.signal == "BUY")
-                n_sell = sum(1 for r in opportunities if r.signal == "SELL_PARTIAL")
-                ca, cb, cc, cd = st.columns(4)
-                ca.metric("💎 Golden",   n_gold)
-                cb.metric("🛒 Acquisto", n_buy)
-                cc.metric("💰 Sell",     n_sell)
-                cd.metric("📊 Analizzati", len([t for t in wl_tickers if t in mdata]))
-
-                st.divider()
-                cols = st.columns(3)
-                for i, res in enumerate(opportunities):
-                    with cols[i % 3]:
-                        render_opportunity_card(res)
-            else:
-                st.info("Nessun segnale forte rilevato nella watchlist in questo momento.")
+        elif "scan_partial" in st.session_state:
+            opportunities, analyzed = st.session_state.pop("scan_partial")
+            st.warning(f"Scansione interrotta dopo {analyzed}/{n_assets} asset.")
+            _render_scan_results(opportunities, analyzed)
 
     st.divider()
 
@@ -571,11 +670,11 @@ def page_market():
         if selected_ticker not in mdata:
             st.error(f"Ticker '{selected_ticker}' non trovato o dati insufficienti.")
         else:
-            df_ind = compute_indicators(mdata[selected_ticker])
+            df_ind = compute_indicators_cached(mdata[selected_ticker], selected_ticker)
             if df_ind is None:
                 st.warning(f"Dati insufficienti per {selected_ticker} (servono ≥ 220 sessioni).")
             else:
-                res = analyze(df_ind, selected_ticker, classify_asset(selected_ticker))
+                res = cached_analysis(mdata[selected_ticker], selected_ticker, classify_asset(selected_ticker))
 
                 # Metriche principali
                 k1, k2, k3, k4 = st.columns(4)
@@ -607,6 +706,9 @@ def page_market():
                     b2.metric("60g PnL", f"{res.backtest_pnl60:+.1f}%", delta_color="off")
                     b3.metric("90g Win", f"{res.backtest_win90:.0f}%")
                     b3.metric("90g PnL", f"{res.backtest_pnl90:+.1f}%", delta_color="off")
+                    if res.backtest_n_signals:
+                        st.caption(f"{res.backtest_n_signals} segnali · Mediana 90g {res.backtest_median90:+.1f}% · "
+                                   f"Escursione avversa media 90g {res.backtest_mae90:.1f}%")
 
                     with st.expander("🔬 Ragionamento completo"):
                         if res.reasons:
@@ -628,11 +730,12 @@ def page_portfolio():
         st.title("💼 Portafoglio")
     with c_refresh:
         if st.button("🔄 Aggiorna", use_container_width=True):
-            st.cache_data.clear(); clear_cache(); time.sleep(0.3); st.rerun()
+            refresh_market_data(list(get_positions()) + [t["symbol"] for t in load_transactions()])
+            time.sleep(0.3); st.rerun()
 
     _disclaimer()
 
-    pf, _ = get_portfolio_summary()
+    pf = get_positions()
     raw_tx = load_transactions()
 
     if not pf:
@@ -676,6 +779,7 @@ def page_portfolio():
     m2.metric("📈 Utile Netto", f"€{pnl_tot:,.2f}", delta=f"{pnl_tot_pct:.2f}%")
     m3.metric("💰 Investito", f"€{tot_cost:,.2f}")
     m4.metric("📊 Asset", len(pf_enriched))
+    st.caption(f"Cost basis: {cost_basis_method().upper()} · P&L realizzato: €{get_realized_pnl():,.2f}")
 
     st.divider()
     st.subheader("💡 Strategia Operativa")
@@ -684,11 +788,10 @@ def page_portfolio():
                 if s in mdata]
     cols = st.columns(3)
     for i, (sym, dat) in enumerate(valid_pf):
-        df_ind = compute_indicators(mdata[sym])
-        if df_ind is None:
+        res = cached_analysis(mdata[sym], sym, classify_asset(sym))
+        if res is None:
             continue
-        adv = portfolio_advice(df_ind, dat["avg_price"], dat["cur_price"])
-        res = analyze(df_ind, sym, classify_asset(sym))
+        adv = cached_advice(mdata[sym], sym, dat["avg_price"], dat["cur_price"])
         with cols[i % 3]:
             render_portfolio_card(sym, dat, res, adv, tot_val)
 
@@ -698,7 +801,7 @@ def page_portfolio():
     with tab_chart:
         if raw_tx:
             with st.spinner("Elaborazione storico…"):
-                df_hist = get_historical_portfolio_value(raw_tx, mdata)
+                df_hist = get_historical_portfolio_value(raw_tx, mdata, prices=get_close_panel(all_tickers))
             if not df_hist.empty:
                 excel_bytes = generate_excel_report(df_hist, pf_enriched, raw_tx)
                 st.download_button("📥 Scarica Report Excel", data=excel_bytes,
@@ -756,6 +859,17 @@ def page_portfolio():
                         "P&L %":    st.column_config.NumberColumn(format="%.2f%%"),
                         "Data 1°":  st.column_config.DateColumn(format="DD/MM/YYYY"),
                     })
+            if len(tickers_owned) > 1:
+                with st.expander("🔗 Correlazioni (rendimenti giornalieri, 1 anno)"):
+                    rets = session_returns(get_close_panel(tickers_owned))
+                    rets = rets.loc[rets.index >= pd.Timestamp.today().normalize() - pd.DateOffset(years=1)]
+                    corr = rets.corr(min_periods=60)
+                    fig = go.Figure(go.Heatmap(z=corr.values, x=corr.columns, y=corr.index,
+                                               zmin=-1, zmax=1, colorscale="RdBu_r",
+                                               text=corr.round(2).values, texttemplate="%{text}"))
+                    fig.update_layout(height=60 + 40 * len(corr), template="plotly_white",
+                                      margin=dict(t=10, b=10, l=10, r=10))
+                    st.plotly_chart(fig, use_container_width=True)
         else:
             st.info("Portafoglio vuoto.")
 
@@ -783,7 +897,7 @@ def _render_transaction_tab(raw_tx: list[dict]) -> None:
                 add_transaction({"symbol": n_sym, "quantity": n_qty, "price": n_prc,
                                   "date": str(n_date), "type": n_type, "fee": n_fee})
                 st.success(f"✅ {n_type} {n_sym} aggiunto.")
-                st.cache_data.clear(); time.sleep(0.3); st.rerun()
+                time.sleep(0.3); st.rerun()
 
     if raw_tx:
         st.caption("💡 Modifica le righe e clicca 'Salva'. Spunta 'Elimina' per rimuovere una riga.")
@@ -806,18 +920,24 @@ def _render_transaction_tab(raw_tx: list[dict]) -> None:
             }, hide_index=True, use_container_width=True)
 
         if st.button("💾 Salva Modifiche", type="primary"):
-            for _, row in edited[edited["Elimina"]].iterrows():
-                delete_transaction(int(row["ID"]))
-            for _, row in edited[~edited["Elimina"]].iterrows():
-                update_transaction(int(row["ID"]), {
+            deletes = [int(i) for i in edited.loc[edited["Elimina"], "ID"]]
+            updates = {
+                int(row["ID"]): {
                     "symbol":   str(row["Ticker"]).upper(),
                     "quantity": float(row["Qta"]),
                     "price":    float(row["Prezzo"]),
                     "date":     str(row["Data"]),
                     "type":     str(row["Tipo"]).upper(),
                     "fee":      float(row["Fee"]) if row["Fee"] else 0.0,
-                })
-            st.success("✅ Salvato."); st.cache_data.clear(); time.sleep(0.3); st.rerun()
+                }
+                for _, row in edited[~edited["Elimina"]].iterrows()
+            }
+            n_upd, n_del = bulk_edit_transactions(deletes, updates)
+            if not n_upd and not n_del:
+                st.info("Nessuna modifica da salvare.")
+            else:
+                st.success(f"✅ Salvato ({n_upd} modificate, {n_del} eliminate).")
+                time.sleep(0.3); st.rerun()
     else:
         st.info("Nessuna transazione registrata.")
 
@@ -830,26 +950,36 @@ def page_advice():
     _disclaimer()
 
     if st.button("🔄 Aggiorna Analisi", type="primary", use_container_width=True):
-        st.cache_data.clear(); clear_cache(); st.rerun()
+        refresh_market_data(list(get_positions()) + AUTO_SCAN_TICKERS)
+        st.rerun()
 
     with st.spinner("Analisi portafoglio e mercato in corso…"):
-        pf, _ = get_portfolio_summary()
+        pf = get_positions()
         owned = list(pf.keys())
         all_t = list(set(owned + AUTO_SCAN_TICKERS))
-        mdata = get_market_data(all_t)
+        # Snapshot valido: nessun download, salvo posizioni con prezzo medio cambiato
+        snap  = scan_snapshot_for(all_t)
+        mdata = {} if snap is not None else get_market_data(all_t)
 
         sell_items: list[dict] = []
         buy_more:   list[dict] = []
         hold_items: list[dict] = []
         new_entry:  list[AnalysisResult] = []
+        analyzed = 0
 
         for ticker, pos in pf.items():
-            if ticker not in mdata: continue
-            df_ind = compute_indicators(mdata[ticker])
-            if df_ind is None: continue
-            cur = float(df_ind["Close"].iloc[-1])
-            adv = portfolio_advice(df_ind, pos["avg_price"], cur)
-            res = analyze(df_ind, ticker, classify_asset(ticker))
+            adv = snap.advice_for(ticker, pos["avg_price"]) if snap is not None else None
+            if adv is not None:
+                res = snap.results.get(ticker)
+            else:
+                if snap is not None:
+                    mdata.update(get_market_data([ticker]))
+                if ticker not in mdata: continue
+                res = cached_analysis(mdata[ticker], ticker, classify_asset(ticker))
+                if res is not None:
+                    adv = cached_advice(mdata[ticker], ticker, pos["avg_price"])
+            if res is None or adv is None: continue
+            analyzed += 1
             item = {"ticker": ticker, "title": adv.title, "advice": adv.advice,
                     "color": adv.color, "pnl": adv.pnl_pct, "res": res, "adv": adv}
 
@@ -862,11 +992,10 @@ def page_advice():
             else:
                 hold_items.append(item)
 
-        for ticker in AUTO_SCAN_TICKERS:
-            if ticker in owned or ticker not in mdata: continue
-            df_ind = compute_indicators(mdata[ticker])
-            if df_ind is None: continue
-            res = analyze(df_ind, ticker, classify_asset(ticker))
+        scan_t = [t for t in AUTO_SCAN_TICKERS if t not in owned]
+        types  = {t: classify_asset(t) for t in scan_t}
+        results = snap.results_for(scan_t) if snap is not None else scan_cached(mdata, scan_t, asset_types=types)
+        for res in results:
             if res.signal in ("BUY_STRONG","BUY"):
                 new_entry.append(res)
 
@@ -877,7 +1006,7 @@ def page_advice():
     c1.metric("🔴 Azioni Urgenti", len(sell_items) + len(buy_more))
     c2.metric("🔵 In Holding",     len(hold_items))
     c3.metric("🚀 Nuove Opp.",     len(new_entry))
-    c4.metric("📊 Analizzati",     len([t for t in owned if t in mdata]))
+    c4.metric("📊 Analizzati",     analyzed)
     st.divider()
 
     def _simple_card(item: dict, border_color: str) -> None:
@@ -942,7 +1071,7 @@ def page_advice():
 # ─────────────────────────────────────────────────────────────────────────────
 def page_settings():
     st.title("⚙️ Impostazioni")
-    tab_tg, tab_wl = st.tabs(["🔔 Telegram", "📋 Watchlist"])
+    tab_tg, tab_wl, tab_pf, tab_diag = st.tabs(["🔔 Telegram", "📋 Watchlist", "💼 Portafoglio", "🩺 Diagnostica"])
 
     with tab_tg:
         st.info("Configura Telegram per ricevere report automatici ogni mattina alle 08:00 UTC.")
@@ -1018,6 +1147,44 @@ def page_settings():
             if st.button("🔄 Carica asset predefiniti"):
                 save_watchlist(dict(POPULAR_ASSETS)); st.rerun()
 
+    with tab_pf:
+        labels = {"average": "Costo medio", "fifo": "FIFO (primi acquistati, primi venduti)",
+                  "lifo": "LIFO (ultimi acquistati, primi venduti)"}
+        current = cost_basis_method()
+        method = st.selectbox("Metodo di cost basis", COST_METHODS,
+                              index=COST_METHODS.index(current), format_func=labels.get,
+                              help="Determina quali lotti vengono chiusi da una vendita: "
+                                   "influisce su prezzo medio, investito e P&L realizzato.")
+        if method != current:
+            set_setting("cost_basis_method", method)
+            st.success(f"Metodo impostato: {labels[method]}")
+
+    with tab_diag:
+        st.info("Tempi per stadio (download, indicatori, analisi, pagine) raccolti in questo processo. "
+                "Il tempo di una pagina non coperto dagli altri stadi è rendering (grafici, widget).")
+        on = st.toggle("Raccogli metriche", value=metrics.is_enabled())
+        if on != metrics.is_enabled():
+            metrics.enable(on)
+        snap = metrics.snapshot()
+        if snap:
+            st.dataframe(pd.DataFrame([
+                {"Stadio": name, "Chiamate": s["count"], "Totale (s)": s["total_s"],
+                 "Media (ms)": s["mean_ms"], "Max (ms)": s["max_ms"], "Errori": s["errors"]}
+                for name, s in snap.items()
+            ]).sort_values("Totale (s)", ascending=False), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Nessuna misura ancora registrata.")
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            if st.button("🗑️ Azzera", use_container_width=True):
+                metrics.reset(); st.rerun()
+        with c2:
+            st.download_button("⬇️ JSON", metrics.to_json(), file_name="investai_metrics.json",
+                               mime="application/json", use_container_width=True)
+        with c3:
+            st.download_button("⬇️ Prometheus", metrics.to_prometheus(), file_name="investai_metrics.prom",
+                               mime="text/plain", use_container_width=True)
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main
@@ -1047,10 +1214,14 @@ def main():
         st.divider()
 
         wl_count = len(load_watchlist())
+        warm = _start_warmup()
+        warm_at = warm.status()["updated_at"] if warm is not None else None
+        warm_line = (f"<br>🔥 Dati pronti: <b style=\"color:white;\">{warm_at.astimezone():%H:%M}</b>"
+                     if warm_at is not None else "")
         st.markdown(f"""
         <div style="font-size:0.78rem;color:#9ca3af;padding:0 4px;">
           🗄️ Storage locale attivo<br>
-          📋 Watchlist: <b style="color:white;">{wl_count} asset</b>
+          📋 Watchlist: <b style="color:white;">{wl_count} asset</b>{warm_line}
         </div>
         """, unsafe_allow_html=True)
 
@@ -1066,12 +1237,16 @@ def main():
         </div>
         """, unsafe_allow_html=True)
 
+    # Tempo totale della pagina: la differenza con gli stadi dati/analisi è rendering (plotly, widget)
     if page == "📊 Analisi Mercato":
-        page_market()
+        with metrics.timed("ui.page_market"):
+            page_market()
     elif page == "💼 Portafoglio":
-        page_portfolio()
+        with metrics.timed("ui.page_portfolio"):
+            page_portfolio()
     elif page == "💡 Consigli AI":
-        page_advice()
+        with metrics.timed("ui.page_advice"):
+            page_advice()
     elif page == "⚙️ Impostazioni":
         page_settings()
 
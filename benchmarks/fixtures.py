@@ -0,0 +1,131 @@
+"""
+Benchmark Fixtures — InvestAI
+Generatori deterministici di dati sintetici: OHLCV da moto browniano
+geometrico con regimi di drift/volatilità e volume correlato ai movimenti,
+più un registro transazioni plausibile. Stesso seed → stessi dati, su
+qualsiasi macchina, senza rete.
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Ultima seduta fissa: i dati non dipendono dalla data di esecuzione
+ANCHOR_DATE = "2024-12-31"
+
+
+def synthetic_ohlcv(
+    n_bars: int,
+    seed: int = 0,
+    start_price: float = 100.0,
+    mu: float = 0.07,
+    sigma: float = 0.25,
+    end: str = ANCHOR_DATE,
+) -> pd.DataFrame:
+    """
+    Serie OHLCV giornaliera sintetica.
+
+    Parameters
+    ----------
+    n_bars      : numero di sedute
+    seed        : seme del generatore
+    start_price : prezzo iniziale
+    mu, sigma   : drift e volatilità annui di base; ogni ~120 sedute il regime
+                  cambia (trend rialzista/ribassista, vol alta/bassa) così da
+                  produrre sia segnali di ipervenduto sia trend di lungo periodo
+
+    Returns
+    -------
+    DataFrame con Open, High, Low, Close, Volume e DatetimeIndex di giorni lavorativi.
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1 / 252
+
+    n_regimes = n_bars // 120 + 1
+    reg_mu = mu + rng.normal(0.0, 0.35, n_regimes)
+    reg_sigma = sigma * rng.uniform(0.6, 1.8, n_regimes)
+    regime = np.minimum(np.arange(n_bars) // 120, n_regimes - 1)
+    m, s = reg_mu[regime], reg_sigma[regime]
+
+    log_ret = (m - 0.5 * s**2) * dt + s * np.sqrt(dt) * rng.standard_normal(n_bars)
+    close = start_price * np.exp(np.cumsum(log_ret))
+
+    prev = np.concatenate(([start_price], close[:-1]))
+    gap = s * np.sqrt(dt) * 0.3 * rng.standard_normal(n_bars)
+    open_ = prev * np.exp(gap)
+    span = s * np.sqrt(dt) * np.abs(rng.standard_normal((2, n_bars))) * 0.6
+    high = np.maximum(open_, close) * (1 + span[0])
+    low = np.minimum(open_, close) * (1 - span[1])
+
+    base_vol = rng.uniform(2e5, 5e6)
+    shock = np.abs(log_ret) / (s * np.sqrt(dt))
+    volume = np.round(base_vol * rng.lognormal(0.0, 0.35, n_bars) * (1 + 0.8 * shock))
+
+    index = pd.bdate_range(end=end, periods=n_bars)
+    return pd.DataFrame(
+        {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+        index=index,
+    )
+
+
+def ticker_names(n_tickers: int) -> list[str]:
+    return [f"SYN{i:04d}" for i in range(n_tickers)]
+
+
+def iter_universe(n_tickers: int, n_bars: int, seed: int = 0) -> Iterator[tuple[str, pd.DataFrame]]:
+    """(ticker, OHLCV) uno alla volta: per universi grandi senza tenerli tutti in memoria."""
+    for i, t in enumerate(ticker_names(n_tickers)):
+        yield t, synthetic_ohlcv(n_bars, seed=seed * 100_003 + i, start_price=20 + (i % 50) * 4)
+
+
+def synthetic_universe(n_tickers: int, n_bars: int, seed: int = 0) -> dict[str, pd.DataFrame]:
+    """{ ticker: OHLCV } per `n_tickers` ticker sintetici."""
+    return dict(iter_universe(n_tickers, n_bars, seed))
+
+
+def synthetic_transactions(
+    frames: dict[str, pd.DataFrame],
+    n_tx: int,
+    seed: int = 0,
+    tickers: Optional[Sequence[str]] = None,
+) -> list[dict]:
+    """
+    Registro transazioni sintetico sui ticker di `frames`: acquisti e vendite
+    parziali a prezzi di chiusura della serie, ordinato per data.
+
+    Le date vengono estratte prima e le posizioni simulate in ordine
+    cronologico: una vendita non supera mai la quantità posseduta a quella data.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(tickers if tickers is not None else frames)
+    draws = []
+    for _ in range(n_tx):
+        t = names[int(rng.integers(len(names)))]
+        pos = int(rng.integers(len(frames[t])))
+        draws.append((frames[t].index[pos], t, pos))
+    draws.sort(key=lambda d: d[0])   # sort stabile: stessa data → ordine di estrazione
+
+    held = {t: 0.0 for t in names}
+    out: list[dict] = []
+    for i, (ts, t, pos) in enumerate(draws):
+        price = float(frames[t]["Close"].iloc[pos])
+        if held[t] > 0 and rng.random() < 0.35:
+            qty = round(float(held[t] * rng.uniform(0.1, 0.8)), 4)
+            tx_type = "SELL"
+            held[t] -= qty
+        else:
+            qty = float(rng.integers(1, 50))
+            tx_type = "BUY"
+            held[t] += qty
+        out.append({
+            "id": i + 1,
+            "symbol": t,
+            "quantity": qty,
+            "price": round(price, 4),
+            "date": ts.strftime("%Y-%m-%d"),
+            "type": tx_type,
+            "fee": 1.0,
+        })
+    return out
@@ -0,0 +1,339 @@
+"""
+Benchmark Runner — InvestAI
+Misura il costo del percorso di analisi su dati sintetici deterministici
+(benchmarks.fixtures), completamente offline.
+
+Stadi:
+ - indicators : compute_indicators, per ticker
+ - analyze    : analyze (scoring + backtest), per ticker
+ - backtest   : _run_backtest, per ticker
+ - advice     : portfolio_advice, per ticker
+ - panel      : compute_indicators_frames sull'intero universo
+ - historical : get_historical_portfolio_value su un registro sintetico
+ - scan       : scansione end-to-end (get_data_raw servito da FixtureProvider
+                + scan_universe), con latenza/errori di rete simulati
+
+Per ogni taglia e stadio: throughput, latenza p50/p99, picco di memoria
+(tracemalloc, su un campione di chiamate separato dalle misure di tempo).
+I risultati vengono salvati in JSON; con --compare si confrontano con
+un'esecuzione precedente per individuare regressioni.
+
+Uso:
+    python -m benchmarks.run                       # taglie xs, s, m
+    python -m benchmarks.run --sizes xs,s --stages indicators,analyze
+    python -m benchmarks.run --sizes xl --out bench.json --compare old.json
+    python -m benchmarks.run --stages scan --latency 0.2 --failure-rate 0.05 --partial-rate 0.1
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import iter_universe, synthetic_transactions
+
+# taglia -> (ticker, barre per ticker)
+SIZES: dict[str, tuple[int, int]] = {
+    "xs": (1, 500),
+    "s":  (50, 1_000),
+    "m":  (200, 2_500),
+    "l":  (500, 5_000),
+    "xl": (2_000, 5_000),
+}
+DEFAULT_SIZES = ("xs", "s", "m")
+
+TICKER_STAGES   = ("indicators", "analyze", "backtest", "advice")
+UNIVERSE_STAGES = ("panel", "historical", "scan")
+STAGES = TICKER_STAGES + UNIVERSE_STAGES
+
+_HIST_MAX_TICKERS = 50    # ticker nel registro sintetico dello stadio "historical"
+_HIST_TX_PER_TICKER = 40
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+# ---------------------------------------------------------------------------
+# Misure
+# ---------------------------------------------------------------------------
+
+def _row(size: str, stage: str, n_tickers: int, n_bars: int,
+         latencies: list[float], bars: int, peak: int) -> dict:
+    lat = np.asarray(latencies)
+    total = float(lat.sum())
+    return {
+        "size":           size,
+        "stage":          stage,
+        "tickers":        n_tickers,
+        "bars":           n_bars,
+        "calls":          len(lat),
+        "total_s":        round(total, 4),
+        "calls_per_s":    round(len(lat) / total, 2) if total > 0 else None,
+        "bars_per_s":     round(bars / total) if total > 0 else None,
+        "p50_ms":         round(float(np.percentile(lat, 50)) * 1e3, 3),
+        "p99_ms":         round(float(np.percentile(lat, 99)) * 1e3, 3),
+        "peak_mem_mb":    round(peak / 2**20, 2),
+    }
+
+
+def _peak_memory(fn: Callable[[], object]) -> int:
+    """Picco di memoria allocata (byte) durante una chiamata."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _timed(fn: Callable[[], object]) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def _bench_scan(size: str, frames: dict[str, pd.DataFrame], n_bars: int,
+                repeat: int, seed: int, fixture: Optional[dict]) -> dict:
+    """
+    Scansione end-to-end come in page_market: download (FixtureProvider al posto
+    di Yahoo) + indicatori + scoring, con cache dati e indicatori svuotate a ogni giro.
+    """
+    import core.market_data as md
+    from core.providers import FixtureProvider, set_provider
+    from engine.indicators import clear_indicator_cache
+    from engine.scan import scan_universe
+
+    names = list(frames)
+    provider = FixtureProvider(frames=frames, seed=seed, **(fixture or {}))
+    previous = set_provider(provider)
+
+    def fn() -> tuple[int, int]:
+        md.clear_cache()
+        clear_indicator_cache()
+        data = md.get_data_raw(names)
+        analyzed = sum(1 for _ in scan_universe(data, names))
+        return analyzed, sum(len(df) for df in data.values())
+
+    try:
+        fn()
+        times, served, analyzed = [], 0, 0
+        for _ in range(repeat):
+            dt, (analyzed, bars) = _timed(fn)
+            times.append(dt)
+            served += bars
+        peak = _peak_memory(fn)
+    finally:
+        set_provider(previous)
+        md.clear_cache()
+
+    row = _row(size, "scan", len(names), n_bars, times, served, peak)
+    row["analyzed"] = analyzed
+    row["provider"] = dict(provider.stats)
+    return row
+
+
+def bench_size(size: str, stages: Sequence[str], seed: int = 0,
+               repeat: int = 3, mem_samples: int = 3, min_samples: int = 30,
+               fixture: Optional[dict] = None) -> list[dict]:
+    """
+    Esegue gli stadi richiesti su una taglia; ritorna una riga di risultati per stadio.
+    Con pochi ticker ogni chiamata per ticker viene ripetuta fino ad avere
+    almeno `min_samples` latenze (percentili significativi).
+    `fixture` sono le opzioni del FixtureProvider per lo stadio "scan"
+    (latency, failure_rate, partial_rate…).
+    """
+    from engine.indicators import compute_indicators
+    from engine.scoring import _run_backtest, analyze, portfolio_advice
+
+    n_tickers, n_bars = SIZES[size]
+    reps = max(1, -(-min_samples // n_tickers))
+    per_ticker = [s for s in stages if s in TICKER_STAGES]
+    lat: dict[str, list[float]] = {s: [] for s in per_ticker}
+    peak: dict[str, int] = {s: 0 for s in per_ticker}
+    keep_frames = any(s in UNIVERSE_STAGES for s in stages)
+    frames: dict[str, pd.DataFrame] = {}
+
+    # Stadi per ticker: un ticker alla volta, senza tenere in memoria gli indicatori
+    for i, (ticker, df_raw) in enumerate(iter_universe(n_tickers, n_bars, seed)):
+        if keep_frames:
+            frames[ticker] = df_raw
+        if not per_ticker:
+            continue
+        if i == 0:
+            compute_indicators(df_raw)   # warm-up (import lazy, cache interne di pandas)
+
+        dt, df_ind = _timed(lambda: compute_indicators(df_raw))
+        if "indicators" in lat:
+            lat["indicators"].append(dt)
+            lat["indicators"].extend(_timed(lambda: compute_indicators(df_raw))[0] for _ in range(reps - 1))
+            if i < mem_samples:
+                peak["indicators"] = max(peak["indicators"], _peak_memory(lambda: compute_indicators(df_raw)))
+        if df_ind is None:
+            continue
+
+        cur = float(df_ind["Close"].iloc[-1])
+        calls = {
+            "analyze":  lambda: analyze(df_ind, ticker),
+            "backtest": lambda: _run_backtest(df_ind),
+            "advice":   lambda: portfolio_advice(df_ind, cur * 0.9, cur),
+        }
+        for stage, fn in calls.items():
+            if stage not in lat:
+                continue
+            lat[stage].extend(_timed(fn)[0] for _ in range(reps))
+            if i < mem_samples:
+                peak[stage] = max(peak[stage], _peak_memory(fn))
+
+    rows = [
+        _row(size, s, n_tickers, n_bars, lat[s], len(lat[s]) * n_bars, peak[s])
+        for s in per_ticker if lat[s]
+    ]
+
+    if "panel" in stages:
+        from engine.panel import compute_indicators_frames
+        fn = lambda: compute_indicators_frames(frames)
+        fn()
+        times = [_timed(fn)[0] for _ in range(repeat)]
+        rows.append(_row(size, "panel", n_tickers, n_bars, times, n_tickers * n_bars * repeat,
+                         _peak_memory(fn)))
+
+    if "historical" in stages:
+        from core.portfolio import get_historical_portfolio_value
+        names = list(frames)[:_HIST_MAX_TICKERS]
+        txs = synthetic_transactions(frames, len(names) * _HIST_TX_PER_TICKER, seed=seed, tickers=names)
+        fn = lambda: get_historical_portfolio_value(txs, frames, method="average")
+        fn()
+        times = [_timed(fn)[0] for _ in range(repeat)]
+        rows.append(_row(size, "historical", len(names), n_bars, times, len(names) * n_bars * repeat,
+                         _peak_memory(fn)))
+        rows[-1]["transactions"] = len(txs)
+
+    if "scan" in stages:
+        rows.append(_bench_scan(size, frames, n_bars, repeat, seed, fixture))
+
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                             text=True, timeout=5, cwd=Path(__file__).resolve().parent)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _meta(seed: int, repeat: int) -> dict:
+    from engine import indicators
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit":    _git_commit(),
+        "python":    platform.python_version(),
+        "platform":  platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy":     np.__version__,
+        "pandas":    pd.__version__,
+        "pandas_ta": bool(getattr(indicators, "_HAS_TA", False)),
+        "seed":      seed,
+        "repeat":    repeat,
+    }
+
+
+def _print_table(rows: list[dict]) -> None:
+    cols = ["size", "stage", "tickers", "bars", "calls", "calls_per_s", "p50_ms", "p99_ms", "peak_mem_mb"]
+    df = pd.DataFrame(rows)[cols]
+    with pd.option_context("display.width", 160, "display.max_columns", 20):
+        print(df.to_string(index=False))
+
+
+def compare(current: list[dict], baseline: list[dict], threshold: float) -> list[dict]:
+    """
+    Confronta p50 e picco di memoria con un'esecuzione precedente.
+    Ritorna le righe peggiorate oltre `threshold` (es. 0.2 = +20%).
+    """
+    base = {(r["size"], r["stage"]): r for r in baseline}
+    regressions = []
+    print(f"\n{'size':<5} {'stage':<11} {'p50 Δ':>9} {'mem Δ':>9}")
+    for r in current:
+        b = base.get((r["size"], r["stage"]))
+        if b is None:
+            continue
+        d_lat = r["p50_ms"] / b["p50_ms"] - 1 if b["p50_ms"] else 0.0
+        d_mem = r["peak_mem_mb"] / b["peak_mem_mb"] - 1 if b["peak_mem_mb"] else 0.0
+        flag = "  ⚠" if d_lat > threshold or d_mem > threshold else ""
+        print(f"{r['size']:<5} {r['stage']:<11} {d_lat:>+8.1%} {d_mem:>+8.1%}{flag}")
+        if flag:
+            regressions.append({**r, "p50_delta": d_lat, "mem_delta": d_mem})
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline del motore di analisi InvestAI.")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES),
+                        help=f"taglie separate da virgola ({', '.join(f'{k}={v[0]}x{v[1]}' for k, v in SIZES.items())})")
+    parser.add_argument("--stages", default=",".join(STAGES), help="stadi separati da virgola")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="ripetizioni degli stadi sull'intero universo")
+    parser.add_argument("--mem-samples", type=int, default=3, help="chiamate per ticker misurate con tracemalloc")
+    parser.add_argument("--min-samples", type=int, default=30, help="latenze minime per gli stadi per ticker")
+    parser.add_argument("--latency", type=float, default=0.0, help="scan: secondi di latenza per richiesta")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="scan: quota di richieste fallite")
+    parser.add_argument("--partial-rate", type=float, default=0.0, help="scan: quota di ticker mancanti nei batch")
+    parser.add_argument("--out", default=None, help="file JSON dei risultati (default: benchmarks/results/)")
+    parser.add_argument("--compare", default=None, help="JSON di un'esecuzione precedente")
+    parser.add_argument("--threshold", type=float, default=0.2, help="soglia di regressione per --compare")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES] + [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"valori non riconosciuti: {', '.join(unknown)}")
+
+    warnings.filterwarnings("ignore", category=UserWarning)
+    fixture = {"latency": args.latency, "failure_rate": args.failure_rate,
+               "partial_rate": args.partial_rate}
+    rows: list[dict] = []
+    for size in sizes:
+        n_tickers, n_bars = SIZES[size]
+        print(f"[bench] taglia {size}: {n_tickers} ticker × {n_bars} barre", file=sys.stderr)
+        rows.extend(bench_size(size, stages, seed=args.seed, repeat=args.repeat,
+                               mem_samples=args.mem_samples, min_samples=args.min_samples,
+                               fixture=fixture))
+
+    _print_table(rows)
+    report = {"meta": _meta(args.seed, args.repeat), "results": rows}
+
+    out = Path(args.out) if args.out else RESULTS_DIR / (
+        f"bench-{datetime.now():%Y%m%d-%H%M%S}" + (f"-{report['meta']['commit']}" if report["meta"]["commit"] else "") + ".json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\n[bench] risultati salvati in {out}", file=sys.stderr)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        if compare(rows, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,7 +9,10 @@ from datetime import date
 
 import pandas as pd
 
+from core.metrics import timed
 
+
+@timed("report.excel")
 def generate_excel_report(
     df_hist: pd.DataFrame,
     current_portfolio: dict,
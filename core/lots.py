@@ -0,0 +1,246 @@
+"""
+Lot Engine — InvestAI
+Cost basis per simbolo con metodo selezionabile:
+ - "average": costo medio ponderato (comportamento storico di InvestAI)
+ - "fifo":    le vendite chiudono prima i lotti più vecchi
+ - "lifo":    le vendite chiudono prima i lotti più recenti
+
+I lotti sono tenuti in array con somme cumulative di quantità e costo: il
+costo delle prime `x` unità si ottiene con una searchsorted, quindi ogni
+vendita costa O(log n) anche con decine di migliaia di acquisti parziali,
+senza scorrere né modificare i singoli lotti.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+COST_METHODS: tuple[str, ...] = ("average", "fifo", "lifo")
+DEFAULT_METHOD = "average"
+
+_EPS = 1e-9   # quantità sotto questa soglia = posizione chiusa
+
+
+def resolve_method(method: Optional[str]) -> str:
+    """Normalizza il nome del metodo; valori sconosciuti → DEFAULT_METHOD."""
+    m = str(method or DEFAULT_METHOD).strip().lower()
+    return m if m in COST_METHODS else DEFAULT_METHOD
+
+
+class Lots:
+    """
+    Lotti aperti di un singolo simbolo.
+
+    Per FIFO/LIFO il lotto i ha costo unitario unit[i] (fee d'acquisto inclusa);
+    cum_qty[i] e cum_cost[i] sono le somme cumulative fino al lotto i compreso.
+    FIFO: le unità vendute sono un prefisso (`_head` unità già consumate).
+    LIFO: le vendite troncano la coda dello stack.
+    """
+
+    __slots__ = ("method", "realized", "_qty", "_cost", "_n", "_head",
+                 "_cum_qty", "_cum_cost", "_unit")
+
+    def __init__(self, method: str = DEFAULT_METHOD, capacity: int = 8):
+        self.method = resolve_method(method)
+        self.realized = 0.0    # P&L realizzato (proventi netti − costo dei lotti chiusi)
+        self._qty = 0.0        # solo "average"
+        self._cost = 0.0
+        self._n = 0
+        self._head = 0.0
+        self._cum_qty = np.zeros(capacity)
+        self._cum_cost = np.zeros(capacity)
+        self._unit = np.zeros(capacity)
+
+    # ------------------------------------------------------------------
+    # Stato
+    # ------------------------------------------------------------------
+
+    @property
+    def qty(self) -> float:
+        if self.method == "average":
+            return self._qty
+        if self._n == 0:
+            return 0.0
+        return float(self._cum_qty[self._n - 1]) - self._head
+
+    @property
+    def cost(self) -> float:
+        """Cost basis residuo delle unità ancora in portafoglio."""
+        if self.method == "average":
+            return self._cost
+        if self._n == 0:
+            return 0.0
+        return max(0.0, float(self._cum_cost[self._n - 1]) - self._cost_upto(self._head))
+
+    @property
+    def avg_price(self) -> float:
+        q = self.qty
+        return self.cost / q if q > _EPS else 0.0
+
+    def unrealized(self, price: float) -> float:
+        """P&L non realizzato al prezzo `price`."""
+        return self.qty * price - self.cost
+
+    def open_lots(self) -> list[tuple[float, float]]:
+        """Lotti aperti come (quantità, costo unitario), dal più vecchio."""
+        if self.method == "average":
+            return [(self._qty, self.avg_price)] if self._qty > _EPS else []
+        out = []
+        prev = 0.0
+        for i in range(self._n):
+            lo = max(prev, self._head)
+            hi = float(self._cum_qty[i])
+            if hi - lo > _EPS:
+                out.append((hi - lo, float(self._unit[i])))
+            prev = hi
+        return out
+
+    # ------------------------------------------------------------------
+    # Operazioni
+    # ------------------------------------------------------------------
+
+    def buy(self, qty: float, price: float, fee: float = 0.0) -> None:
+        if qty <= 0:
+            return
+        cost = qty * price + fee
+        if self.method == "average":
+            self._qty += qty
+            self._cost += cost
+            return
+        if self._n == len(self._cum_qty):
+            self._grow()
+        i = self._n
+        base_q = self._cum_qty[i - 1] if i else 0.0
+        base_c = self._cum_cost[i - 1] if i else 0.0
+        self._cum_qty[i] = base_q + qty
+        self._cum_cost[i] = base_c + cost
+        self._unit[i] = cost / qty
+        self._n += 1
+
+    def sell(self, qty: float, price: float, fee: float = 0.0) -> float:
+        """
+        Vende fino a `qty` unità (non oltre quelle possedute).
+        Ritorna il P&L realizzato dalla vendita.
+        """
+        held = self.qty
+        sold = min(qty, held)
+        if sold <= 0:
+            return 0.0
+
+        if self.method == "average":
+            removed = self._cost / self._qty * sold if self._qty > _EPS else 0.0
+            self._cost = max(0.0, self._cost - removed)
+            self._qty = max(0.0, self._qty - sold)
+        elif self.method == "fifo":
+            removed = self._cost_upto(self._head + sold) - self._cost_upto(self._head)
+            self._head += sold
+        else:  # lifo
+            top = float(self._cum_qty[self._n - 1])
+            target = top - sold
+            removed = float(self._cum_cost[self._n - 1]) - self._cost_upto(target)
+            self._truncate(target)
+
+        pnl = sold * price - fee - removed
+        self.realized += pnl
+        if self.qty <= _EPS:
+            self._reset()
+        return pnl
+
+    # ------------------------------------------------------------------
+    # Interni
+    # ------------------------------------------------------------------
+
+    def _cost_upto(self, x: float) -> float:
+        """Costo cumulato delle prime `x` unità acquistate (interpolato nel lotto)."""
+        n = self._n
+        if n == 0 or x <= 0:
+            return 0.0
+        cq = self._cum_qty[:n]
+        k = int(np.searchsorted(cq, x, side="left"))
+        if k >= n:
+            return float(self._cum_cost[n - 1])
+        prev_q = cq[k - 1] if k else 0.0
+        prev_c = self._cum_cost[k - 1] if k else 0.0
+        return float(prev_c + (x - prev_q) * self._unit[k])
+
+    def _truncate(self, target: float) -> None:
+        """LIFO: restano le prime `target` unità; l'ultimo lotto può restare parziale."""
+        n = self._n
+        k = int(np.searchsorted(self._cum_qty[:n], target, side="left"))
+        if k >= n:
+            return
+        prev_q = self._cum_qty[k - 1] if k else 0.0
+        if target - prev_q <= _EPS:
+            self._n = k
+            return
+        self._cum_cost[k] = self._cost_upto(target)
+        self._cum_qty[k] = target
+        self._n = k + 1
+
+    def _grow(self) -> None:
+        cap = len(self._cum_qty) * 2
+        for name in ("_cum_qty", "_cum_cost", "_unit"):
+            arr = np.zeros(cap)
+            arr[: self._n] = getattr(self, name)[: self._n]
+            setattr(self, name, arr)
+
+    def _reset(self) -> None:
+        self._qty = self._cost = 0.0
+        self._n = 0
+        self._head = 0.0
+
+
+class Ledger:
+    """Lotti di tutti i simboli; applica le transazioni in ordine cronologico."""
+
+    def __init__(self, method: str = DEFAULT_METHOD):
+        self.method = resolve_method(method)
+        self.lots: dict[str, Lots] = {}
+
+    def apply(self, tx: dict) -> Optional[dict]:
+        """
+        Applica una transazione. Ritorna la transazione normalizzata,
+        oppure None se non valida (simbolo mancante, quantità o prezzo ≤ 0).
+        """
+        sym = str(tx.get("symbol", "")).upper()
+        qty = float(tx.get("quantity", 0.0))
+        price = float(tx.get("price", 0.0))
+        tx_type = str(tx.get("type", "BUY")).upper()
+        fee = float(tx.get("fee", 0.0))
+
+        if not sym or qty <= 0 or price <= 0:
+            return None
+
+        lots = self.lots.get(sym)
+        if lots is None:
+            lots = self.lots[sym] = Lots(self.method)
+        if tx_type == "BUY":
+            lots.buy(qty, price, fee)
+        elif tx_type == "SELL":
+            lots.sell(qty, price, fee)
+
+        return {
+            "id": tx.get("id"),
+            "symbol": sym,
+            "quantity": qty,
+            "price": price,
+            "date": str(tx.get("date", "")),
+            "type": tx_type,
+            "fee": fee,
+        }
+
+    def positions(self, include_closed: bool = False) -> dict[str, dict]:
+        """{ ticker: { qty, total_cost, avg_price, realized_pnl } }; di default solo posizioni aperte."""
+        out = {}
+        for sym, lots in self.lots.items():
+            q = lots.qty
+            if q <= 1e-6 and not include_closed:
+                continue
+            out[sym] = {
+                "qty": q,
+                "total_cost": lots.cost,
+                "avg_price": lots.avg_price,
+                "realized_pnl": lots.realized,
+            }
+        return out
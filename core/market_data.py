@@ -2,21 +2,37 @@
 Market Data Layer — InvestAI
 Download dati da Yahoo Finance con:
  - cache in-process (TTL 10 min)
- - retry esponenziale
+ - store OHLCV persistente su disco (data/prices/) con refresh incrementale della coda
+ - download concorrente (batch in parallelo) con rate limit token-bucket
+ - retry esponenziale, indipendente per ogni ticker
  - timeout
  - gestione ticker delistati / mercati chiusi / simboli errati
+ - sorgente dati sostituibile (core.providers: yfinance o fixture offline)
  - nessun download doppio per lo stesso ticker
+ - pannello Close allineato (sedute × ticker) condiviso tra i consumatori
 """
 from __future__ import annotations
 
 import logging
 import time
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterator, Optional
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
+
+from core.metrics import timed
+from core.providers import get_provider
+from core.price_store import (
+    adjustment_changed,
+    load_prices,
+    merge_tail,
+    same_prices,
+    save_prices,
+    tail_start,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +42,7 @@ logger = logging.getLogger(__name__)
 _cache_lock = threading.Lock()
 _cache: dict[str, tuple[pd.DataFrame, datetime]] = {}   # ticker -> (df, timestamp)
 _CACHE_TTL_SECONDS = 600   # 10 minuti
+_data_version = 0          # incrementato a ogni nuovo dato in cache (invalida i pannelli)
 
 
 def _get_cached(ticker: str) -> Optional[pd.DataFrame]:
@@ -41,14 +58,86 @@ def _get_cached(ticker: str) -> Optional[pd.DataFrame]:
 
 
 def _set_cached(ticker: str, df: pd.DataFrame) -> None:
+    global _data_version
     with _cache_lock:
         _cache[ticker] = (df, datetime.utcnow())
+        _data_version += 1
+
+
+def clear_cache(tickers: Optional[list[str]] = None) -> None:
+    """
+    Svuota la cache manualmente (es. dopo un refresh forzato): tutta, oppure
+    solo per `tickers`, che verranno riscaricati alla prossima richiesta.
+    """
+    global _data_version
+    names = None if tickers is None else {t.strip().upper() for t in tickers if t}
+    with _cache_lock:
+        if names is None:
+            _cache.clear()
+            _data_version += 1
+        else:
+            # I pannelli degli altri ticker restano validi: niente bump della versione globale
+            for t in names:
+                _cache.pop(t, None)
+    with _panel_lock:
+        if names is None:
+            _panels.clear()
+        else:
+            for key in [k for k in _panels if names.intersection(k[0])]:
+                del _panels[key]
 
 
-def clear_cache() -> None:
-    """Svuota la cache manualmente (es. dopo un refresh forzato)."""
+def data_version() -> int:
+    """Contatore dei refresh dei dati: cambia quando un ticker viene (ri)scaricato."""
     with _cache_lock:
-        _cache.clear()
+        return _data_version
+
+
+# ---------------------------------------------------------------------------
+# Scheduler: richieste concorrenti con rate limit
+# ---------------------------------------------------------------------------
+
+_MAX_INFLIGHT_BATCHES = 4     # batch yf.download contemporanei
+_MAX_INFLIGHT_SINGLES = 8     # download/retry singoli contemporanei
+_RATE_PER_SECOND      = 2.0   # richieste medie al secondo verso Yahoo
+_RATE_BURST           = 4     # richieste consecutive ammesse a bucket pieno
+
+
+class _TokenBucket:
+    """Rate limiter token-bucket condiviso da tutti i thread di download."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_bucket = _TokenBucket(_RATE_PER_SECOND, _RATE_BURST)
+
+# Pool separati: un batch in attesa dei suoi retry singoli non può bloccare i singoli stessi
+_batch_pool  = ThreadPoolExecutor(max_workers=_MAX_INFLIGHT_BATCHES, thread_name_prefix="md-batch")
+_single_pool = ThreadPoolExecutor(max_workers=_MAX_INFLIGHT_SINGLES, thread_name_prefix="md-single")
+
+def _yf_download(*args, **kwargs) -> pd.DataFrame:
+    """Download dal provider attivo, passando dal rate limiter se il provider è remoto."""
+    provider = get_provider()
+    if provider.rate_limited:
+        _bucket.acquire()
+    return provider.download(*args, **kwargs)
 
 
 # ---------------------------------------------------------------------------
@@ -58,22 +147,76 @@ def clear_cache() -> None:
 _PERIOD = "2y"
 _RETRY_ATTEMPTS = 3
 _RETRY_BACKOFF  = 2.0   # secondi, raddoppia ad ogni tentativo
+_TAIL_OVERLAP_DAYS = 5  # giorni riscaricati prima dell'ultima barra salvata
+_BATCH_SIZE = 30        # ticker per chiamata batch
+_STREAM_BATCH_SIZE = 10 # iter_data: batch più piccoli, primi risultati prima
 
 
-def _download_single(ticker: str) -> Optional[pd.DataFrame]:
+def _window_kwargs(stored: list[pd.DataFrame]) -> dict:
     """
-    Scarica 2 anni di dati per un singolo ticker.
+    Parametri temporali per yf.download: finestra completa se non c'è storico
+    su disco, altrimenti solo la coda a partire dalla barra salvata più vecchia.
+    """
+    if not stored:
+        return {"period": _PERIOD}
+    start = min(tail_start(df, _TAIL_OVERLAP_DAYS) for df in stored)
+    return {"start": start.strftime("%Y-%m-%d")}
+
+
+def _finalize(ticker: str, fresh: Optional[pd.DataFrame],
+              stored: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """
+    Pulisce, unisce allo storico su disco, salva (solo se cambiato) e mette in cache.
+    Se la coda rivela un ribasamento dei prezzi (split/dividendo) lo storico
+    viene riscaricato per intero invece di essere unito.
+    """
+    if fresh is not None and not fresh.empty and "Close" in fresh.columns:
+        fresh = fresh.dropna(subset=["Close"])
+    else:
+        fresh = None
+
+    if stored is not None and adjustment_changed(stored, fresh):
+        logger.info(f"[market] {ticker}: prezzi rettificati dal provider, riscarico lo storico completo.")
+        full = _download_single(ticker)
+        if full is not None:
+            return full
+        logger.warning(f"[market] {ticker}: riscaricamento completo fallito, unisco la coda.")
+
+    if stored is not None:
+        df = merge_tail(stored, fresh)
+    elif fresh is not None:
+        df = fresh
+    else:
+        logger.debug(f"[market] {ticker}: nessun dato restituito.")
+        return None
+
+    if len(df) < 30:
+        logger.debug(f"[market] {ticker}: dati insufficienti ({len(df)} righe).")
+        return None
+
+    if get_provider().persistent and (stored is None or not same_prices(df, stored)):
+        save_prices(ticker, df)
+    _set_cached(ticker, df)
+    return df
+
+
+def _download_single(ticker: str, stored: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+    """
+    Scarica 2 anni di dati per un singolo ticker (o solo la coda mancante
+    se `stored` contiene lo storico su disco).
     Ritorna None se il ticker non esiste o i dati sono insufficienti.
     """
     cached = _get_cached(ticker)
     if cached is not None:
         return cached
 
+    window = _window_kwargs([stored] if stored is not None else [])
+
     for attempt in range(1, _RETRY_ATTEMPTS + 1):
         try:
-            raw = yf.download(
+            raw = _yf_download(
                 ticker,
-                period=_PERIOD,
+                **window,
                 progress=False,
                 auto_adjust=False,
                 timeout=15,
@@ -83,76 +226,230 @@ def _download_single(ticker: str) -> Optional[pd.DataFrame]:
             if isinstance(raw.columns, pd.MultiIndex):
                 raw.columns = raw.columns.get_level_values(0)
 
-            if raw.empty or "Close" not in raw.columns:
-                logger.debug(f"[market] {ticker}: nessun dato restituito.")
-                return None
-
-            raw = raw.dropna(subset=["Close"])
-
-            if len(raw) < 30:
-                logger.debug(f"[market] {ticker}: dati insufficienti ({len(raw)} righe).")
-                return None
-
-            _set_cached(ticker, raw)
-            return raw
+            return _finalize(ticker, raw, stored)
 
         except Exception as e:
-            wait = _RETRY_BACKOFF ** attempt
+            backoff = get_provider().retry_backoff
+            wait = (_RETRY_BACKOFF if backoff is None else backoff) ** attempt
             logger.warning(f"[market] {ticker} tentativo {attempt}/{_RETRY_ATTEMPTS}: {e}. Attendo {wait:.1f}s")
             if attempt < _RETRY_ATTEMPTS:
                 time.sleep(wait)
 
+    if stored is not None:
+        # Meglio uno storico di qualche giorno fa che nessun dato
+        logger.warning(f"[market] {ticker}: refresh fallito, uso lo storico su disco.")
+        _set_cached(ticker, stored)
+        return stored
     return None
 
 
+@timed("market.get_data_raw")
 def get_data_raw(tickers: list[str]) -> dict[str, pd.DataFrame]:
     """
     Scarica i dati per una lista di ticker.
     Ritorna { ticker: DataFrame } per i ticker scaricati con successo.
-    I ticker già in cache non vengono riscaricati.
+    I ticker già in cache non vengono riscaricati; per quelli con storico
+    su disco viene scaricata solo la coda dall'ultima barra salvata.
+    Se un altro thread sta già scaricando un ticker, si attende il suo
+    risultato invece di ripetere il download.
     """
     if not tickers:
         return {}
 
     unique = list(dict.fromkeys(t.strip().upper() for t in tickers if t))
 
-    # Separa ticker già in cache da quelli da scaricare
     result: dict[str, pd.DataFrame] = {}
-    to_download: list[str] = []
-
+    missing: list[str] = []
     for t in unique:
         cached = _get_cached(t)
         if cached is not None:
             result[t] = cached
         else:
-            to_download.append(t)
+            missing.append(t)
 
-    if not to_download:
+    if not missing:
         return result
 
+    owned, waiting = _claim(missing)
+    fetched: dict[str, pd.DataFrame] = {}
+    try:
+        fetched = _fetch(owned)
+    finally:
+        _release(owned, fetched)
+    result.update(fetched)
+
+    for t, fut in waiting.items():
+        df = fut.result()
+        if df is not None:
+            result[t] = df
+
+    return result
+
+
+def iter_data(
+    tickers: list[str], batch_size: int = _STREAM_BATCH_SIZE,
+) -> Iterator[dict[str, Optional[pd.DataFrame]]]:
+    """
+    Come get_data_raw, ma in streaming: produce gruppi { ticker: DataFrame o None }
+    appena disponibili — prima i ticker in cache, poi ogni batch appena scaricato
+    (None = ticker non scaricabile).
+
+    Interrompere l'iterazione non annulla i download già avviati: terminano in
+    background, finiscono in cache e sbloccano gli altri thread in attesa.
+    """
+    unique = list(dict.fromkeys(t.strip().upper() for t in tickers if t))
+    cached = {t: df for t in unique if (df := _get_cached(t)) is not None}
+    if cached:
+        yield cached
+    missing = [t for t in unique if t not in cached]
+    if not missing:
+        return
+
+    owned, waiting = _claim(missing)
+    try:
+        ready, jobs = _submit_fetch(owned, batch_size)
+    except BaseException:
+        _release(owned, {})
+        raise
+    _release(list(ready), ready)
+    # Ogni batch libera i propri ticker appena termina, anche se il chiamante smette di iterare
+    for batch, fut, part in jobs:
+        fut.add_done_callback(lambda _f, b=batch, p=part: _release(b, p))
+    if ready:
+        yield ready
+
+    pending: dict[Future, list[str]] = {fut: batch for batch, fut, _ in jobs}
+    parts = {fut: part for _, fut, part in jobs}
+    pending.update({fut: [t] for t, fut in waiting.items()})
+    for fut in as_completed(pending):
+        names = pending[fut]
+        if fut in parts:
+            try:
+                fut.result()
+            except Exception as e:
+                logger.warning(f"[market] Batch interrotto: {e}")
+            yield {t: parts[fut].get(t) for t in names}
+        else:
+            yield {names[0]: fut.result()}
+
+
+# ---------------------------------------------------------------------------
+# Single-flight: un solo download in corso per ticker
+# ---------------------------------------------------------------------------
+# Sessioni Streamlit, polling Telegram e scheduler possono mancare la cache
+# nello stesso istante (tipicamente alle 08:00): il primo thread "possiede"
+# il download, gli altri attendono la stessa Future.
+
+_inflight_lock = threading.Lock()
+_inflight: dict[str, Future] = {}
+
+
+def _claim(tickers: list[str]) -> tuple[list[str], dict[str, Future]]:
+    """Ritorna (ticker da scaricare in proprio, { ticker: Future di un altro thread })."""
+    owned: list[str] = []
+    waiting: dict[str, Future] = {}
+    with _inflight_lock:
+        for t in tickers:
+            fut = _inflight.get(t)
+            if fut is None:
+                _inflight[t] = Future()
+                owned.append(t)
+            else:
+                waiting[t] = fut
+    return owned, waiting
+
+
+def _release(tickers: list[str], result: dict[str, pd.DataFrame]) -> None:
+    """Pubblica i risultati (None = fallito) e libera i ticker."""
+    with _inflight_lock:
+        futures = [(_inflight.pop(t, None), result.get(t)) for t in tickers]
+    for fut, df in futures:
+        if fut is not None:
+            fut.set_result(df)
+
+
+def _submit_fetch(
+    tickers: list[str], batch_size: int = _BATCH_SIZE,
+) -> tuple[dict[str, pd.DataFrame], list[tuple[list[str], Future, dict[str, pd.DataFrame]]]]:
+    """
+    Avvia il download dei ticker posseduti da questo thread.
+    Ritorna (ticker già in cache, job [(batch, Future, risultati del batch)]).
+    """
+    result: dict[str, pd.DataFrame] = {}
+    stored: dict[str, pd.DataFrame] = {}
+    cold: list[str] = []
+    persistent = get_provider().persistent
+
+    # Separa ticker già in cache, ticker con storico su disco e ticker da scaricare da zero.
+    # La cache va ricontrollata: un download concorrente può essere appena terminato.
+    for t in tickers:
+        cached = _get_cached(t)
+        if cached is not None:
+            result[t] = cached
+            continue
+        on_disk = load_prices(t) if persistent else None
+        if on_disk is not None:
+            stored[t] = on_disk
+        else:
+            cold.append(t)
+
     # Batch download per ridurre le chiamate HTTP
     # yfinance è più efficiente con batch, ma il parsing MultiIndex è delicato;
     # usiamo un approccio ibrido: batch per gruppi, fallback singolo se parsing fallisce.
-    BATCH_SIZE = 30
-    for i in range(0, len(to_download), BATCH_SIZE):
-        batch = to_download[i : i + BATCH_SIZE]
-        _download_batch(batch, result)
+    # I ticker con storico su disco vanno in batch separati: richiedono solo pochi giorni.
+    # I batch partono in parallelo (max _MAX_INFLIGHT_BATCHES), ognuno scrive nel proprio dict.
+    jobs = []
+    for group in (cold, list(stored)):
+        for i in range(0, len(group), batch_size):
+            batch = group[i : i + batch_size]
+            part: dict[str, pd.DataFrame] = {}
+            jobs.append((batch, _batch_pool.submit(_download_batch, batch, part, stored), part))
+    return result, jobs
+
+
+def _fetch(tickers: list[str]) -> dict[str, pd.DataFrame]:
+    """Download effettivo dei ticker posseduti da questo thread."""
+    result, jobs = _submit_fetch(tickers)
+    for _, fut, part in jobs:
+        try:
+            fut.result()
+        except Exception as e:
+            logger.warning(f"[market] Batch interrotto: {e}")
+        result.update(part)
 
     return result
 
 
-def _download_batch(tickers: list[str], result: dict) -> None:
+def _download_singles(tickers: list[str], result: dict,
+                      stored: dict[str, pd.DataFrame]) -> None:
+    """Download singoli in parallelo: ogni ticker ha i suoi retry, nessuno blocca gli altri."""
+    futures = {t: _single_pool.submit(_download_single, t, stored.get(t)) for t in tickers}
+    for t, fut in futures.items():
+        try:
+            df = fut.result()
+        except Exception as e:
+            logger.warning(f"[market] {t}: download singolo fallito ({e})")
+            continue
+        if df is not None:
+            result[t] = df
+
+
+@timed("market.download_batch")
+def _download_batch(tickers: list[str], result: dict,
+                    stored: Optional[dict[str, pd.DataFrame]] = None) -> None:
     """Scarica un batch di ticker. Fallback singolo in caso di errore."""
+    stored = stored or {}
+
     if len(tickers) == 1:
-        df = _download_single(tickers[0])
-        if df is not None:
-            result[tickers[0]] = df
+        _download_singles(tickers, result, stored)
         return
 
+    window = _window_kwargs([stored[t] for t in tickers if t in stored])
+
     try:
-        raw = yf.download(
+        raw = _yf_download(
             tickers,
-            period=_PERIOD,
+            **window,
             group_by="ticker",
             progress=False,
             auto_adjust=False,
@@ -160,8 +457,16 @@ def _download_batch(tickers: list[str], result: dict) -> None:
         )
 
         if raw.empty:
+            if tickers and all(t in stored for t in tickers):
+                # Nessuna barra nuova (weekend/festivi): lo storico su disco è già aggiornato
+                for t in tickers:
+                    df = _finalize(t, None, stored[t])
+                    if df is not None:
+                        result[t] = df
+                return
             raise ValueError("DataFrame vuoto")
 
+        retry: list[str] = []
         for t in tickers:
             try:
                 if isinstance(raw.columns, pd.MultiIndex):
@@ -173,24 +478,105 @@ def _download_batch(tickers: list[str], result: dict) -> None:
                     # Un solo ticker restituisce colonne flat
                     df = raw.copy()
 
-                df = df.dropna(subset=["Close"])
-                if len(df) >= 30:
-                    _set_cached(t, df)
+                df = _finalize(t, df, stored.get(t))
+                if df is not None:
                     result[t] = df
                 else:
-                    logger.debug(f"[market] {t}: solo {len(df)} righe dopo il batch.")
+                    logger.debug(f"[market] {t}: dati insufficienti dopo il batch.")
             except (KeyError, Exception) as e:
                 logger.debug(f"[market] {t}: estrazione dal batch fallita ({e}), retry singolo.")
-                single = _download_single(t)
-                if single is not None:
-                    result[t] = single
+                retry.append(t)
+        _download_singles(retry, result, stored)
 
     except Exception as e:
         logger.warning(f"[market] Batch download fallito: {e}. Fallback a singoli.")
-        for t in tickers:
-            single = _download_single(t)
-            if single is not None:
-                result[t] = single
+        _download_singles([t for t in tickers if t not in result], result, stored)
+
+
+# ---------------------------------------------------------------------------
+# Pannello prezzi di chiusura
+# ---------------------------------------------------------------------------
+# Matrice sedute × ticker allineata una volta per refresh e condivisa da
+# valutazione storica del portafoglio, correlazioni e grafici.
+
+_panel_lock = threading.Lock()
+_panels: dict[tuple, tuple[int, pd.DataFrame]] = {}   # (ticker, dtype) -> (versione, pannello)
+_PANEL_CACHE_MAX = 8
+
+
+def build_close_panel(
+    frames: dict[str, pd.DataFrame],
+    tickers: Optional[list[str]] = None,
+    dtype: str = "float64",
+) -> pd.DataFrame:
+    """
+    Allinea i Close di più ticker su un indice comune di sedute (unione delle
+    date, senza orario né timezone). Celle senza dato = NaN.
+
+    Returns
+    -------
+    DataFrame (sedute × ticker) con un unico blocco NumPy di tipo `dtype`.
+    """
+    names = [t for t in (tickers if tickers is not None else list(frames)) if t in frames]
+    series: dict[str, pd.Series] = {}
+    for t in names:
+        df = frames[t]
+        if df is None or df.empty or "Close" not in df.columns:
+            continue
+        close = df["Close"]
+        idx = pd.DatetimeIndex(close.index)
+        if idx.tz is not None:
+            idx = idx.tz_localize(None)
+        close = pd.Series(close.to_numpy(dtype=float), index=idx.normalize())
+        series[t] = close[~close.index.duplicated(keep="last")]
+    if not series:
+        return pd.DataFrame(columns=names, dtype=dtype)
+
+    index = series[next(iter(series))].index
+    for s_ in series.values():
+        index = index.union(s_.index)
+    values = np.full((len(index), len(names)), np.nan, dtype=dtype)
+    for j, t in enumerate(names):
+        if t in series:
+            pos = index.get_indexer(series[t].index)
+            values[pos, j] = series[t].to_numpy()
+    return pd.DataFrame(values, index=index, columns=names)
+
+
+def session_returns(panel: pd.DataFrame) -> pd.DataFrame:
+    """
+    Rendimenti giornalieri di un pannello Close, ogni colonna calcolata sulle
+    sole sedute del proprio asset: nel pannello unito (crypto + azioni) i
+    weekend sono NaN per le azioni e il rendimento del lunedì resta quello
+    venerdì → lunedì invece di andare perso. Stesso indice del pannello.
+    """
+    out = {t: panel[t].dropna().pct_change() for t in panel.columns}
+    return pd.DataFrame(out, index=panel.index, columns=panel.columns)
+
+
+def get_close_panel(tickers: list[str], dtype: str = "float64") -> pd.DataFrame:
+    """
+    Pannello Close (vedi build_close_panel) per `tickers`, ricostruito solo
+    quando i dati sottostanti cambiano (data_version). I ticker non
+    scaricabili restano come colonne NaN.
+
+    Il pannello è condiviso tra i chiamanti: non va modificato sul posto.
+    """
+    names = sorted({t.strip().upper() for t in tickers if t})
+    key = (tuple(names), dtype)
+    # Versione letta prima dei dati: un refresh concorrente al più forza una ricostruzione
+    version = data_version()
+    frames = get_data_raw(names)
+    with _panel_lock:
+        hit = _panels.get(key)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    panel = build_close_panel(frames, names, dtype)
+    with _panel_lock:
+        if len(_panels) >= _PANEL_CACHE_MAX:
+            _panels.pop(next(iter(_panels)))
+        _panels[key] = (version, panel)
+    return panel
 
 
 def validate_ticker(ticker: str) -> bool:
@@ -198,7 +584,7 @@ def validate_ticker(ticker: str) -> bool:
     if not ticker:
         return False
     try:
-        df = yf.download(ticker, period="5d", progress=False, timeout=10)
+        df = _yf_download(ticker, period="5d", progress=False, timeout=10)
         return not df.empty
     except Exception:
         return False
@@ -0,0 +1,199 @@
+"""
+Metrics — InvestAI
+Strumentazione leggera dei percorsi caldi: per ogni stadio conteggio,
+tempo cumulato, massimo, errori e istogramma delle durate.
+
+    @timed("market.get_data_raw")          # decoratore
+    def get_data_raw(...): ...
+
+    with timed("ui.page_market"):          # context manager
+        ...
+
+Disattivata di default: con la strumentazione spenta il decoratore costa un
+solo controllo di un flag globale. Si attiva con INVESTAI_METRICS=1 oppure
+enable(True) (es. dal pannello "Diagnostica" dell'app).
+
+Esportazione:
+ - to_prometheus(): formato testo Prometheus (istogramma investai_stage_seconds)
+ - to_json():       dump JSON dello snapshot
+ - start_http_server(port): /metrics e /metrics.json su un thread daemon
+   (avviato dall'app se INVESTAI_METRICS_PORT è impostata)
+
+Le metriche sono per processo: il lavoro eseguito nei worker di
+engine.scan non viene sommato a quello del processo principale.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Limiti superiori (secondi) dei bucket dell'istogramma; l'ultimo implicito è +Inf
+BUCKETS: tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_enabled = os.environ.get("INVESTAI_METRICS", "").strip().lower() in ("1", "true", "yes", "on")
+_lock = threading.Lock()
+_stages: dict[str, "_Stage"] = {}
+
+
+class _Stage:
+    __slots__ = ("count", "total", "max", "errors", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.errors = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def record(name: str, seconds: float, error: bool = False) -> None:
+    """Registra una durata per lo stadio `name`."""
+    with _lock:
+        s = _stages.get(name)
+        if s is None:
+            s = _stages[name] = _Stage()
+        s.count += 1
+        s.total += seconds
+        if seconds > s.max:
+            s.max = seconds
+        if error:
+            s.errors += 1
+        s.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+
+
+class timed:
+    """Misura uno stadio; utilizzabile come context manager o come decoratore."""
+
+    __slots__ = ("name", "_t0")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._t0: Optional[float] = None
+
+    def __enter__(self) -> "timed":
+        self._t0 = time.perf_counter() if _enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._t0 is not None:
+            # st.rerun / st.stop sollevano BaseException di controllo: non contano come errori
+            record(self.name, time.perf_counter() - self._t0,
+                   exc_type is not None and issubclass(exc_type, Exception))
+
+    def __call__(self, fn: Callable) -> Callable:
+        name = self.name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                out = fn(*args, **kwargs)
+            except BaseException as e:
+                record(name, time.perf_counter() - t0, error=isinstance(e, Exception))
+                raise
+            record(name, time.perf_counter() - t0)
+            return out
+
+        return wrapper
+
+
+# ---------------------------------------------------------------------------
+# Esportazione
+# ---------------------------------------------------------------------------
+
+def snapshot() -> dict[str, dict]:
+    """{ stadio: { count, total_s, mean_ms, max_ms, errors, buckets: { le: cumulato } } }"""
+    with _lock:
+        items = [(n, s.count, s.total, s.max, s.errors, list(s.buckets)) for n, s in _stages.items()]
+    out = {}
+    for name, count, total, mx, errors, buckets in sorted(items):
+        cum, acc = {}, 0
+        for le, c in zip([*map(str, BUCKETS), "+Inf"], buckets):
+            acc += c
+            cum[le] = acc
+        out[name] = {
+            "count":   count,
+            "total_s": round(total, 6),
+            "mean_ms": round(total / count * 1e3, 3) if count else 0.0,
+            "max_ms":  round(mx * 1e3, 3),
+            "errors":  errors,
+            "buckets": cum,
+        }
+    return out
+
+
+def to_json(indent: Optional[int] = 2) -> str:
+    return json.dumps({"enabled": _enabled, "stages": snapshot()}, indent=indent)
+
+
+def to_prometheus() -> str:
+    lines = [
+        "# HELP investai_stage_seconds Durata degli stadi strumentati di InvestAI.",
+        "# TYPE investai_stage_seconds histogram",
+    ]
+    errors = []
+    for name, s in snapshot().items():
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        for le, c in s["buckets"].items():
+            lines.append(f'investai_stage_seconds_bucket{{stage="{label}",le="{le}"}} {c}')
+        lines.append(f'investai_stage_seconds_sum{{stage="{label}"}} {s["total_s"]}')
+        lines.append(f'investai_stage_seconds_count{{stage="{label}"}} {s["count"]}')
+        errors.append(f'investai_stage_errors_total{{stage="{label}"}} {s["errors"]}')
+    if errors:
+        lines += ["# HELP investai_stage_errors_total Chiamate terminate con eccezione.",
+                  "# TYPE investai_stage_errors_total counter", *errors]
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            body, ctype = to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.rstrip("/") == "/metrics.json":
+            body, ctype = to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Espone /metrics (Prometheus) e /metrics.json su un thread daemon; attiva la raccolta."""
+    enable(True)
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"[metrics] Endpoint attivo su http://{host}:{port}/metrics")
+    return server
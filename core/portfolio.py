@@ -6,24 +6,49 @@ Nessuna dipendenza da database esterno.
 from __future__ import annotations
 
 import logging
+import threading
 from datetime import date, datetime
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
-from core.storage import load_transactions
+from core.market_data import build_close_panel
+from core.metrics import timed
+from core.lots import DEFAULT_METHOD, Ledger, Lots, resolve_method
+from core.storage import get_setting, ledger_version, load_transactions, subscribe_transactions
 
 logger = logging.getLogger(__name__)
 
 
-def get_portfolio_summary() -> tuple[dict, list[dict]]:
+def cost_basis_method() -> str:
+    """Metodo di cost basis configurato (impostazione `cost_basis_method`, default "average")."""
+    return resolve_method(get_setting("cost_basis_method", DEFAULT_METHOD))
+
+
+def _replay(txs: list[dict], method: str) -> tuple[Ledger, list[dict]]:
+    """Applica le transazioni in ordine di data (a parità, ordine del registro)."""
+    ledger = Ledger(method)
+    history: list[dict] = []
+    for tx in sorted(txs, key=lambda t: t.get("date", "")):
+        row = ledger.apply(tx)
+        if row is not None:
+            history.append(row)
+    return ledger, history
+
+
+def get_portfolio_summary(method: Optional[str] = None) -> tuple[dict, list[dict]]:
     """
     Calcola lo stato attuale del portafoglio da tutte le transazioni.
 
+    Parameters
+    ----------
+    method : "average" | "fifo" | "lifo" (default: impostazione cost_basis_method)
+
     Returns
     -------
     portfolio : dict
-        { ticker: { qty, total_cost, avg_price } }
+        { ticker: { qty, total_cost, avg_price, realized_pnl } }
         Contiene solo asset con quantità > 0.
     history : list[dict]
         Lista ordinata (per data) di tutte le transazioni.
@@ -31,67 +56,103 @@ def get_portfolio_summary() -> tuple[dict, list[dict]]:
     txs = load_transactions()
     if not txs:
         return {}, []
+    ledger, history = _replay(txs, resolve_method(method) if method else cost_basis_method())
+    return ledger.positions(), history
 
-    # Ordina per data (asc) per elaborare in ordine cronologico
-    txs_sorted = sorted(txs, key=lambda t: t.get("date", ""))
-
-    portfolio: dict[str, dict] = {}
-    history: list[dict] = []
-
-    for tx in txs_sorted:
-        sym: str  = str(tx.get("symbol", "")).upper()
-        qty: float = float(tx.get("quantity", 0.0))
-        price: float = float(tx.get("price", 0.0))
-        tx_type: str = str(tx.get("type", "BUY")).upper()
-        fee: float = float(tx.get("fee", 0.0))
-        tx_date: str = str(tx.get("date", ""))
 
-        if not sym or qty <= 0 or price <= 0:
-            continue
+# ---------------------------------------------------------------------------
+# Posizioni materializzate
+# ---------------------------------------------------------------------------
 
-        if sym not in portfolio:
-            portfolio[sym] = {"qty": 0.0, "total_cost": 0.0, "avg_price": 0.0}
-
-        pos = portfolio[sym]
-
-        if tx_type == "BUY":
-            pos["qty"] += qty
-            pos["total_cost"] += (qty * price) + fee
-
-        elif tx_type == "SELL":
-            # Riduce il costo medio proporzionalmente (FIFO semplificato)
-            sold_qty = min(qty, pos["qty"])  # non si può vendere più di quanto si possiede
-            if pos["qty"] > 1e-9:
-                avg = pos["total_cost"] / pos["qty"]
-                pos["total_cost"] = max(0.0, pos["total_cost"] - avg * sold_qty)
-            pos["qty"] = max(0.0, pos["qty"] - sold_qty)
-
-        # Ricalcola avg_price
-        if pos["qty"] > 1e-9:
-            pos["avg_price"] = pos["total_cost"] / pos["qty"]
-        else:
-            pos["avg_price"] = 0.0
-            pos["total_cost"] = 0.0
+class _PositionBook:
+    """
+    Posizioni correnti mantenute in memoria e aggiornate a ogni nuova
+    transazione (listener di core.storage), senza rileggere il registro.
+
+    Una transazione aggiunta in coda (data ≥ ultima applicata) viene applicata
+    in O(log lotti). Modifiche, cancellazioni, inserimenti retrodatati, cambio
+    del metodo di cost basis o scritture di un altro processo (versione del
+    registro non consecutiva) invalidano lo stato: la lettura successiva rifà
+    il replay completo.
+    """
 
-        history.append({
-            "id": tx.get("id"),
-            "symbol": sym,
-            "quantity": qty,
-            "price": price,
-            "date": tx_date,
-            "type": tx_type,
-            "fee": fee,
-        })
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ledger: Optional[Ledger] = None
+        self._version = -1
+        self._last_key: tuple = ("", 0)
+
+    def on_change(self, kind: str, tx: Optional[dict], version: int) -> None:
+        with self._lock:
+            if self._ledger is not None and version <= self._version:
+                return   # scrittura già inclusa nell'ultimo replay
+            if (
+                kind == "add" and tx is not None and self._ledger is not None
+                and version == self._version + 1
+            ):
+                key = (str(tx.get("date", "")), int(tx.get("id") or 0))
+                if key > self._last_key:
+                    self._ledger.apply(tx)
+                    self._version = version
+                    self._last_key = key
+                    return
+            self._ledger = None
+
+    def _rebuild(self, method: str) -> None:
+        # Versione letta prima e dopo il registro: se una scrittura cade nel mezzo
+        # non si sa se il registro letto la contenga, quindi si rilegge
+        version = ledger_version()
+        while True:
+            txs = load_transactions()
+            after = ledger_version()
+            if after == version:
+                break
+            version = after
+        self._ledger, _ = _replay(txs, method)
+        self._version = version
+        self._last_key = (
+            (max(str(t.get("date", "")) for t in txs), max(int(t.get("id") or 0) for t in txs)) if txs else ("", 0)
+        )
+
+    def _current(self) -> Ledger:
+        method = cost_basis_method()
+        if self._ledger is None or self._ledger.method != method or ledger_version() != self._version:
+            self._rebuild(method)
+        return self._ledger
+
+    def get(self) -> dict[str, dict]:
+        with self._lock:
+            return self._current().positions()
+
+    def realized(self) -> float:
+        with self._lock:
+            return sum(l.realized for l in self._current().lots.values())
+
+
+_book = _PositionBook()
+subscribe_transactions(_book.on_change)
+
+
+def get_positions() -> dict[str, dict]:
+    """
+    Posizioni aperte { ticker: { qty, total_cost, avg_price, realized_pnl } }, come il primo
+    valore di get_portfolio_summary ma senza rileggere le transazioni:
+    O(#posizioni) finché il registro cresce solo in coda.
+    """
+    return _book.get()
 
-    # Filtra asset chiusi
-    active_portfolio = {k: v for k, v in portfolio.items() if v["qty"] > 1e-6}
 
-    return active_portfolio, history
+def get_realized_pnl() -> float:
+    """P&L realizzato totale (anche delle posizioni chiuse) secondo il metodo di cost basis."""
+    return _book.realized()
 
 
+@timed("portfolio.historical_value")
 def get_historical_portfolio_value(
     transactions: list[dict],
-    market_data: dict,
+    market_data: Optional[dict] = None,
+    method: Optional[str] = None,
+    prices: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
     """
     Ricostruisce il valore storico giornaliero del portafoglio.
@@ -102,20 +163,25 @@ def get_historical_portfolio_value(
         Lista transazioni (come da load_transactions).
     market_data : dict
         { ticker: DataFrame con colonna 'Close' e index DatetimeIndex }
+    method : str, optional
+        "average" | "fifo" | "lifo" (default: impostazione cost_basis_method)
+    prices : pd.DataFrame, optional
+        Pannello Close già allineato (core.market_data.get_close_panel);
+        se assente viene costruito da `market_data`.
 
     Returns
     -------
     pd.DataFrame con colonne:
         - Total Value    : valore di mercato del portafoglio
         - Total Invested : costo totale investito (cost basis)
-        - <TICKER>       : valore di mercato per ogni asset
+        - <TICKER>       : valore di mercato per ogni asset (simbolo in maiuscolo)
     """
     if not transactions:
         return pd.DataFrame()
 
     df_tx = pd.DataFrame(transactions)
     df_tx["date"] = pd.to_datetime(df_tx["date"], errors="coerce")
-    df_tx = df_tx.dropna(subset=["date"]).sort_values("date")
+    df_tx = df_tx.dropna(subset=["date"]).sort_values("date", kind="stable")
 
     if df_tx.empty:
         return pd.DataFrame()
@@ -124,71 +190,78 @@ def get_historical_portfolio_value(
     end_date   = pd.Timestamp.today().normalize()
     date_range = pd.date_range(start=start_date, end=end_date, freq="D")
 
-    unique_tickers: list[str] = df_tx["symbol"].unique().tolist()
-
-    # Matrice dei prezzi giornalieri (forward-fill + backward-fill)
-    price_matrix = pd.DataFrame(index=date_range)
-    for t in unique_tickers:
-        if t in market_data and not market_data[t].empty:
-            price_matrix[t] = (
-                market_data[t]["Close"]
-                .reindex(date_range)
-                .ffill()
-                .bfill()
-            )
-        else:
-            price_matrix[t] = 0.0
-
-    # Stato del portafoglio: simulazione giorno per giorno
-    state: dict[str, dict] = {t: {"qty": 0.0, "cost": 0.0} for t in unique_tickers}
-    records: list[dict] = []
-
-    tx_by_date = df_tx.groupby(df_tx["date"].dt.normalize())
-
-    for current_date in date_range:
-        # Applica le transazioni del giorno
-        if current_date in tx_by_date.groups:
-            for _, tx in tx_by_date.get_group(current_date).iterrows():
-                sym   = str(tx["symbol"]).upper()
-                qty   = float(tx.get("quantity", 0.0))
-                price = float(tx.get("price", 0.0))
-                fee   = float(tx.get("fee", 0.0))
-                ttype = str(tx.get("type", "BUY")).upper()
-
-                if sym not in state:
-                    state[sym] = {"qty": 0.0, "cost": 0.0}
-
-                pos = state[sym]
-                if ttype == "BUY":
-                    pos["qty"]  += qty
-                    pos["cost"] += (qty * price) + fee
-                elif ttype == "SELL":
-                    sold = min(qty, pos["qty"])
-                    if pos["qty"] > 1e-9:
-                        avg = pos["cost"] / pos["qty"]
-                        pos["cost"] = max(0.0, pos["cost"] - avg * sold)
-                    pos["qty"] = max(0.0, pos["qty"] - sold)
-
-        # Calcola valori del giorno
-        day_value    = 0.0
-        day_invested = 0.0
-        asset_values: dict[str, float] = {}
-
-        for sym in unique_tickers:
-            pos          = state[sym]
-            mkt_price    = price_matrix.at[current_date, sym] if sym in price_matrix.columns else 0.0
-            asset_val    = pos["qty"] * mkt_price
-            day_value   += asset_val
-            day_invested += pos["cost"]
-            asset_values[sym] = asset_val
-
-        records.append({
-            "Total Value":    day_value,
-            "Total Invested": day_invested,
-            **asset_values,
-        })
-
-    return pd.DataFrame(records, index=date_range)
+    # Un ticker per simbolo in maiuscolo, come in _ledger_positions e nelle posizioni;
+    # il prezzo viene dalla colonna del pannello con quel nome o, in mancanza,
+    # da una delle grafie usate nelle transazioni ("aapl")
+    spellings: dict[str, list[str]] = {}
+    for sym in df_tx["symbol"].astype(str).unique():
+        spellings.setdefault(sym.upper(), []).append(sym)
+    keys = list(spellings)
+
+    panel = prices if prices is not None else build_close_panel(
+        market_data or {}, list(dict.fromkeys(keys + [s for names in spellings.values() for s in names]))
+    )
+    source = {
+        k: next((c for c in (k, *names) if c in panel.columns and panel[c].notna().any()), None)
+        for k, names in spellings.items()
+    }
+
+    # Matrice dei prezzi giornalieri (forward-fill + backward-fill) dal pannello Close;
+    # ticker senza alcun dato: valore 0
+    found = list(dict.fromkeys(c for c in source.values() if c is not None))
+    filled = panel.reindex(index=date_range, columns=found).ffill().bfill()
+    price_matrix = np.zeros((len(date_range), len(keys)))
+    for j, k in enumerate(keys):
+        if source[k] is not None:
+            price_matrix[:, j] = filled[source[k]].to_numpy(dtype=float)
+
+    # Stato dopo ogni transazione, poi ultimo stato di ogni giorno propagato in avanti
+    positions = _ledger_positions(df_tx, resolve_method(method) if method else cost_basis_method())
+    daily = positions.groupby(["day", "symbol"], sort=False)[["qty", "cost"]].last().unstack("symbol")
+    qty  = daily["qty"].reindex(index=date_range, columns=keys).ffill().fillna(0.0).to_numpy()
+    cost = daily["cost"].reindex(index=date_range, columns=keys).ffill().fillna(0.0).to_numpy()
+
+    values = qty * price_matrix
+    out = pd.DataFrame(values, index=date_range, columns=keys)
+    out.insert(0, "Total Invested", cost.sum(axis=1))
+    out.insert(0, "Total Value", values.sum(axis=1))
+    return out
+
+
+def _ledger_positions(df_tx: pd.DataFrame, method: str) -> pd.DataFrame:
+    """
+    Quantità e cost basis di ciascun ticker subito dopo ogni transazione,
+    con il metodo di cost basis indicato (core.lots).
+
+    Una sola passata sul registro, O(transazioni · log lotti): la vendita
+    dipende dallo stato precedente (quantità limitata a quella posseduta,
+    lotti chiusi), quindi non è una semplice somma cumulata.
+    """
+    syms   = df_tx["symbol"].astype(str).str.upper().to_numpy()
+    types  = df_tx["type"].astype(str).str.upper().to_numpy() if "type" in df_tx else np.full(len(df_tx), "BUY")
+    qtys   = pd.to_numeric(df_tx.get("quantity", 0.0), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    prices = pd.to_numeric(df_tx.get("price", 0.0), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    fees   = pd.to_numeric(df_tx.get("fee", 0.0), errors="coerce").fillna(0.0).to_numpy(dtype=float)
+
+    qty_after  = np.empty(len(df_tx))
+    cost_after = np.empty(len(df_tx))
+    books: dict[str, Lots] = {}
+    for i, (sym, ttype, q, p, f) in enumerate(zip(syms, types, qtys, prices, fees)):
+        lots = books.get(sym)
+        if lots is None:
+            lots = books[sym] = Lots(method)
+        if ttype == "BUY":
+            lots.buy(q, p, f)
+        elif ttype == "SELL":
+            lots.sell(q, p, f)
+        qty_after[i], cost_after[i] = lots.qty, lots.cost
+
+    return pd.DataFrame({
+        "day":    df_tx["date"].dt.normalize().to_numpy(),
+        "symbol": syms,
+        "qty":    qty_after,
+        "cost":   cost_after,
+    })
 
 
 def compute_first_buy_dates(transactions: list[dict]) -> dict[str, date]:
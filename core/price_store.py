@@ -0,0 +1,157 @@
+"""
+Price Store — InvestAI
+Archivio OHLCV persistente su disco: un file CSV per ticker in data/prices/.
+Permette a core.market_data di scaricare solo la coda mancante dopo un riavvio
+invece dell'intera finestra di 2 anni.
+Tutte le scritture sono atomiche (write-then-rename).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.storage import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+PRICES_DIR = DATA_DIR / "prices"
+
+# Finestra massima conservata per ticker (allineata a _PERIOD = "2y")
+_WINDOW = pd.DateOffset(years=2)
+
+# Scarto relativo oltre il quale una barra sovrapposta è considerata ribasata
+# (split o dividendo); sotto restano gli arrotondamenti del provider
+_ADJ_TOLERANCE = 1e-5
+
+_locks_guard = threading.Lock()
+_locks: dict[str, threading.Lock] = {}
+
+
+def _lock_for(ticker: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(ticker)
+        if lock is None:
+            lock = _locks[ticker] = threading.Lock()
+        return lock
+
+
+def _path(ticker: str) -> Path:
+    """Nome file sicuro: ^GSPC, EURUSD=X, BTC-USD → caratteri ammessi dal filesystem."""
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+    return PRICES_DIR / f"{safe}.csv"
+
+
+def load_prices(ticker: str) -> Optional[pd.DataFrame]:
+    """Legge lo storico salvato; ritorna None se mancante o illeggibile."""
+    path = _path(ticker)
+    if not path.exists():
+        return None
+    try:
+        with _lock_for(ticker):
+            df = pd.read_csv(path, index_col=0, parse_dates=True)
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        logger.warning(f"[prices] Lettura fallita per {path.name}: {e} — ignoro il file.")
+        return None
+    if df.empty or "Close" not in df.columns:
+        return None
+    df.index.name = "Date"
+    return df
+
+
+def save_prices(ticker: str, df: pd.DataFrame) -> None:
+    """Scrittura atomica dello storico di un ticker."""
+    PRICES_DIR.mkdir(parents=True, exist_ok=True)
+    path = _path(ticker)
+    with _lock_for(ticker):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=PRICES_DIR, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                    df.to_csv(f)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # Lo store è solo un'ottimizzazione: un errore di scrittura non blocca il download
+            logger.warning(f"[prices] Scrittura fallita per {path.name}: {e}")
+
+
+def delete_prices(ticker: Optional[str] = None) -> None:
+    """Cancella lo storico di un ticker (o di tutti se ticker è None)."""
+    paths = [_path(ticker)] if ticker else list(PRICES_DIR.glob("*.csv"))
+    for p in paths:
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def tail_start(stored: pd.DataFrame, overlap_days: int) -> pd.Timestamp:
+    """
+    Data da cui riscaricare: ultima barra salvata meno `overlap_days`.
+    La sovrapposizione riallinea l'ultima barra (spesso parziale) e
+    eventuali rettifiche recenti del provider.
+    """
+    return stored.index.max().normalize() - pd.Timedelta(days=overlap_days)
+
+
+def merge_tail(stored: pd.DataFrame, fresh: pd.DataFrame) -> pd.DataFrame:
+    """
+    Unisce lo storico salvato con la coda appena scaricata.
+    Le barre sovrapposte vengono sostituite da quelle nuove;
+    il risultato è troncato alla finestra di 2 anni.
+    """
+    if fresh is None or fresh.empty:
+        merged = stored
+    else:
+        if fresh.index.tz is not None and stored.index.tz is None:
+            fresh = fresh.tz_localize(None)
+        cols = [c for c in stored.columns if c in fresh.columns] or list(fresh.columns)
+        head = stored.loc[stored.index < fresh.index.min(), cols]
+        merged = pd.concat([head, fresh[cols]])
+        merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+    cutoff = merged.index.max() - _WINDOW
+    return merged.loc[merged.index >= cutoff]
+
+
+def same_prices(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """True se i due frame hanno stesse date, colonne e valori (NaN compresi, dtype ignorati)."""
+    if not a.index.equals(b.index) or list(a.columns) != list(b.columns):
+        return False
+    try:
+        return bool(np.array_equal(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True))
+    except (TypeError, ValueError):
+        return a.equals(b)
+
+
+def adjustment_changed(stored: pd.DataFrame, fresh: Optional[pd.DataFrame]) -> bool:
+    """
+    True se sulle barre sovrapposte (esclusa l'ultima salvata, spesso parziale)
+    Close o Adj Close della coda nuova differiscono da quelli salvati: il
+    provider ha ribasato lo storico (split, dividendo) e unire la coda
+    lascerebbe la testa salvata su una base diversa. Va riscaricato tutto.
+    """
+    if fresh is None or fresh.empty:
+        return False
+    if fresh.index.tz is not None and stored.index.tz is None:
+        fresh = fresh.tz_localize(None)
+    cols = [c for c in ("Close", "Adj Close") if c in stored.columns and c in fresh.columns]
+    common = stored.index.intersection(fresh.index)
+    common = common[common < stored.index.max()]
+    if not cols or common.empty:
+        return False
+    old = stored.loc[~stored.index.duplicated(keep="last")].loc[common, cols].to_numpy(dtype=float)
+    new = fresh.loc[~fresh.index.duplicated(keep="last")].loc[common, cols].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rel = np.abs(new / old - 1.0)
+    rel = rel[np.isfinite(rel)]
+    return bool(rel.size and rel.max() > _ADJ_TOLERANCE)
@@ -0,0 +1,279 @@
+"""
+Data Providers — InvestAI
+Sorgente dei dati OHLCV usata da core.market_data, sostituibile a runtime.
+
+ - YFinanceProvider: Yahoo Finance via yf.download (default)
+ - FixtureProvider:  frame registrati (CSV) o sintetici serviti in locale, con
+                     latenza, errori e risposte batch parziali configurabili.
+                     Serve per load test e benchmark riproducibili senza rete.
+
+Tutti i provider rispettano il contratto di yf.download usato da market_data:
+un ticker singolo → colonne flat (Open, High, Low, Close, Volume…);
+una lista con group_by="ticker" → colonne MultiIndex (ticker, campo).
+
+Il provider attivo si sceglie con set_provider() oppure con la variabile
+d'ambiente INVESTAI_DATA_PROVIDER ("yfinance" | "fixture:<cartella CSV>").
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+logger = logging.getLogger(__name__)
+
+
+class DataProvider:
+    """
+    Interfaccia comune dei provider.
+
+    Attributi letti da market_data:
+     - rate_limited  : le richieste passano dal token-bucket verso l'esterno
+     - persistent    : i dati vengono letti/salvati nello store su disco (data/prices/)
+     - retry_backoff : base del backoff esponenziale tra i retry (None = default di market_data)
+    """
+
+    name = "base"
+    rate_limited = True
+    persistent = True
+    retry_backoff: Optional[float] = None
+
+    def download(self, tickers: Union[str, Sequence[str]], **kwargs) -> pd.DataFrame:
+        raise NotImplementedError
+
+
+# ---------------------------------------------------------------------------
+# Yahoo Finance
+# ---------------------------------------------------------------------------
+
+class YFinanceProvider(DataProvider):
+    """yf.download, serializzato se la versione installata non è thread-safe."""
+
+    name = "yfinance"
+
+    def __init__(self):
+        # yfinance < 1.0 usa stato globale in download(): chiamate concorrenti si sovrascrivono
+        self.concurrent_safe = hasattr(getattr(yf, "multi", None), "_DownloadCtx")
+        self._lock = threading.Lock()
+
+    def download(self, tickers, **kwargs) -> pd.DataFrame:
+        if self.concurrent_safe:
+            return yf.download(tickers, **kwargs)
+        with self._lock:
+            return yf.download(tickers, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Fixture locali
+# ---------------------------------------------------------------------------
+
+_PERIOD_RE = re.compile(r"^(\d+)(d|wk|mo|y)$")
+_PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def _safe_name(ticker: str) -> str:
+    """Stesso schema di nomi file di core.price_store (^GSPC → _GSPC.csv)."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", ticker.upper())
+
+
+class FixtureProvider(DataProvider):
+    """
+    Provider offline e deterministico.
+
+    Parameters
+    ----------
+    frames             : { ticker: DataFrame OHLCV } serviti così come sono
+    directory          : cartella di CSV nel formato di core.price_store
+                         (es. una copia di data/prices/ registrata in precedenza)
+    factory            : ticker → DataFrame OHLCV (o None se il ticker "non esiste"),
+                         per universi sintetici generati su richiesta
+    latency            : secondi di attesa fissi per chiamata
+    latency_per_ticker : secondi aggiuntivi per ticker richiesto
+    jitter             : secondi casuali aggiuntivi, uniformi in [0, jitter]
+    failure_rate       : probabilità che una chiamata sollevi ConnectionError
+    partial_rate       : probabilità che un ticker manchi da una risposta batch
+                         (market_data lo recupera con un download singolo)
+    retry_backoff      : base del backoff tra i retry di market_data (0 = nessuna attesa)
+    seed               : seme; la stessa sequenza di richieste produce gli stessi
+                         errori indipendentemente dall'ordine dei thread
+
+    La finestra temporale (period / start) è calcolata rispetto all'ultima
+    barra di ogni serie, non alla data odierna: i risultati non invecchiano.
+    """
+
+    name = "fixture"
+    rate_limited = False
+    persistent = False
+
+    def __init__(
+        self,
+        frames: Optional[Mapping[str, pd.DataFrame]] = None,
+        directory: Optional[Union[str, Path]] = None,
+        factory: Optional[Callable[[str], Optional[pd.DataFrame]]] = None,
+        latency: float = 0.0,
+        latency_per_ticker: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        partial_rate: float = 0.0,
+        retry_backoff: float = 0.0,
+        seed: int = 0,
+    ):
+        self.directory = Path(directory) if directory is not None else None
+        self.factory = factory
+        self.latency = latency
+        self.latency_per_ticker = latency_per_ticker
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.partial_rate = partial_rate
+        self.retry_backoff = retry_backoff
+        self.seed = seed
+        self.stats: Counter = Counter()   # calls, tickers, failures, dropped, unknown
+        self._frames: dict[str, Optional[pd.DataFrame]] = {
+            t.upper(): df for t, df in (frames or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()  # chiave richiesta → n. chiamate (per il seme)
+
+    # ------------------------------------------------------------------
+
+    def _frame(self, ticker: str) -> Optional[pd.DataFrame]:
+        t = ticker.upper()
+        with self._lock:
+            if t in self._frames:
+                return self._frames[t]
+        df = None
+        if self.directory is not None:
+            path = self.directory / f"{_safe_name(t)}.csv"
+            if path.exists():
+                df = pd.read_csv(path, index_col=0, parse_dates=True)
+        if df is None and self.factory is not None:
+            df = self.factory(t)
+        if df is not None:
+            df = df.copy()
+            df.index = pd.DatetimeIndex(df.index, name="Date")
+        with self._lock:
+            self._frames[t] = df
+        return df
+
+    def _rng(self, names: Sequence[str], kwargs: dict) -> np.random.Generator:
+        """Generatore dipendente solo da (seed, richiesta, n-esima ripetizione della richiesta)."""
+        key = "|".join(names) + f"|{kwargs.get('period')}|{kwargs.get('start')}"
+        with self._lock:
+            n = self._calls[key]
+            self._calls[key] += 1
+        return np.random.default_rng([self.seed, zlib.crc32(key.encode()), n])
+
+    @staticmethod
+    def _window(df: pd.DataFrame, period: Optional[str], start: Optional[str]) -> pd.DataFrame:
+        if start is not None:
+            return df.loc[df.index >= pd.Timestamp(start)]
+        m = _PERIOD_RE.match(str(period or "").strip())
+        if m is None or df.empty:
+            return df
+        n, unit = int(m.group(1)), _PERIOD_UNITS[m.group(2)]
+        if unit == "days":
+            return df.iloc[-n:]
+        return df.loc[df.index > df.index[-1] - pd.DateOffset(**{unit: n})]
+
+    def download(self, tickers, **kwargs) -> pd.DataFrame:
+        single = isinstance(tickers, str)
+        names = [tickers] if single else [str(t) for t in tickers]
+        names = [t.strip().upper() for t in names if t]
+        rng = self._rng(names, kwargs)
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["tickers"] += len(names)
+
+        wait = self.latency + self.latency_per_ticker * len(names)
+        if self.jitter > 0:
+            wait += float(rng.uniform(0.0, self.jitter))
+        if wait > 0:
+            time.sleep(wait)
+
+        if self.failure_rate > 0 and rng.random() < self.failure_rate:
+            with self._lock:
+                self.stats["failures"] += 1
+            raise ConnectionError(f"fixture: errore simulato ({len(names)} ticker)")
+
+        period, start = kwargs.get("period"), kwargs.get("start")
+        if single or len(names) == 1:
+            df = self._frame(names[0]) if names else None
+            if df is None:
+                with self._lock:
+                    self.stats["unknown"] += 1
+                return pd.DataFrame()
+            out = self._window(df, period, start).copy()
+            if single or kwargs.get("group_by") != "ticker":
+                return out
+            return pd.concat({names[0]: out}, axis=1)
+
+        parts: dict[str, pd.DataFrame] = {}
+        dropped = unknown = 0
+        for t in names:
+            if self.partial_rate > 0 and rng.random() < self.partial_rate:
+                dropped += 1
+                continue
+            df = self._frame(t)
+            if df is None:
+                # Come Yahoo: un simbolo inesistente resta nel batch con colonne vuote
+                unknown += 1
+                parts[t] = pd.DataFrame(columns=["Open", "High", "Low", "Close", "Volume"], dtype=float)
+                continue
+            parts[t] = self._window(df, period, start)
+        with self._lock:
+            self.stats["dropped"] += dropped
+            self.stats["unknown"] += unknown
+        if not parts:
+            return pd.DataFrame()
+        return pd.concat(parts, axis=1).rename_axis("Date")
+
+
+# ---------------------------------------------------------------------------
+# Provider attivo
+# ---------------------------------------------------------------------------
+
+_provider_lock = threading.Lock()
+_provider: Optional[DataProvider] = None
+
+
+def _from_env() -> DataProvider:
+    spec = os.environ.get("INVESTAI_DATA_PROVIDER", "yfinance").strip()
+    kind, _, arg = spec.partition(":")
+    if kind.lower() == "fixture" and arg:
+        logger.info(f"[providers] Dati serviti da fixture locali in {arg}")
+        return FixtureProvider(directory=arg)
+    if kind.lower() not in ("", "yfinance"):
+        logger.warning(f"[providers] INVESTAI_DATA_PROVIDER={spec!r} non riconosciuto — uso yfinance.")
+    return YFinanceProvider()
+
+
+def get_provider() -> DataProvider:
+    """Provider attivo (creato al primo uso da INVESTAI_DATA_PROVIDER)."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = _from_env()
+        return _provider
+
+
+def set_provider(provider: Optional[DataProvider]) -> Optional[DataProvider]:
+    """
+    Sostituisce il provider attivo e ritorna il precedente (per ripristinarlo).
+    None torna al default da variabile d'ambiente.
+    Va seguito da market_data.clear_cache(): la cache in-process non distingue i provider.
+    """
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
@@ -1,18 +1,24 @@
 """
 Storage Layer — InvestAI
-Persistenza locale JSON completamente offline.
-Tutte le scritture sono atomiche (write-then-rename).
+Persistenza locale completamente offline: JSON per watchlist e impostazioni,
+core.tx_store per le transazioni (SQLite, oppure journal append-only con
+INVESTAI_TX_STORE=journal).
+Tutte le scritture sono atomiche (write-then-rename / transazione SQL / append fsync).
 """
 from __future__ import annotations
 
+import copy
 import json
 import os
 import shutil
+import sqlite3
 import tempfile
 import threading
 import logging
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+from core.tx_store import JournalTransactionStore, SqliteTransactionStore
 
 logger = logging.getLogger(__name__)
 
@@ -20,15 +26,19 @@ logger = logging.getLogger(__name__)
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
 # Chiavi dei file JSON
-_FILE_TRANSACTIONS = DATA_DIR / "transactions.json"
+_FILE_TRANSACTIONS = DATA_DIR / "transactions.json"   # formato legacy, migrato in transactions.db
+_FILE_TX_DB        = DATA_DIR / "transactions.db"
+_FILE_TX_SNAPSHOT  = DATA_DIR / "transactions.snapshot.json"
+_FILE_TX_JOURNAL   = DATA_DIR / "transactions.journal.jsonl"
 _FILE_WATCHLIST    = DATA_DIR / "watchlist.json"
 _FILE_SETTINGS     = DATA_DIR / "settings.json"
+_FILE_SCAN_SNAPSHOT = DATA_DIR / "scan_snapshot.json"
 
 # Lock per evitare scritture concorrenti (Streamlit può avere thread multipli)
 _locks: dict[Path, threading.Lock] = {
-    _FILE_TRANSACTIONS: threading.Lock(),
     _FILE_WATCHLIST:    threading.Lock(),
     _FILE_SETTINGS:     threading.Lock(),
+    _FILE_SCAN_SNAPSHOT: threading.Lock(),
 }
 
 
@@ -36,80 +46,211 @@ def _ensure_data_dir() -> None:
     DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def _read(path: Path, default: Any) -> Any:
-    """Legge un file JSON; ritorna `default` se mancante o corrotto."""
-    _ensure_data_dir()
-    if not path.exists():
+# Cache dei JSON già letti: { path: (firma stat, dati) }. La firma
+# (mtime, dimensione, inode) cambia a ogni scrittura, anche da un altro processo.
+_json_cache: dict[Path, tuple[tuple, Any]] = {}
+
+
+def _stat_signature(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _read_shared(path: Path, default: Any) -> Any:
+    """
+    Come _read, ma ritorna l'oggetto in cache senza copiarlo: solo per letture
+    interne che non modificano il risultato.
+    """
+    sig = _stat_signature(path)
+    if sig is None:
+        _ensure_data_dir()
         return default
+    cached = _json_cache.get(path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
     try:
         with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
+            data = json.load(f)
     except (json.JSONDecodeError, OSError) as e:
         logger.warning(f"[storage] Lettura fallita per {path.name}: {e} — uso default.")
         return default
+    # Una scrittura concorrente (anche di un altro processo) tra stat e lettura
+    # cambia la firma: il dato letto non viene associato a una firma che non è la sua
+    if _stat_signature(path) == sig:
+        _json_cache[path] = (sig, data)
+    return data
+
+
+def _read(path: Path, default: Any) -> Any:
+    """Legge un file JSON; ritorna `default` se mancante o corrotto."""
+    return copy.deepcopy(_read_shared(path, default))
 
 
 def _write(path: Path, data: Any) -> None:
     """Scrittura atomica: scrive su file temporaneo, poi rinomina."""
+    with _locks[path]:
+        _write_locked(path, data)
+
+
+def _write_locked(path: Path, data: Any) -> None:
+    """Corpo di _write: il chiamante tiene già `_locks[path]`."""
     _ensure_data_dir()
-    lock = _locks[path]
-    with lock:
+    try:
+        text = json.dumps(data, indent=2, ensure_ascii=False, default=str)
+        fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
         try:
-            fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix=".tmp")
-            try:
-                with os.fdopen(fd, "w", encoding="utf-8") as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False, default=str)
-            except Exception:
-                os.unlink(tmp_path)
-                raise
-            # Rinomina atomica (su POSIX è atomica, su Windows è best-effort)
-            shutil.move(tmp_path, str(path))
-        except OSError as e:
-            logger.error(f"[storage] Scrittura fallita per {path.name}: {e}")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+        except Exception:
+            os.unlink(tmp_path)
             raise
+        # Rinomina atomica (su POSIX è atomica, su Windows è best-effort)
+        shutil.move(tmp_path, str(path))
+    except OSError as e:
+        _json_cache.pop(path, None)
+        logger.error(f"[storage] Scrittura fallita per {path.name}: {e}")
+        raise
+    # Cache coerente con il file appena scritto (stessa forma di una rilettura)
+    sig = _stat_signature(path)
+    if sig is not None:
+        _json_cache[path] = (sig, json.loads(text))
 
 
 # ---------------------------------------------------------------------------
 # TRANSACTIONS
 # ---------------------------------------------------------------------------
 
+# Backend transazioni: "sqlite" (default) oppure "journal" (log append-only + snapshot)
+_TX_BACKEND = os.environ.get("INVESTAI_TX_STORE", "sqlite").strip().lower()
+
+
+def _make_tx_store():
+    if _TX_BACKEND == "journal":
+        return JournalTransactionStore(_FILE_TX_SNAPSHOT, _FILE_TX_JOURNAL, legacy_json=_FILE_TRANSACTIONS)
+    if _TX_BACKEND != "sqlite":
+        logger.warning(f"[storage] INVESTAI_TX_STORE={_TX_BACKEND!r} non riconosciuto — uso sqlite.")
+    return SqliteTransactionStore(_FILE_TX_DB, legacy_json=_FILE_TRANSACTIONS)
+
+
+_tx_store = _make_tx_store()
+
+# Listener notificati dopo ogni modifica del registro: callback(kind, tx, version)
+# kind: "add" (tx = transazione aggiunta) | "edit" | "replace" (tx = None)
+_tx_listeners: list[Callable[[str, Optional[dict], int], None]] = []
+
+
+def subscribe_transactions(callback: Callable[[str, Optional[dict], int], None]) -> None:
+    """Registra una callback chiamata dopo ogni scrittura sul registro transazioni."""
+    if callback not in _tx_listeners:
+        _tx_listeners.append(callback)
+
+
+def _notify(kind: str, tx: Optional[dict] = None) -> None:
+    version = _tx_store.version()
+    for cb in list(_tx_listeners):
+        try:
+            cb(kind, tx, version)
+        except Exception as e:
+            logger.warning(f"[storage] Listener transazioni fallito: {e}")
+
+
+def ledger_version() -> int:
+    """Versione corrente del registro transazioni (cambia a ogni scrittura, anche da altri processi)."""
+    return _tx_store.version()
+
+
 def load_transactions() -> list[dict]:
-    """Ritorna lista di transazioni, già ordinate per data desc."""
-    raw = _read(_FILE_TRANSACTIONS, [])
-    if not isinstance(raw, list):
+    """Ritorna lista di transazioni, in ordine di inserimento (ID crescente)."""
+    try:
+        return _tx_store.load()
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logger.warning(f"[storage] Lettura transazioni fallita: {e} — uso default.")
         return []
-    return raw
 
 
 def save_transactions(txs: list[dict]) -> None:
-    _write(_FILE_TRANSACTIONS, txs)
+    """Sostituisce l'intero registro (import/ripristino)."""
+    _tx_store.replace_all(txs)
+    _notify("replace")
 
 
 def add_transaction(tx: dict) -> None:
-    """Aggiunge una transazione e incrementa l'ID auto."""
-    txs = load_transactions()
-    tx["id"] = max((t.get("id", 0) for t in txs), default=0) + 1
-    txs.append(tx)
-    save_transactions(txs)
+    """Aggiunge una transazione; l'ID auto viene scritto anche in `tx`."""
+    tx["id"] = _tx_store.add(tx)
+    _notify("add", dict(tx))
 
 
 def update_transaction(tx_id: int, updated: dict) -> bool:
-    txs = load_transactions()
-    for i, t in enumerate(txs):
-        if t.get("id") == tx_id:
-            txs[i] = {**t, **updated, "id": tx_id}
-            save_transactions(txs)
-            return True
-    return False
+    return apply_changes({tx_id: updated})[0] > 0
 
 
 def delete_transaction(tx_id: int) -> bool:
-    txs = load_transactions()
-    new_txs = [t for t in txs if t.get("id") != tx_id]
-    if len(new_txs) == len(txs):
-        return False
-    save_transactions(new_txs)
-    return True
+    return apply_changes({}, [tx_id])[1] > 0
+
+
+def apply_changes(updates: Mapping[int, dict], deletes: Iterable[int] = ()) -> tuple[int, int]:
+    """
+    Modifiche e cancellazioni multiple in un'unica transazione.
+
+    Parameters
+    ----------
+    updates : { id: campi da aggiornare }
+    deletes : ID da eliminare
+
+    Returns
+    -------
+    (righe aggiornate, righe cancellate)
+    """
+    n_upd, n_del = _tx_store.apply_changes(updates, deletes)
+    if n_upd or n_del:
+        _notify("edit")
+    return n_upd, n_del
+
+
+def bulk_edit_transactions(
+    deletes: Iterable[int],
+    updates: Mapping[int, dict],
+) -> tuple[int, int]:
+    """
+    Salva le modifiche della tabella transazioni: confronta la griglia
+    modificata con il registro e scrive solo le righe effettivamente cambiate,
+    in un'unica transazione.
+
+    Parameters
+    ----------
+    deletes : ID da eliminare
+    updates : { id: valori della riga nella griglia } (anche righe non modificate)
+
+    Returns
+    -------
+    (righe aggiornate, righe cancellate)
+    """
+    stored = {t["id"]: t for t in load_transactions()}
+    to_delete = [int(i) for i in deletes if int(i) in stored]
+    gone = set(to_delete)
+
+    changed: dict[int, dict] = {}
+    for tx_id, fields in updates.items():
+        tx_id = int(tx_id)
+        old = stored.get(tx_id)
+        if old is None or tx_id in gone:
+            continue
+        diff = {k: v for k, v in fields.items() if not _same_value(old.get(k), v)}
+        if diff:
+            changed[tx_id] = diff
+
+    if not changed and not to_delete:
+        return 0, 0
+    return apply_changes(changed, to_delete)
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(float(a) - float(b)) <= 1e-9 * max(1.0, abs(float(a)))
+    return a == b
 
 
 # ---------------------------------------------------------------------------
@@ -161,10 +302,43 @@ def save_settings(settings: dict) -> None:
 
 
 def get_setting(key: str, default: Any = None) -> Any:
-    return load_settings().get(key, default)
+    raw = _read_shared(_FILE_SETTINGS, {})
+    if not isinstance(raw, dict) or key not in raw:
+        return default
+    return copy.deepcopy(raw[key])
 
 
 def set_setting(key: str, value: Any) -> None:
     s = load_settings()
     s[key] = value
     save_settings(s)
+
+
+# ---------------------------------------------------------------------------
+# SCAN SNAPSHOT
+# ---------------------------------------------------------------------------
+
+def load_scan_snapshot() -> dict:
+    """Ultimo snapshot di scansione (vedi engine.snapshot); {} se assente."""
+    raw = _read(_FILE_SCAN_SNAPSHOT, {})
+    if not isinstance(raw, dict):
+        return {}
+    return raw
+
+
+def save_scan_snapshot(snapshot: dict) -> None:
+    _write(_FILE_SCAN_SNAPSHOT, snapshot)
+
+
+def update_scan_snapshot(fn: Callable[[dict], Optional[dict]]) -> None:
+    """
+    Lettura-modifica-scrittura dello snapshot sotto il lock del file: `fn`
+    riceve una copia dello snapshot attuale ({} se assente) e ritorna quello
+    da salvare, oppure None per lasciarlo invariato. Nessuna scrittura
+    concorrente (es. il refresh di engine.warmup) va persa nel frattempo.
+    """
+    with _locks[_FILE_SCAN_SNAPSHOT]:
+        raw = _read(_FILE_SCAN_SNAPSHOT, {})
+        updated = fn(raw if isinstance(raw, dict) else {})
+        if updated is not None:
+            _write_locked(_FILE_SCAN_SNAPSHOT, updated)
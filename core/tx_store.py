@@ -0,0 +1,521 @@
+"""
+Transaction Store — InvestAI
+Backend del registro transazioni, con la stessa interfaccia
+(load / replace_all / add / apply_changes / close):
+
+ - SqliteTransactionStore (default): SQLite (stdlib) con chiave primaria
+   sull'ID e indice (symbol, date); ogni modifica tocca solo le righe interessate.
+ - JournalTransactionStore: log append-only (una riga JSON per evento) più
+   snapshot; il log viene compattato nello snapshot oltre una soglia di eventi.
+   App e bot Telegram sono processi distinti: letture e scritture avvengono
+   sotto un lock di file (`<journal>.lock`, flock/msvcrt).
+
+Al primo avvio, se esiste il vecchio `transactions.json`, il contenuto viene
+importato una sola volta (ID preservati; le righe senza ID ne ricevono
+uno nuovo) e il file rinominato in `transactions.json.migrated` come backup.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Colonne native; eventuali altri campi della transazione finiscono in `extra` (JSON)
+_COLUMNS = ("symbol", "date", "type", "quantity", "price", "fee")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id       INTEGER PRIMARY KEY,
+    symbol   TEXT NOT NULL DEFAULT '',
+    date     TEXT NOT NULL DEFAULT '',
+    type     TEXT NOT NULL DEFAULT 'BUY',
+    quantity REAL NOT NULL DEFAULT 0,
+    price    REAL NOT NULL DEFAULT 0,
+    fee      REAL NOT NULL DEFAULT 0,
+    extra    TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_symbol_date ON transactions (symbol, date);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+# Ogni scrittura incrementa la versione del registro nella stessa transazione
+_BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+
+
+def _to_row(tx: Mapping[str, Any]) -> tuple:
+    extra = {k: v for k, v in tx.items() if k != "id" and k not in _COLUMNS}
+    return (
+        str(tx.get("symbol", "") or ""),
+        str(tx.get("date", "") or ""),
+        str(tx.get("type", "BUY") or "BUY"),
+        float(tx.get("quantity", 0.0) or 0.0),
+        float(tx.get("price", 0.0) or 0.0),
+        float(tx.get("fee", 0.0) or 0.0),
+        json.dumps(extra, ensure_ascii=False, default=str) if extra else None,
+    )
+
+
+def _from_row(row: sqlite3.Row) -> dict:
+    tx = {"id": row["id"], **{c: row[c] for c in _COLUMNS}}
+    if row["extra"]:
+        try:
+            tx.update(json.loads(row["extra"]))
+        except json.JSONDecodeError:
+            pass
+    return tx
+
+
+def _read_legacy(src: Path) -> list[dict]:
+    """Legge il vecchio transactions.json (lista vuota se mancante o illeggibile)."""
+    try:
+        with src.open("r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        logger.warning(f"[storage] Migrazione {src.name} fallita: {e}")
+        return []
+    return [t for t in raw if isinstance(t, dict)] if isinstance(raw, list) else []
+
+
+def _assign_ids(legacy: list[dict]) -> list[dict]:
+    """ID mancanti assegnati dopo il massimo esistente, nell'ordine del file."""
+    next_id = max((int(t["id"]) for t in legacy if t.get("id") is not None), default=0) + 1
+    out = []
+    for t in legacy:
+        if t.get("id") is None:
+            t = {**t, "id": next_id}
+            next_id += 1
+        out.append(t)
+    return out
+
+
+def _retire_legacy(src: Path) -> None:
+    try:
+        src.replace(src.with_name(src.name + ".migrated"))
+    except OSError:
+        pass
+
+
+class SqliteTransactionStore:
+    """Registro transazioni su un file SQLite; thread-safe, condivisibile tra processi."""
+
+    def __init__(self, path: Path, legacy_json: Optional[Path] = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ------------------------------------------------------------------
+    # Connessione e migrazione
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            # WAL: le letture di app e bot non bloccano le scritture
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: ogni commit è sincronizzato su disco (dati finanziari dell'utente)
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+            self._migrate_legacy()
+        return self._conn
+
+    def _migrate_legacy(self) -> None:
+        src = self.legacy_json
+        if src is None or not src.exists():
+            return
+        legacy = _read_legacy(src)
+        if not legacy:
+            return   # niente da importare: il file vuoto resta com'è
+        rows = [(t["id"], *_to_row(t)) for t in _assign_ids(legacy)]
+        conn = self._conn
+        with conn:
+            # BEGIN IMMEDIATE: se app e bot partono insieme, solo uno importa
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone():
+                return
+            conn.executemany(
+                "INSERT INTO transactions (id, symbol, date, type, quantity, price, fee, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute(_BUMP_VERSION)
+        _retire_legacy(src)
+        logger.info(f"[storage] Migrate {len(rows)} transazioni da {src.name} a {self.path.name}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # Operazioni
+    # ------------------------------------------------------------------
+
+    def version(self) -> int:
+        """Contatore monotono delle scritture (anche di altri processi)."""
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def load(self) -> list[dict]:
+        with self._lock:
+            rows = self._connect().execute("SELECT * FROM transactions ORDER BY id").fetchall()
+        return [_from_row(r) for r in rows]
+
+    def replace_all(self, txs: list[dict]) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM transactions")
+                conn.executemany(
+                    "INSERT INTO transactions (id, symbol, date, type, quantity, price, fee, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(t.get("id"), *_to_row(t)) for t in txs],
+                )
+                conn.execute(_BUMP_VERSION)
+
+    def add(self, tx: dict) -> int:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                cur = conn.execute(
+                    "INSERT INTO transactions (symbol, date, type, quantity, price, fee, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    _to_row(tx),
+                )
+                conn.execute(_BUMP_VERSION)
+            return int(cur.lastrowid)
+
+    def apply_changes(
+        self,
+        updates: Mapping[int, dict],
+        deletes: Iterable[int] = (),
+    ) -> tuple[int, int]:
+        """
+        Applica modifiche (merge dei campi) e cancellazioni in un'unica
+        transazione SQL. Ritorna (righe aggiornate, righe cancellate).
+        """
+        deletes = [int(i) for i in deletes]
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                n_del = 0
+                if deletes:
+                    n_del = conn.executemany(
+                        "DELETE FROM transactions WHERE id = ?", [(i,) for i in deletes]
+                    ).rowcount
+                n_upd = 0
+                for tx_id, fields in updates.items():
+                    row = conn.execute("SELECT * FROM transactions WHERE id = ?", (int(tx_id),)).fetchone()
+                    if row is None:
+                        continue
+                    merged = {**_from_row(row), **fields}
+                    conn.execute(
+                        "UPDATE transactions SET symbol=?, date=?, type=?, quantity=?, price=?, fee=?, extra=? "
+                        "WHERE id = ?",
+                        (*_to_row(merged), int(tx_id)),
+                    )
+                    n_upd += 1
+                if n_upd or n_del:
+                    conn.execute(_BUMP_VERSION)
+        return n_upd, n_del
+
+
+# ---------------------------------------------------------------------------
+# Journal append-only + snapshot
+# ---------------------------------------------------------------------------
+
+_COMPACT_EVENTS = 500   # eventi nel log oltre i quali si compatta nello snapshot
+
+
+def _lock_file(f: BinaryIO) -> None:
+    """Lock esclusivo tra processi sul file aperto `f` (bloccante)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f: BinaryIO) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class JournalTransactionStore:
+    """
+    Registro transazioni come snapshot JSON + log append-only (JSON Lines).
+
+    Ogni evento ha un numero di sequenza; lo snapshot registra l'ultimo evento
+    incluso, quindi un crash tra scrittura dello snapshot e troncamento del log
+    non riapplica nulla. Una riga finale troncata (crash durante l'append)
+    viene ignorata al replay. Una modifica multipla è un solo evento, quindi
+    viene applicata per intero o per niente.
+
+    Più processi possono condividere gli stessi file: ogni operazione tiene
+    il lock di `<journal>.lock` e rilegge lo stato se i file sono cambiati,
+    quindi numeri di sequenza e ID restano unici e la compattazione non
+    perde eventi accodati da un altro processo.
+    """
+
+    def __init__(
+        self,
+        snapshot: Path,
+        journal: Path,
+        legacy_json: Optional[Path] = None,
+        compact_events: int = _COMPACT_EVENTS,
+    ):
+        self.snapshot = snapshot
+        self.journal = journal
+        self.legacy_json = legacy_json
+        self.compact_events = compact_events
+        self.lock_path = journal.with_name(journal.name + ".lock")
+        self._lock = threading.RLock()
+        self._lock_depth = 0   # rientranza del lock di file (es. compact dentro _append)
+        self._state: Optional[dict[int, dict]] = None
+        self._seq = 0          # ultimo evento applicato
+        self._next_id = 1      # ID della prossima transazione (mai riusato)
+        self._pending = 0      # eventi nel log non ancora compattati
+        self._sig: Optional[tuple] = None
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Lock del thread e, al primo livello, lock di file tra processi."""
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.lock_path.open("a+b") as f:
+                _lock_file(f)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    _unlock_file(f)
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+
+    def _signature(self) -> tuple:
+        out = []
+        for p in (self.snapshot, self.journal):
+            try:
+                st = p.stat()
+                out.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                out.append(None)
+        return tuple(out)
+
+    def _ensure(self) -> dict[int, dict]:
+        """Stato in memoria; rifà il replay se i file sono cambiati (es. altro processo)."""
+        sig = self._signature()
+        if self._state is not None and sig == self._sig:
+            return self._state
+        if sig == (None, None) and self.legacy_json is not None and self.legacy_json.exists():
+            legacy = _read_legacy(self.legacy_json)
+            if legacy:
+                state = {int(t["id"]): t for t in _assign_ids(legacy)}
+                self._write_snapshot(state, 0, max(state) + 1)
+                _retire_legacy(self.legacy_json)
+                logger.info(f"[storage] Migrate {len(state)} transazioni da {self.legacy_json.name}")
+                sig = self._signature()
+        self._replay()
+        self._sig = sig
+        return self._state
+
+    def _replay(self) -> None:
+        """
+        Ricostruisce lo stato da snapshot + log. Snapshot o eventi non validi
+        sollevano ValueError (gestito da core.storage come gli altri errori di lettura).
+        """
+        state: dict[int, dict] = {}
+        seq = 0
+        next_id = 1
+        try:
+            with self.snapshot.open("r", encoding="utf-8") as f:
+                snap = json.load(f)
+            seq = int(snap.get("seq", 0))
+            state = {int(t["id"]): t for t in snap.get("transactions", [])}
+            next_id = int(snap.get("next_id", 1))
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError, AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"[storage] Snapshot {self.snapshot.name} illeggibile: {e}")
+            raise ValueError(f"snapshot {self.snapshot.name} illeggibile: {e}") from e
+
+        pending = 0
+        try:
+            with self.journal.open("r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"[storage] Evento troncato in {self.journal.name}, ignorato.")
+                        continue
+                    try:
+                        if int(event.get("seq", 0)) <= seq:
+                            continue
+                        next_id = _apply_event(state, event, next_id)
+                        seq = int(event["seq"])
+                    except (AttributeError, KeyError, TypeError, ValueError) as e:
+                        logger.error(f"[storage] Evento non valido in {self.journal.name}: {e}")
+                        raise ValueError(f"evento non valido in {self.journal.name}: {e}") from e
+                    pending += 1
+        except FileNotFoundError:
+            pass
+
+        self._state, self._seq, self._pending = state, seq, pending
+        self._next_id = max(next_id, max(state, default=0) + 1)
+
+    # ------------------------------------------------------------------
+    # Scrittura
+    # ------------------------------------------------------------------
+
+    def _append(self, event: dict) -> None:
+        """Aggiunge un evento al log (fsync) e lo applica allo stato in memoria."""
+        state = self._ensure()
+        event = {"seq": self._seq + 1, **event}
+        line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        with self.journal.open("a+b") as f:
+            # Riga finale troncata da un crash: si chiude prima di accodare
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        self._next_id = _apply_event(state, event, self._next_id)
+        self._seq = event["seq"]
+        self._pending += 1
+        self._sig = self._signature()
+        if self._pending >= self.compact_events:
+            self.compact()
+
+    def _write_snapshot(self, state: dict[int, dict], seq: int, next_id: int) -> None:
+        self.snapshot.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"seq": seq, "next_id": next_id, "transactions": list(state.values())}, f,
+                          ensure_ascii=False, default=str)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def compact(self) -> None:
+        """Scrive lo stato corrente nello snapshot e svuota il log."""
+        with self._locked():
+            state = self._ensure()
+            self._write_snapshot(state, self._seq, self._next_id)
+            # Dopo lo snapshot gli eventi nel log sono già inclusi (seq ≤ snapshot)
+            with self.journal.open("w", encoding="utf-8"):
+                pass
+            self._pending = 0
+            self._sig = self._signature()
+            logger.info(f"[storage] Journal compattato: {len(state)} transazioni (seq {self._seq})")
+
+    def close(self) -> None:
+        with self._lock:
+            self._state = None
+            self._sig = None
+
+    # ------------------------------------------------------------------
+    # Operazioni
+    # ------------------------------------------------------------------
+
+    def version(self) -> int:
+        """Numero di sequenza dell'ultimo evento (monotono, anche dopo la compattazione)."""
+        with self._locked():
+            self._ensure()
+            return self._seq
+
+    def load(self) -> list[dict]:
+        with self._locked():
+            return [dict(t) for _, t in sorted(self._ensure().items())]
+
+    def replace_all(self, txs: list[dict]) -> None:
+        with self._locked():
+            self._ensure()
+            self._seq += 1
+            state = {int(t["id"]): t for t in _assign_ids(txs)}
+            self._write_snapshot(state, self._seq, max(state, default=0) + 1)
+            with self.journal.open("w", encoding="utf-8"):
+                pass
+            self._state = None
+            self._ensure()
+
+    def add(self, tx: dict) -> int:
+        with self._locked():
+            self._ensure()
+            tx_id = self._next_id
+            self._append({"op": "add", "tx": {**tx, "id": tx_id}})
+            return tx_id
+
+    def apply_changes(
+        self,
+        updates: Mapping[int, dict],
+        deletes: Iterable[int] = (),
+    ) -> tuple[int, int]:
+        """Modifiche e cancellazioni come un unico evento del log."""
+        with self._locked():
+            state = self._ensure()
+            deletes = [int(i) for i in deletes if int(i) in state]
+            updates = {int(i): f for i, f in updates.items() if int(i) in state and int(i) not in deletes}
+            if updates or deletes:
+                self._append({"op": "batch", "updates": {str(i): f for i, f in updates.items()},
+                              "deletes": deletes})
+            return len(updates), len(deletes)
+
+
+def _apply_event(state: dict[int, dict], event: dict, next_id: int) -> int:
+    """Applica un evento allo stato; ritorna il prossimo ID libero aggiornato."""
+    op = event.get("op")
+    if op == "add":
+        tx = event["tx"]
+        state[int(tx["id"])] = tx
+        next_id = max(next_id, int(tx["id"]) + 1)
+    elif op == "batch":
+        for i in event.get("deletes", []):
+            state.pop(int(i), None)
+        for i, fields in event.get("updates", {}).items():
+            if int(i) in state:
+                state[int(i)] = {**state[int(i)], **fields, "id": int(i)}
+    return next_id
@@ -0,0 +1,200 @@
+"""
+Backtest Engine — InvestAI
+Event study vettoriale: rilevazione segnali, deduplicazione con cooldown e
+rendimenti a termine per orizzonti arbitrari, tutto con operazioni su array.
+
+Segnale di default (come in scoring._run_backtest): trend bull (Close > SMA_200)
+e RSI < 40. Nessun look-ahead: il segnale usa solo dati noti alla chiusura
+della barra di ingresso, l'uscita è il close di `h` sedute dopo.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+DEFAULT_HORIZONS: tuple[int, ...] = (30, 60, 90)
+
+_MIN_BARS      = 120   # storico minimo per un backtest significativo
+_MIN_SIGNALS   = 3     # segnali minimi (prima e dopo la deduplicazione)
+_SHRINK_SAMPLE = 12    # sotto questo campione il win rate viene regressato verso 50%
+_COOLDOWN_DAYS = 5     # giorni di calendario ignorati dopo un segnale
+
+_DAY_NS = 86_400 * 10**9
+
+
+@dataclass
+class HorizonStats:
+    horizon:     int
+    n_trades:    int   = 0
+    win_rate:    float = 0.0   # % (regressato verso 50% se campione piccolo)
+    mean_pnl:    float = 0.0   # %
+    median_pnl:  float = 0.0   # %
+    p10_pnl:     float = 0.0   # % — 10° percentile
+    p90_pnl:     float = 0.0   # % — 90° percentile
+    mae_mean:    float = 0.0   # % — max adverse excursion media durante il trade
+    mae_worst:   float = 0.0   # % — peggior escursione avversa osservata
+
+
+@dataclass
+class BacktestStats:
+    n_signals: int = 0
+    horizons:  dict[int, HorizonStats] = field(default_factory=dict)
+
+    def get(self, horizon: int) -> HorizonStats:
+        return self.horizons.get(horizon, HorizonStats(horizon=horizon))
+
+
+# ---------------------------------------------------------------------------
+# Primitive
+# ---------------------------------------------------------------------------
+
+def signal_mask(
+    close: np.ndarray,
+    sma200: np.ndarray,
+    rsi: np.ndarray,
+    rsi_max: float = 40.0,
+    require_trend: bool = True,
+) -> np.ndarray:
+    """Maschera booleana dei segnali: RSI < rsi_max (+ Close > SMA_200)."""
+    with np.errstate(invalid="ignore"):
+        mask = rsi < rsi_max
+        if require_trend:
+            mask &= close > sma200
+    return mask
+
+
+def dedupe_signals(times_ns: np.ndarray, candidates: np.ndarray, cooldown_days: float) -> np.ndarray:
+    """
+    Deduplicazione greedy dei segnali: un segnale è accettato solo se dista
+    almeno `cooldown_days` giorni di calendario dall'ultimo accettato.
+
+    Ogni salto è una searchsorted sui candidati: O(k log n) con k segnali accettati.
+    Ritorna le posizioni (indici di barra) accettate.
+    """
+    if len(candidates) == 0:
+        return candidates
+    t = times_ns[candidates]
+    step = int(cooldown_days * _DAY_NS)
+    if len(t) < 2 or np.all(np.diff(t) >= step):
+        return candidates
+    accepted = [0]
+    i = 0
+    while True:
+        i = int(np.searchsorted(t, t[i] + step, side="left"))
+        if i >= len(t):
+            break
+        accepted.append(i)
+    return candidates[np.asarray(accepted)]
+
+
+def forward_returns(close: np.ndarray, entries: np.ndarray, horizons: Sequence[int]) -> np.ndarray:
+    """Matrice (n_entry, n_orizzonti) dei rendimenti % a termine; NaN oltre i dati."""
+    n = len(close)
+    out = np.full((len(entries), len(horizons)), np.nan)
+    entry_px = close[entries]
+    for j, h in enumerate(horizons):
+        exit_idx = entries + h
+        ok = exit_idx < n
+        out[ok, j] = (close[exit_idx[ok]] - entry_px[ok]) / entry_px[ok] * 100
+    return out
+
+
+def adverse_excursion(close: np.ndarray, entries: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Max adverse excursion %: minimo del close nelle `horizon` sedute successive
+    all'ingresso, rispetto al prezzo di ingresso (≤ 0). NaN oltre i dati.
+    """
+    out = np.full(len(entries), np.nan)
+    n = len(close)
+    if n <= horizon:
+        return out
+    win_min = sliding_window_view(close, horizon).min(axis=-1)   # win_min[i] = min(close[i:i+h])
+    ok = entries + horizon < n
+    start = entries[ok] + 1
+    entry_px = close[entries[ok]]
+    out[ok] = np.minimum(0.0, (win_min[start] - entry_px) / entry_px * 100)
+    return out
+
+
+def _aggregate(pnl: np.ndarray, mae: np.ndarray, horizon: int) -> HorizonStats:
+    valid = ~np.isnan(pnl)
+    res = pnl[valid]
+    if len(res) == 0:
+        return HorizonStats(horizon=horizon)
+    wr  = float((res > 0).sum()) / len(res) * 100
+    avg = sum(res.tolist()) / len(res)
+    # Regressione verso 50% se campione piccolo
+    if len(res) < _SHRINK_SAMPLE:
+        w = len(res) / _SHRINK_SAMPLE
+        wr = wr * w + 50 * (1 - w)
+    p10, p50, p90 = np.percentile(res, [10, 50, 90])
+    adv = mae[valid]
+    return HorizonStats(
+        horizon=horizon,
+        n_trades=len(res),
+        win_rate=round(wr, 1),
+        mean_pnl=round(avg, 2),
+        median_pnl=round(float(p50), 2),
+        p10_pnl=round(float(p10), 2),
+        p90_pnl=round(float(p90), 2),
+        mae_mean=round(float(adv.mean()), 2),
+        mae_worst=round(float(adv.min()), 2),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Funzione principale
+# ---------------------------------------------------------------------------
+
+def event_study(
+    df: pd.DataFrame,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+    cooldown_days: float = _COOLDOWN_DAYS,
+    rsi_max: float = 40.0,
+    require_trend: bool = True,
+    mask: Optional[np.ndarray] = None,
+) -> BacktestStats:
+    """
+    Backtest del segnale su un DataFrame con indicatori (output di compute_indicators).
+
+    Parameters
+    ----------
+    df            : DataFrame con Close, SMA_200, RSI e DatetimeIndex
+    horizons      : orizzonti di uscita in sedute
+    cooldown_days : giorni di calendario ignorati dopo ogni segnale
+    rsi_max       : soglia RSI del segnale
+    require_trend : richiede Close > SMA_200
+    mask          : maschera segnali già calcolata (sostituisce rsi_max/require_trend)
+
+    Returns
+    -------
+    BacktestStats con statistiche per orizzonte. Campioni troppo piccoli
+    (< 3 segnali o < 120 barre) ritornano statistiche a zero.
+    """
+    if len(df) < _MIN_BARS:
+        return BacktestStats()
+
+    close = df["Close"].to_numpy(dtype=float)
+    if mask is None:
+        mask = signal_mask(close, df["SMA_200"].to_numpy(dtype=float),
+                           df["RSI"].to_numpy(dtype=float), rsi_max, require_trend)
+
+    candidates = np.flatnonzero(mask)
+    if len(candidates) < _MIN_SIGNALS:
+        return BacktestStats()
+
+    times_ns = df.index.to_numpy(dtype="datetime64[ns]").view("int64")
+    entries = dedupe_signals(times_ns, candidates, cooldown_days)
+    if len(entries) < _MIN_SIGNALS:
+        return BacktestStats(n_signals=len(entries))
+
+    tradable = entries[close[entries] > 0]
+    rets = forward_returns(close, tradable, horizons)
+    stats = BacktestStats(n_signals=len(entries))
+    for j, h in enumerate(horizons):
+        stats.horizons[h] = _aggregate(rets[:, j], adverse_excursion(close, tradable, h), h)
+    return stats
@@ -0,0 +1,479 @@
+"""
+Incremental Indicators — InvestAI
+Aggiornamento degli indicatori tecnici una barra alla volta.
+
+Mantiene lo stato rolling di ogni indicatore (EMA, somme mobili, deque
+monotone per min/max, OBV cumulato) e lo avanza in O(1) per nuova barra,
+invece di ricalcolare l'intero storico con compute_indicators.
+
+Le formule replicano le implementazioni manuali di engine.indicators
+(_sma, _ema, _rsi_manual, _atr_manual, _adx_manual, ...): i valori coincidono
+con il calcolo batch entro la tolleranza floating-point. Con pandas_ta attivo
+le formule di RSI/ATR/MFI differiscono, quindi il percorso incrementale
+va usato solo quando engine.indicators._HAS_TA è False.
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+# Barre rigiocate per riempire le finestre (la più lunga è HIGH/LOW_52W = 252)
+_SEED_BARS = 260
+
+
+def _isnan(x: float) -> bool:
+    return x != x
+
+
+def _div(a: float, b: float) -> float:
+    """Divisione con la semantica di pandas usata negli indicatori (b == 0 → NaN)."""
+    if _isnan(a) or _isnan(b) or b == 0:
+        return NAN
+    return a / b
+
+
+# ---------------------------------------------------------------------------
+# Primitive rolling
+# ---------------------------------------------------------------------------
+
+class _Window:
+    """
+    Finestra mobile di `n` valori con somma (e somma dei quadrati) corrente.
+    Come pandas.rolling(n): il risultato è NaN finché la finestra non è piena
+    o se contiene NaN. La somma viene risincronizzata ogni `n` inserimenti
+    per limitare la deriva numerica (costo ammortizzato O(1)).
+    """
+    __slots__ = ("n", "values", "total", "total_sq", "nans", "_since_sync")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.values: deque[float] = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.nans = 0
+        self._since_sync = 0
+
+    def push(self, x: float) -> None:
+        self.values.append(x)
+        if _isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+            self.total_sq += x * x
+        if len(self.values) > self.n:
+            old = self.values.popleft()
+            if _isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old
+                self.total_sq -= old * old
+        self._since_sync += 1
+        if self._since_sync >= self.n:
+            self._since_sync = 0
+            valid = [v for v in self.values if not _isnan(v)]
+            self.total = math.fsum(valid)
+            self.total_sq = math.fsum(v * v for v in valid)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.values) == self.n and self.nans == 0
+
+    def sum(self) -> float:
+        return self.total if self.ready else NAN
+
+    def mean(self) -> float:
+        return self.total / self.n if self.ready else NAN
+
+    def std(self) -> float:
+        """Deviazione standard campionaria (ddof=1), come Series.rolling().std()."""
+        if not self.ready or self.n < 2:
+            return NAN
+        var = (self.total_sq - self.total * self.total / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+
+class _Extreme:
+    """Min o max mobile su `n` valori con deque monotona (O(1) ammortizzato)."""
+    __slots__ = ("n", "is_max", "idx", "mono", "nan_pos")
+
+    def __init__(self, n: int, is_max: bool):
+        self.n = n
+        self.is_max = is_max
+        self.idx = -1
+        self.mono: deque[tuple[int, float]] = deque()
+        self.nan_pos: deque[int] = deque()
+
+    def push(self, x: float) -> None:
+        self.idx += 1
+        if _isnan(x):
+            self.nan_pos.append(self.idx)
+        else:
+            if self.is_max:
+                while self.mono and self.mono[-1][1] <= x:
+                    self.mono.pop()
+            else:
+                while self.mono and self.mono[-1][1] >= x:
+                    self.mono.pop()
+            self.mono.append((self.idx, x))
+        start = self.idx - self.n + 1
+        while self.mono and self.mono[0][0] < start:
+            self.mono.popleft()
+        while self.nan_pos and self.nan_pos[0] < start:
+            self.nan_pos.popleft()
+
+    def value(self) -> float:
+        if self.idx + 1 < self.n or self.nan_pos or not self.mono:
+            return NAN
+        return self.mono[0][1]
+
+
+class _Ema:
+    """EMA con la stessa ricorsione di Series.ewm(span, adjust=False).mean()."""
+    __slots__ = ("alpha", "value", "weight")
+
+    def __init__(self, span: int, value: float = NAN):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = value
+        self.weight = 1.0
+
+    def push(self, x: float) -> float:
+        if _isnan(self.value):
+            if not _isnan(x):
+                self.value = x
+                self.weight = 1.0
+            return self.value
+        self.weight *= 1.0 - self.alpha
+        if not _isnan(x):
+            self.value = (self.weight * self.value + self.alpha * x) / (self.weight + self.alpha)
+            self.weight = 1.0
+        return self.value
+
+
+class _Lag:
+    """Valore di `n` barre fa (per ROC e OBV_TREND)."""
+    __slots__ = ("values",)
+
+    def __init__(self, n: int):
+        self.values: deque[float] = deque(maxlen=n + 1)
+
+    def push(self, x: float) -> float:
+        self.values.append(x)
+        if len(self.values) < self.values.maxlen:
+            return NAN
+        return self.values[0]
+
+
+# ---------------------------------------------------------------------------
+# Stato completo
+# ---------------------------------------------------------------------------
+
+class IncrementalIndicators:
+    """
+    Stato rolling di tutti gli indicatori di compute_indicators.
+
+    Uso tipico:
+        state = IncrementalIndicators.from_history(df_raw)
+        row   = state.update(open_, high, low, close, volume)
+    """
+
+    def __init__(self) -> None:
+        self.prev_close = NAN
+        self.prev_high  = NAN
+        self.prev_low   = NAN
+        self.prev_tp    = NAN
+
+        self.sma200 = _Window(200)
+        self.sma50  = _Window(50)
+        self.ema21  = _Ema(21)
+        self.ema9   = _Ema(9)
+
+        self.tr14   = _Window(14)
+        self.bb20   = _Window(20)
+        self.ret20  = _Window(20)
+
+        self.gain14 = _Window(14)
+        self.loss14 = _Window(14)
+        self.ema12  = _Ema(12)
+        self.ema26  = _Ema(26)
+        self.macd_sig = _Ema(9)
+
+        self.rsi_min = _Extreme(14, is_max=False)
+        self.rsi_max = _Extreme(14, is_max=True)
+        self.stoch_d = _Window(3)
+
+        self.lag10 = _Lag(10)
+        self.lag20 = _Lag(20)
+
+        self.obv = 0.0
+        self.obv_lag20 = _Lag(20)
+        self.pos_flow14 = _Window(14)
+        self.neg_flow14 = _Window(14)
+        self.pv20  = _Window(20)
+        self.vol20 = _Window(20)
+
+        self.adx_tr  = _Ema(14)
+        self.adx_pos = _Ema(14)
+        self.adx_neg = _Ema(14)
+        self.adx     = _Ema(14)
+
+        self.low20  = _Extreme(20, is_max=False)
+        self.high20 = _Extreme(20, is_max=True)
+        self.low50  = _Extreme(50, is_max=False)
+        self.high50 = _Extreme(50, is_max=True)
+        self.low252  = _Extreme(252, is_max=False)
+        self.high252 = _Extreme(252, is_max=True)
+
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_history(cls, df_raw: pd.DataFrame) -> "IncrementalIndicators":
+        """
+        Costruisce lo stato a partire da uno storico OHLCV.
+
+        Gli stati esponenziali (EMA, ADX, OBV) vengono calcolati in modo
+        vettoriale fino a _SEED_BARS barre dalla fine; le ultime barre sono
+        poi rigiocate con update() per riempire le finestre mobili.
+        """
+        df = df_raw.dropna(subset=["Close", "High", "Low"])
+        state = cls()
+        if df.empty:
+            return state
+
+        close  = df["Close"].astype(float)
+        high   = df["High"].astype(float)
+        low    = df["Low"].astype(float)
+        volume = df["Volume"].fillna(0).astype(float)
+
+        split = max(0, len(df) - _SEED_BARS)
+        if split > 0:
+            state._seed_recursive(close.iloc[:split], high.iloc[:split], low.iloc[:split], volume.iloc[:split])
+
+        # Le finestre partono vuote: le barre rigiocate devono coprire la più lunga
+        tail = df.iloc[split:]
+        for o, h, l, c, v in zip(
+            tail["Open"].astype(float), tail["High"].astype(float), tail["Low"].astype(float),
+            tail["Close"].astype(float), tail["Volume"].fillna(0).astype(float),
+        ):
+            state.update(o, h, l, c, v)
+        return state
+
+    def _seed_recursive(self, close: pd.Series, high: pd.Series,
+                        low: pd.Series, volume: pd.Series) -> dict[str, pd.Series]:
+        """
+        Stati esponenziali e cumulati (EMA, MACD, ADX, OBV) all'ultima barra delle
+        serie, in modo vettoriale. Ritorna le colonne corrispondenti sull'intero storico.
+        """
+        def ewm(x, span: int) -> pd.Series:
+            return pd.Series(x, index=close.index).ewm(span=span, adjust=False).mean()
+
+        # Operazioni elemento per elemento in NumPy: stesse formule di engine.indicators
+        c, h, l, v = (np.asarray(s, dtype=float) for s in (close, high, low, volume))
+        prev_c = np.concatenate(([np.nan], c[:-1]))
+        prev_h = np.concatenate(([np.nan], h[:-1]))
+        prev_l = np.concatenate(([np.nan], l[:-1]))
+
+        ema21 = ewm(c, 21)
+        ema9  = ewm(c, 9)
+        ema12 = ewm(c, 12)
+        ema26 = ewm(c, 26)
+        macd  = ema12 - ema26
+        macd_sig = macd.ewm(span=9, adjust=False).mean()
+        self.ema21 = _Ema(21, float(ema21.iloc[-1]))
+        self.ema9  = _Ema(9,  float(ema9.iloc[-1]))
+        self.ema12 = _Ema(12, float(ema12.iloc[-1]))
+        self.ema26 = _Ema(26, float(ema26.iloc[-1]))
+        self.macd_sig = _Ema(9, float(macd_sig.iloc[-1]))
+
+        tr = np.fmax(np.fmax(h - l, np.abs(h - prev_c)), np.abs(l - prev_c))
+        up_move   = h - prev_h
+        down_move = prev_l - l
+        pos_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+        neg_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+        atr_e = ewm(tr, 14).to_numpy()
+        sp = ewm(pos_dm, 14).to_numpy()
+        sn = ewm(neg_dm, 14).to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            atr_nz = np.where(atr_e == 0, np.nan, atr_e)
+            pdi = 100 * sp / atr_nz
+            ndi = 100 * sn / atr_nz
+            dx  = 100 * np.abs(pdi - ndi) / np.where(pdi + ndi == 0, np.nan, pdi + ndi)
+        adx = ewm(dx, 14)
+        self.adx_tr  = _Ema(14, float(atr_e[-1]))
+        self.adx_pos = _Ema(14, float(sp[-1]))
+        self.adx_neg = _Ema(14, float(sn[-1]))
+        self.adx     = _Ema(14, float(adx.iloc[-1]))
+
+        direction = np.sign(c - prev_c)
+        obv = pd.Series(np.nan_to_num(direction * v, nan=0.0).cumsum(), index=close.index)
+        self.obv = float(obv.iloc[-1])
+
+        self.prev_close = float(close.iloc[-1])
+        self.prev_high  = float(high.iloc[-1])
+        self.prev_low   = float(low.iloc[-1])
+        self.prev_tp    = (self.prev_high + self.prev_low + self.prev_close) / 3
+        return {
+            "EMA_21": ema21, "EMA_9": ema9,
+            "MACD": macd, "MACD_SIGNAL": macd_sig, "MACD_HIST": macd - macd_sig,
+            "OBV": obv, "ADX": adx,
+        }
+
+    def rebase(self, df_raw: pd.DataFrame) -> dict[str, pd.Series]:
+        """
+        Riallinea lo stato a `df_raw`, lo stesso storico già applicato ma con
+        meno barre in testa (finestra di 2 anni che scorre): le finestre mobili
+        non cambiano, mentre EMA, MACD, ADX e OBV ripartono dalla nuova prima barra.
+        Ritorna queste colonne ricalcolate su `df_raw`.
+        """
+        df = df_raw.dropna(subset=["Close", "High", "Low"])
+        old_obv = self.obv
+        cols = self._seed_recursive(
+            df["Close"].astype(float), df["High"].astype(float),
+            df["Low"].astype(float), df["Volume"].fillna(0).astype(float),
+        )
+        # I valori di OBV ritardati (OBV_TREND) si spostano della stessa costante
+        shift = self.obv - old_obv
+        self.obv_lag20.values = deque((v + shift for v in self.obv_lag20.values), maxlen=self.obv_lag20.values.maxlen)
+        return cols
+
+    # ------------------------------------------------------------------
+    def update(self, open_: float, high: float, low: float,
+               close: float, volume: float) -> dict[str, float]:
+        """Avanza lo stato di una barra e ritorna gli indicatori della barra."""
+        volume = 0.0 if _isnan(volume) else volume
+        prev_c, prev_h, prev_l, prev_tp = self.prev_close, self.prev_high, self.prev_low, self.prev_tp
+
+        # --- Trend ---
+        self.sma200.push(close)
+        self.sma50.push(close)
+        ema21 = self.ema21.push(close)
+        ema9  = self.ema9.push(close)
+
+        # --- Volatilità ---
+        if _isnan(prev_c):
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - prev_c), abs(low - prev_c))
+        self.tr14.push(tr)
+        self.bb20.push(close)
+        mid, sd = self.bb20.mean(), self.bb20.std()
+        self.ret20.push(_div(close, prev_c) - 1 if not _isnan(prev_c) else NAN)
+
+        # --- Momentum ---
+        delta = close - prev_c if not _isnan(prev_c) else NAN
+        self.gain14.push(max(delta, 0.0) if not _isnan(delta) else NAN)
+        self.loss14.push(max(-delta, 0.0) if not _isnan(delta) else NAN)
+        rs  = _div(self.gain14.mean(), self.loss14.mean())
+        rsi = 100 - 100 / (1 + rs) if not _isnan(rs) else NAN
+
+        macd = self.ema12.push(close) - self.ema26.push(close)
+        macd_sig = self.macd_sig.push(macd)
+
+        self.rsi_min.push(rsi)
+        self.rsi_max.push(rsi)
+        lo, hi = self.rsi_min.value(), self.rsi_max.value()
+        stoch_k = _div(rsi - lo, hi - lo) * 100
+        self.stoch_d.push(stoch_k)
+
+        c10 = self.lag10.push(close)
+        c20 = self.lag20.push(close)
+
+        # --- Volume ---
+        if not _isnan(prev_c) and close != prev_c:
+            self.obv += volume if close > prev_c else -volume
+        obv_20 = self.obv_lag20.push(self.obv)
+
+        tp  = (high + low + close) / 3
+        rmf = tp * volume
+        self.pos_flow14.push(rmf if (not _isnan(prev_tp) and tp > prev_tp) else 0.0)
+        self.neg_flow14.push(rmf if (not _isnan(prev_tp) and tp < prev_tp) else 0.0)
+        mfr = _div(self.pos_flow14.sum(), self.neg_flow14.sum())
+        mfi = 100 - 100 / (1 + mfr) if not _isnan(mfr) else NAN
+
+        self.pv20.push(tp * volume)
+        self.vol20.push(volume)
+
+        # --- ADX ---
+        up_move   = high - prev_h if not _isnan(prev_h) else NAN
+        down_move = prev_l - low  if not _isnan(prev_l) else NAN
+        pos_dm = up_move if (up_move > down_move and up_move > 0) else 0.0
+        neg_dm = down_move if (down_move > up_move and down_move > 0) else 0.0
+        atr_e = self.adx_tr.push(tr)
+        pdi = 100 * _div(self.adx_pos.push(pos_dm), atr_e)
+        ndi = 100 * _div(self.adx_neg.push(neg_dm), atr_e)
+        dx  = 100 * _div(abs(pdi - ndi), pdi + ndi)
+        adx = self.adx.push(dx)
+
+        # --- Livelli ---
+        for w in (self.low20, self.low50, self.low252):
+            w.push(low)
+        for w in (self.high20, self.high50, self.high252):
+            w.push(high)
+
+        self.prev_close, self.prev_high, self.prev_low, self.prev_tp = close, high, low, tp
+
+        return {
+            "SMA_200": self.sma200.mean(),
+            "SMA_50":  self.sma50.mean(),
+            "EMA_21":  ema21,
+            "EMA_9":   ema9,
+            "ATR":     self.tr14.mean(),
+            "BBL":     mid - 2.0 * sd,
+            "BBM":     mid,
+            "BBU":     mid + 2.0 * sd,
+            "HIST_VOL": self.ret20.std() * math.sqrt(252) * 100,
+            "RSI":     rsi,
+            "MACD":        macd,
+            "MACD_SIGNAL": macd_sig,
+            "MACD_HIST":   macd - macd_sig,
+            "STOCH_K": stoch_k,
+            "STOCH_D": self.stoch_d.mean(),
+            "ROC_10":  (_div(close, c10) - 1) * 100,
+            "ROC_20":  (_div(close, c20) - 1) * 100,
+            "OBV":     self.obv,
+            "MFI":     mfi,
+            "VWAP_20": _div(self.pv20.sum(), self.vol20.sum()),
+            "ADX":     adx,
+            "PIVOT":   tp,
+            "SUPPORT_20":    self.low20.value(),
+            "RESISTANCE_20": self.high20.value(),
+            "SUPPORT_50":    self.low50.value(),
+            "RESISTANCE_50": self.high50.value(),
+            "HIGH_52W": self.high252.value(),
+            "LOW_52W":  self.low252.value(),
+            "OBV_TREND": self.obv - obv_20,
+        }
+
+
+def append_bars(
+    df_ind: pd.DataFrame,
+    state: IncrementalIndicators,
+    new_bars: pd.DataFrame,
+) -> Optional[pd.DataFrame]:
+    """
+    Avanza `state` con le barre di `new_bars` e le aggiunge in coda a `df_ind`.
+    Le barre con indicatori chiave NaN vengono scartate, come fa il dropna
+    finale di compute_indicators.
+    """
+    new_bars = new_bars.dropna(subset=["Close", "High", "Low"])
+    rows: list[dict] = []
+    index: list = []
+    for ts, bar in new_bars.iterrows():
+        ind = state.update(
+            float(bar["Open"]) if "Open" in bar else NAN,
+            float(bar["High"]), float(bar["Low"]), float(bar["Close"]),
+            float(bar.get("Volume", 0.0)),
+        )
+        if any(_isnan(ind[k]) for k in ("SMA_200", "RSI", "MACD", "ATR", "BBL")):
+            continue
+        rows.append({**bar.to_dict(), **ind})
+        index.append(ts)
+
+    if not rows:
+        return df_ind
+    tail = pd.DataFrame(rows, index=pd.Index(index, name=df_ind.index.name))
+    return pd.concat([df_ind, tail[df_ind.columns.intersection(tail.columns)]])
@@ -6,12 +6,17 @@ Usa pandas_ta dove disponibile, con fallback manuali per robustezza.
 from __future__ import annotations
 
 import logging
+import threading
 import warnings
+from collections import OrderedDict
 from typing import Optional
 
 import numpy as np
 import pandas as pd
 
+from core.metrics import timed
+from engine.incremental import IncrementalIndicators, append_bars
+
 try:
     import pandas_ta as ta
     _HAS_TA = True
@@ -24,6 +29,12 @@ logger = logging.getLogger(__name__)
 # Righe minime per calcolare tutti gli indicatori significativi
 MIN_ROWS = 220
 
+# Cache LRU dei frame con indicatori (vedi compute_indicators_cached)
+_CACHE_MAX_ENTRIES = 512
+_CACHE_MAX_BYTES   = 256 * 1024 * 1024   # 256 MB
+# Oltre questo numero di barre nuove conviene il ricalcolo batch vettoriale
+_INCREMENTAL_MAX_BARS = 5
+
 
 # ---------------------------------------------------------------------------
 # Implementazioni manuali di fallback
@@ -126,6 +137,7 @@ def _adx_manual(high: pd.Series, low: pd.Series, close: pd.Series, period: int =
 # Funzione principale
 # ---------------------------------------------------------------------------
 
+@timed("engine.compute_indicators")
 def compute_indicators(df_raw: pd.DataFrame) -> Optional[pd.DataFrame]:
     """
     Aggiunge tutti gli indicatori tecnici al DataFrame OHLCV.
@@ -250,3 +262,176 @@ def compute_indicators(df_raw: pd.DataFrame) -> Optional[pd.DataFrame]:
     except Exception as e:
         logger.error(f"[indicators] Errore nel calcolo: {e}", exc_info=True)
         return None
+
+
+# ---------------------------------------------------------------------------
+# Cache indicatori
+# ---------------------------------------------------------------------------
+# Streamlit riesegue lo script ad ogni click: senza cache l'intera watchlist
+# ripassa da compute_indicators anche se i dati grezzi sono identici.
+# Chiave: ticker; l'entry è valida solo se il fingerprint del frame coincide.
+
+_cache_lock = threading.Lock()
+# ticker -> (fingerprint, df_ind, bytes, stato incrementale o None)
+_cache: OrderedDict[str, tuple[tuple, Optional[pd.DataFrame], int, Optional[IncrementalIndicators]]] = OrderedDict()
+_cache_bytes = 0
+
+
+def frame_fingerprint(df_raw: pd.DataFrame) -> tuple:
+    """Fingerprint economico di un frame OHLCV: (ultima data, n. righe, ultimo close)."""
+    if df_raw is None or df_raw.empty or "Close" not in df_raw.columns:
+        return (None, 0, None)
+    return (df_raw.index[-1], len(df_raw), float(df_raw["Close"].iloc[-1]))
+
+
+def _evict_locked() -> None:
+    global _cache_bytes
+    while _cache and (len(_cache) > _CACHE_MAX_ENTRIES or _cache_bytes > _CACHE_MAX_BYTES):
+        _, (_, _, size, _) = _cache.popitem(last=False)
+        _cache_bytes -= size
+
+
+def _tail_position(old_fp: tuple, df_raw: pd.DataFrame) -> int:
+    """
+    Se `df_raw` estende in coda il frame con fingerprint `old_fp`
+    (stessa ultima barra, stesso close, poche barre nuove) ritorna la posizione
+    di quella barra in `df_raw`, altrimenti -1.
+    """
+    last_idx, _, last_close = old_fp
+    if last_idx is None or len(df_raw) < MIN_ROWS:
+        return -1
+    pos = df_raw.index.get_indexer([last_idx])[0]
+    if pos < 0 or not 0 < len(df_raw) - 1 - pos <= _INCREMENTAL_MAX_BARS:
+        return -1
+    if float(df_raw["Close"].iloc[pos]) != last_close:
+        return -1
+    return int(pos)
+
+
+def _advance(entry: tuple, df_raw: pd.DataFrame, pos: int) -> tuple[Optional[pd.DataFrame], IncrementalIndicators]:
+    """
+    Aggiunge le barre nuove al frame in cache con l'aggiornamento O(1) per barra.
+    Ritorna (None, stato) se lo storico è cresciuto in testa: serve il ricalcolo completo.
+    """
+    _, df_ind, _, state = entry
+    clean = df_raw.dropna(subset=["Close", "High", "Low"])
+    if len(clean) < MIN_ROWS or clean.index[199] < df_ind.index[0]:
+        return None, state
+    # Lo storico su disco scorre in avanti (finestra di 2 anni): la testa del batch cambia
+    head_moved = clean.index[199] != df_ind.index[0]
+
+    if state is None:
+        state = IncrementalIndicators.from_history(df_raw.iloc[: pos + 1])
+    rebased = state.rebase(df_raw.iloc[: pos + 1]) if head_moved else {}
+    df_ind = append_bars(df_ind, state, df_raw.iloc[pos + 1:])
+    df_ind = df_ind.loc[df_ind.index >= clean.index[199]].copy()
+
+    if head_moved:
+        # Colonne che dipendono dalla prima barra: ricalcolate fino a `pos`, poi quelle appena aggiunte
+        rebased["OBV_TREND"] = rebased["OBV"] - rebased["OBV"].shift(20)
+        take = rebased["OBV"].index.get_indexer(df_ind.index)
+        for col, series in rebased.items():
+            values = df_ind[col].to_numpy(dtype=float, copy=True)
+            values[take >= 0] = series.to_numpy(dtype=float)[take[take >= 0]]
+            df_ind[col] = values
+        # Massimi/minimi di 52 settimane: NaN finché la finestra non è piena, come nel batch
+        short = df_ind.index < clean.index[251] if len(clean) > 251 else slice(None)
+        df_ind.loc[short, ["HIGH_52W", "LOW_52W"]] = np.nan
+    return df_ind, state
+
+
+def compute_indicators_cached(df_raw: pd.DataFrame, ticker: str) -> Optional[pd.DataFrame]:
+    """
+    Come compute_indicators, ma memoizzato per ticker + fingerprint dei dati.
+
+    Se il frame estende in coda quello in cache di poche barre, gli indicatori
+    vengono avanzati in modo incrementale (engine.incremental) invece di
+    ricalcolare tutto lo storico; se lo storico ha anche perso barre in testa,
+    le colonne che dipendono dalla prima barra vengono riallineate
+    (IncrementalIndicators.rebase). Il risultato coincide con compute_indicators.
+
+    Solo con le implementazioni manuali: le formule di pandas_ta (diverse tra
+    versioni e con TA-Lib) non sono replicate dallo stato incrementale, e
+    ricalcolarne le colonne costa quanto il batch.
+
+    Il DataFrame ritornato è condiviso tra le chiamate: trattarlo in sola lettura
+    (usare .copy() prima di modificarlo).
+    """
+    global _cache_bytes
+    key = ticker.upper()
+    fp  = frame_fingerprint(df_raw)
+    pos = -1
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == fp:
+            _cache.move_to_end(key)
+            return entry[1]
+        if entry is not None and entry[1] is not None and not _HAS_TA:
+            pos = _tail_position(entry[0], df_raw)
+            if pos >= 0:
+                # Fuori dalla cache mentre lo stato viene avanzato: niente aggiornamenti concorrenti
+                del _cache[key]
+                _cache_bytes -= entry[2]
+
+    state: Optional[IncrementalIndicators] = None
+    df_ind: Optional[pd.DataFrame] = None
+    if pos >= 0:
+        try:
+            df_ind, state = _advance(entry, df_raw, pos)
+        except Exception as e:
+            logger.warning(f"[indicators] {key}: aggiornamento incrementale fallito ({e}), ricalcolo completo.")
+            df_ind, state = None, None
+    if df_ind is None:
+        df_ind, state = compute_indicators(df_raw), None
+    _store(key, fp, df_ind, state)
+    return df_ind
+
+
+def _store(key: str, fp: tuple, df_ind: Optional[pd.DataFrame],
+           state: Optional[IncrementalIndicators]) -> None:
+    global _cache_bytes
+    size = int(df_ind.memory_usage(index=True).sum()) if df_ind is not None else 0
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes -= old[2]
+        _cache[key] = (fp, df_ind, size, state)
+        _cache_bytes += size
+        _evict_locked()
+
+
+def cached_indicators(df_raw: pd.DataFrame, ticker: str) -> tuple[bool, Optional[pd.DataFrame]]:
+    """
+    (True, df_ind) se la cache può servire `df_raw` senza ricalcolo completo
+    (stesso fingerprint o poche barre nuove in coda), altrimenti (False, None).
+    Usato da engine.scan per mandare ai worker solo i ticker da calcolare.
+    """
+    key, fp = ticker.upper(), frame_fingerprint(df_raw)
+    with _cache_lock:
+        entry = _cache.get(key)
+        usable = entry is not None and (
+            entry[0] == fp
+            or (entry[1] is not None and not _HAS_TA and _tail_position(entry[0], df_raw) >= 0)
+        )
+    if not usable:
+        return False, None
+    return True, compute_indicators_cached(df_raw, ticker)
+
+
+def store_indicators(df_raw: pd.DataFrame, ticker: str, df_ind: Optional[pd.DataFrame]) -> None:
+    """Inserisce in cache gli indicatori di `df_raw` calcolati altrove (es. in un worker di engine.scan)."""
+    _store(ticker.upper(), frame_fingerprint(df_raw), df_ind, None)
+
+
+def clear_indicator_cache(ticker: Optional[str] = None) -> None:
+    """Svuota la cache indicatori (tutta o per un singolo ticker)."""
+    global _cache_bytes
+    with _cache_lock:
+        if ticker is None:
+            _cache.clear()
+            _cache_bytes = 0
+        else:
+            old = _cache.pop(ticker.upper(), None)
+            if old is not None:
+                _cache_bytes -= old[2]
@@ -0,0 +1,335 @@
+"""
+Panel Indicators — InvestAI
+Calcolo vettoriale degli indicatori su un pannello (barre × ticker).
+
+Invece di chiamare compute_indicators ticker per ticker in un loop Python,
+gli array OHLCV di N ticker vengono impilati in matrici 2-D (T barre × N ticker)
+e ogni indicatore è calcolato colonna per colonna in un unico passaggio NumPy.
+Le formule sono quelle delle implementazioni manuali di engine.indicators.
+
+Il pannello è allineato per posizione della barra, non per data: ogni colonna
+contiene le ultime T sedute del proprio ticker (allineate a destra, NaN in testa
+per gli storici più corti). Così crypto (7/7) e azioni (5/7) mantengono le
+stesse finestre rolling del calcolo per singolo ticker.
+"""
+from __future__ import annotations
+
+import warnings
+from dataclasses import dataclass, field
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from engine.indicators import MIN_ROWS
+
+# Colonne prodotte, nello stesso ordine di compute_indicators
+PANEL_COLUMNS: list[str] = [
+    "SMA_200", "SMA_50", "EMA_21", "EMA_9",
+    "ATR", "BBL", "BBM", "BBU", "HIST_VOL",
+    "RSI", "MACD", "MACD_SIGNAL", "MACD_HIST", "STOCH_K", "STOCH_D",
+    "ROC_10", "ROC_20", "OBV", "MFI", "VWAP_20", "ADX",
+    "PIVOT", "SUPPORT_20", "RESISTANCE_20", "SUPPORT_50", "RESISTANCE_50",
+    "HIGH_52W", "LOW_52W", "OBV_TREND",
+]
+
+# Indicatori che devono essere validi (come il dropna finale di compute_indicators)
+_KEY_COLUMNS = ("SMA_200", "RSI", "MACD", "ATR", "BBL")
+
+
+@dataclass
+class PanelResult:
+    tickers: list[str]
+    last:    dict[str, np.ndarray]                     # indicatore -> (N,) ultima barra
+    valid:   np.ndarray                                # (N,) bool: snapshot utilizzabile
+    history: Optional[dict[str, np.ndarray]] = None    # indicatore -> (T, N)
+    n_bars:  np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=int))
+
+    def snapshot(self) -> pd.DataFrame:
+        """Ultima barra come DataFrame ticker × indicatore (solo ticker validi)."""
+        df = pd.DataFrame(self.last, index=self.tickers)
+        return df.loc[self.valid]
+
+
+# ---------------------------------------------------------------------------
+# Primitive vettoriali (asse 0 = tempo)
+# ---------------------------------------------------------------------------
+
+def _pad(values: np.ndarray, window: int) -> np.ndarray:
+    out = np.full((values.shape[0] + window - 1,) + values.shape[1:], np.nan)
+    out[window - 1:] = values
+    return out
+
+
+def _windows(x: np.ndarray, window: int) -> Optional[np.ndarray]:
+    if x.shape[0] < window:
+        return None
+    return sliding_window_view(x, window, axis=0)   # (T-w+1, N, w)
+
+
+def _rolling(x: np.ndarray, window: int, how: str) -> np.ndarray:
+    """
+    Rolling come pandas con min_periods=window: NaN se la finestra è
+    incompleta o contiene NaN.
+    """
+    w = _windows(x, window)
+    if w is None:
+        return np.full_like(x, np.nan)
+    with np.errstate(invalid="ignore"):
+        if how == "mean":
+            r = w.mean(axis=-1)
+        elif how == "sum":
+            r = w.sum(axis=-1)
+        elif how == "std":
+            return _rolling_std(x, window)
+        elif how == "min":
+            r = w.min(axis=-1)
+        elif how == "max":
+            r = w.max(axis=-1)
+        else:
+            raise ValueError(how)
+    return _pad(r, window)
+
+
+def _window_sums(x: np.ndarray, window: int) -> np.ndarray:
+    """Somme mobili da somme cumulative: (T-w+1, N), senza materializzare le finestre."""
+    c = np.cumsum(x, axis=0)
+    c = np.concatenate([np.zeros((1,) + x.shape[1:]), c])
+    return c[window:] - c[:-window]
+
+
+def _rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    """
+    Deviazione standard campionaria (ddof=1) rolling dalle somme cumulative di
+    x e x²: memoria O(T·N) invece di O(T·N·w). Ogni colonna è centrata sulla
+    propria media prima delle somme per limitare la cancellazione numerica.
+    """
+    nan = ~np.isfinite(x)        # anche ±inf: una sola finestra NaN, non tutte le successive
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)     # colonne tutte NaN
+        center = np.nanmean(np.where(nan, np.nan, x), axis=0)
+    y = np.where(nan, 0.0, x - np.nan_to_num(center))
+    s1 = _window_sums(y, window)
+    s2 = _window_sums(y * y, window)
+    var = np.maximum((s2 - s1 * s1 / window) / (window - 1), 0.0)
+    r = np.sqrt(var)
+    r[_window_sums(nan.astype(float), window) > 0] = np.nan
+    return _pad(r, window)
+
+
+def _ema(x: np.ndarray, span: int) -> np.ndarray:
+    """EMA adjust=False per colonna; ogni colonna parte dal suo primo valore non-NaN."""
+    alpha = 2.0 / (span + 1.0)
+    out = np.empty_like(x)
+    val = np.full(x.shape[1:], np.nan)
+    wt  = np.ones(x.shape[1:])
+    for t in range(x.shape[0]):
+        xt = x[t]
+        obs = ~np.isnan(xt)
+        started = ~np.isnan(val)
+        wt = np.where(started, wt * (1.0 - alpha), wt)
+        upd = started & obs
+        val = np.where(upd, (wt * val + alpha * xt) / (wt + alpha), val)
+        wt  = np.where(upd, 1.0, wt)
+        val = np.where(~started & obs, xt, val)
+        out[t] = val
+    return out
+
+
+def _shift(x: np.ndarray, n: int = 1) -> np.ndarray:
+    out = np.full_like(x, np.nan)
+    out[n:] = x[:-n]
+    return out
+
+
+def _safe_div(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """a / b con b == 0 → NaN (equivalente a .replace(0, np.nan))."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b == 0, np.nan, a / np.where(b == 0, 1.0, b))
+
+
+# ---------------------------------------------------------------------------
+# Funzione principale
+# ---------------------------------------------------------------------------
+
+def compute_indicators_panel(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    tickers: Optional[Sequence[str]] = None,
+    history: bool = False,
+) -> PanelResult:
+    """
+    Calcola tutti gli indicatori di compute_indicators su matrici (T, N).
+
+    Parameters
+    ----------
+    open_, high, low, close, volume : np.ndarray
+        Matrici float (T barre × N ticker) allineate per posizione.
+        NaN in testa per i ticker con storico più corto.
+    tickers : nomi delle colonne (default: indici numerici)
+    history : se True ritorna anche le matrici complete degli indicatori
+
+    Returns
+    -------
+    PanelResult con lo snapshot dell'ultima barra per ticker.
+    """
+    close  = np.asarray(close, dtype=float)
+    high   = np.asarray(high, dtype=float)
+    low    = np.asarray(low, dtype=float)
+    volume = np.nan_to_num(np.asarray(volume, dtype=float), nan=0.0)
+    if close.ndim != 2:
+        raise ValueError("Gli array del pannello devono essere 2-D (barre × ticker).")
+    n_tickers = close.shape[1]
+    names = list(tickers) if tickers is not None else [str(i) for i in range(n_tickers)]
+    # Barre disponibili per ticker (il volume è 0 nella testa NaN: serve solo per la maschera)
+    n_bars = (~np.isnan(close)).sum(axis=0)
+    head = np.isnan(close)
+
+    ind: dict[str, np.ndarray] = {}
+
+    # --- Trend ---
+    ind["SMA_200"] = _rolling(close, 200, "mean")
+    ind["SMA_50"]  = _rolling(close, 50, "mean")
+    ind["EMA_21"]  = _ema(close, 21)
+    ind["EMA_9"]   = _ema(close, 9)
+
+    # --- Volatilità ---
+    prev_close = _shift(close)
+    with np.errstate(invalid="ignore"):
+        tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    ind["ATR"] = _rolling(tr, 14, "mean")
+    mid = _rolling(close, 20, "mean")
+    sd  = _rolling(close, 20, "std")
+    ind["BBL"], ind["BBM"], ind["BBU"] = mid - 2.0 * sd, mid, mid + 2.0 * sd
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = close / prev_close - 1
+    ind["HIST_VOL"] = _rolling(pct, 20, "std") * np.sqrt(252) * 100
+
+    # --- Momentum ---
+    delta = close - prev_close
+    gain = _rolling(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), 14, "mean")
+    loss = _rolling(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), 14, "mean")
+    rs = _safe_div(gain, loss)
+    ind["RSI"] = 100 - 100 / (1 + rs)
+
+    macd = _ema(close, 12) - _ema(close, 26)
+    signal = _ema(macd, 9)
+    ind["MACD"], ind["MACD_SIGNAL"], ind["MACD_HIST"] = macd, signal, macd - signal
+
+    rsi_min = _rolling(ind["RSI"], 14, "min")
+    rsi_max = _rolling(ind["RSI"], 14, "max")
+    ind["STOCH_K"] = _safe_div(ind["RSI"] - rsi_min, rsi_max - rsi_min) * 100
+    ind["STOCH_D"] = _rolling(ind["STOCH_K"], 3, "mean")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ind["ROC_10"] = (close / _shift(close, 10) - 1) * 100
+        ind["ROC_20"] = (close / _shift(close, 20) - 1) * 100
+
+    # --- Volume ---
+    direction = np.sign(delta)
+    ind["OBV"] = np.nan_to_num(direction * volume, nan=0.0).cumsum(axis=0)
+
+    tp  = (high + low + close) / 3
+    rmf = tp * volume
+    prev_tp = _shift(tp)
+    pos_flow = np.where(tp > prev_tp, rmf, 0.0)
+    neg_flow = np.where(tp < prev_tp, rmf, 0.0)
+    pos_flow[head] = np.nan
+    neg_flow[head] = np.nan
+    mfr = _safe_div(_rolling(pos_flow, 14, "sum"), _rolling(neg_flow, 14, "sum"))
+    ind["MFI"] = 100 - 100 / (1 + mfr)
+
+    pv = rmf.copy()
+    vol = volume.copy()
+    pv[head] = np.nan
+    vol[head] = np.nan
+    ind["VWAP_20"] = _safe_div(_rolling(pv, 20, "sum"), _rolling(vol, 20, "sum"))
+
+    # --- ADX ---
+    up_move   = high - _shift(high)
+    down_move = _shift(low) - low
+    with np.errstate(invalid="ignore"):
+        pos_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0.0)
+        neg_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0.0)
+    pos_dm[head] = np.nan
+    neg_dm[head] = np.nan
+    atr_e = _ema(tr, 14)
+    pdi = 100 * _safe_div(_ema(pos_dm, 14), atr_e)
+    ndi = 100 * _safe_div(_ema(neg_dm, 14), atr_e)
+    dx  = 100 * _safe_div(np.abs(pdi - ndi), pdi + ndi)
+    ind["ADX"] = _ema(dx, 14)
+
+    # --- Livelli ---
+    ind["PIVOT"] = tp
+    ind["SUPPORT_20"]    = _rolling(low, 20, "min")
+    ind["RESISTANCE_20"] = _rolling(high, 20, "max")
+    ind["SUPPORT_50"]    = _rolling(low, 50, "min")
+    ind["RESISTANCE_50"] = _rolling(high, 50, "max")
+    ind["HIGH_52W"] = _rolling(high, 252, "max")
+    ind["LOW_52W"]  = _rolling(low, 252, "min")
+
+    ind["OBV_TREND"] = ind["OBV"] - _shift(ind["OBV"], 20)
+
+    # La testa NaN non deve generare valori (OBV cumulato, flussi a zero)
+    for arr in ind.values():
+        arr[head] = np.nan
+
+    last = {k: ind[k][-1].copy() for k in PANEL_COLUMNS}
+    valid = n_bars >= MIN_ROWS
+    for k in _KEY_COLUMNS:
+        valid &= ~np.isnan(last[k])
+
+    return PanelResult(
+        tickers=names,
+        last=last,
+        valid=valid,
+        history={k: ind[k] for k in PANEL_COLUMNS} if history else None,
+        n_bars=n_bars,
+    )
+
+
+def stack_frames(
+    frames: Mapping[str, pd.DataFrame],
+    tickers: Optional[Sequence[str]] = None,
+    n_bars: Optional[int] = None,
+) -> tuple[list[str], dict[str, np.ndarray]]:
+    """
+    Impila i DataFrame OHLCV di più ticker in matrici (T, N) allineate a destra.
+
+    Returns
+    -------
+    (tickers, { "Open"|"High"|"Low"|"Close"|"Volume": np.ndarray (T, N) })
+    """
+    names = [t for t in (tickers if tickers is not None else frames.keys()) if t in frames]
+    clean = {t: frames[t].dropna(subset=["Close", "High", "Low"]) for t in names}
+    depth = max((len(df) for df in clean.values()), default=0)
+    if n_bars is not None:
+        depth = min(depth, n_bars)
+
+    arrays = {c: np.full((depth, len(names)), np.nan) for c in ("Open", "High", "Low", "Close", "Volume")}
+    for j, t in enumerate(names):
+        df = clean[t].iloc[-depth:] if depth else clean[t].iloc[:0]
+        k = len(df)
+        if k == 0:
+            continue
+        for c in arrays:
+            if c in df.columns:
+                arrays[c][depth - k:, j] = df[c].to_numpy(dtype=float)
+    return names, arrays
+
+
+def compute_indicators_frames(
+    frames: Mapping[str, pd.DataFrame],
+    tickers: Optional[Sequence[str]] = None,
+    history: bool = False,
+) -> PanelResult:
+    """Scorciatoia: stack_frames + compute_indicators_panel su { ticker: DataFrame }."""
+    names, arr = stack_frames(frames, tickers)
+    return compute_indicators_panel(
+        arr["Open"], arr["High"], arr["Low"], arr["Close"], arr["Volume"],
+        tickers=names, history=history,
+    )
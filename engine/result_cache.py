@@ -0,0 +1,174 @@
+"""
+Result Cache — InvestAI
+Cache dei risultati di analisi (AnalysisResult / PortfolioAdvice) per ticker.
+
+Streamlit riesegue lo script a ogni interazione: senza questa cache ogni
+click ripassa da analyze (scoring + backtest) per tutte le posizioni e
+per tutto l'universo, anche quando i dati non sono cambiati.
+
+Chiave: ticker (+ tipo asset, + prezzo medio/corrente per i consigli);
+l'entry è valida solo finché il fingerprint del frame grezzo coincide,
+quindi un nuovo download invalida da solo i ticker aggiornati.
+invalidate() permette anche un'invalidazione esplicita e selettiva.
+
+I risultati sono condivisi tra i chiamanti: trattarli in sola lettura.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Iterator, Mapping, Optional, Sequence
+
+import pandas as pd
+
+from engine.indicators import compute_indicators_cached, frame_fingerprint
+from engine.scan import scan_universe
+from engine.scoring import AnalysisResult, PortfolioAdvice, analyze, portfolio_advice
+
+_CACHE_MAX_ENTRIES = 4096
+
+_lock = threading.Lock()
+# (tipo, ticker, parametri) -> (fingerprint, risultato o None se dati insufficienti)
+_cache: OrderedDict[tuple, tuple[tuple, object]] = OrderedDict()
+_MISS = object()
+
+
+def _get(key: tuple, fp: tuple):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != fp:
+            return _MISS
+        _cache.move_to_end(key)
+        return entry[1]
+
+
+def _put(key: tuple, fp: tuple, value) -> None:
+    with _lock:
+        _cache[key] = (fp, value)
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def cached_analysis(df_raw: pd.DataFrame, ticker: str,
+                    asset_type: str = "Azione") -> Optional[AnalysisResult]:
+    """analyze sugli indicatori di `df_raw`; None se i dati sono insufficienti."""
+    t = ticker.upper()
+    key, fp = ("analysis", t, asset_type), frame_fingerprint(df_raw)
+    hit = _get(key, fp)
+    if hit is not _MISS:
+        return hit
+    df_ind = compute_indicators_cached(df_raw, t)
+    res = analyze(df_ind, ticker, asset_type) if df_ind is not None else None
+    _put(key, fp, res)
+    return res
+
+
+def cached_advice(df_raw: pd.DataFrame, ticker: str, avg_price: float,
+                  current_price: Optional[float] = None) -> Optional[PortfolioAdvice]:
+    """portfolio_advice per una posizione; prezzo corrente di default = ultimo Close."""
+    t = ticker.upper()
+    fp = frame_fingerprint(df_raw)
+    if current_price is None:
+        if fp[2] is None:
+            return None
+        current_price = fp[2]
+    # Stessa chiave per "prezzo di default" e ultimo Close esplicito (portafoglio vs consigli)
+    key = ("advice", t, round(float(avg_price), 6), round(float(current_price), 6))
+    hit = _get(key, fp)
+    if hit is not _MISS:
+        return hit
+    df_ind = compute_indicators_cached(df_raw, t)
+    adv = portfolio_advice(df_ind, avg_price, current_price) if df_ind is not None else None
+    _put(key, fp, adv)
+    return adv
+
+
+def scan_cached(
+    frames: Mapping[str, pd.DataFrame],
+    tickers: Optional[Sequence[str]] = None,
+    asset_types: Optional[Mapping[str, str]] = None,
+    workers: Optional[int] = None,
+) -> Iterator[AnalysisResult]:
+    """
+    Come scan_universe(ordered=True), ma i ticker con risultato in cache non
+    vengono ricalcolati: solo i mancanti passano dal pool di processi.
+    """
+    names = [t for t in dict.fromkeys(tickers if tickers is not None else frames) if t in frames]
+    types = asset_types or {}
+    hits: dict[str, object] = {}
+    misses: list[str] = []
+    for t in names:
+        hit = _get(("analysis", t.upper(), types.get(t, "Azione")), frame_fingerprint(frames[t]))
+        if hit is _MISS:
+            misses.append(t)
+        else:
+            hits[t] = hit
+
+    # scan_universe salta i ticker senza dati sufficienti: si allinea per nome
+    fresh = scan_universe(frames, misses, workers, asset_types, ordered=True) if misses else iter(())
+    pending = next(fresh, None)
+    for t in names:
+        if t in hits:
+            if hits[t] is not None:
+                yield hits[t]
+            continue
+        res = None
+        if pending is not None and pending.ticker == t:
+            res, pending = pending, next(fresh, None)
+        _put(("analysis", t.upper(), types.get(t, "Azione")), frame_fingerprint(frames[t]), res)
+        if res is not None:
+            yield res
+
+
+def stream_scan(
+    source: Iterable[Mapping[str, Optional[pd.DataFrame]]],
+    asset_types: Optional[Mapping[str, str]] = None,
+    workers: Optional[int] = None,
+    cancel: Optional[threading.Event] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Iterator[AnalysisResult]:
+    """
+    Scansione progressiva: analizza ogni gruppo di frame prodotto da `source`
+    (es. core.market_data.iter_data) appena arriva, mentre i download dei
+    gruppi successivi proseguono in background. I ticker in cache escono subito.
+
+    `cancel`:   se impostato, la scansione si ferma tra un gruppo e l'altro o al
+                risultato successivo, senza attendere il resto del gruppo.
+    `progress`: chiamata con il numero di ticker elaborati finora, compresi
+                quelli senza dati o con dati insufficienti (che non producono risultati).
+    """
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    done = 0
+    for chunk in source:
+        if cancelled():
+            return
+        frames = {t: df for t, df in chunk.items() if df is not None}
+        # Posizione di ogni ticker nel gruppo: i saltati prima di un risultato contano come elaborati
+        order = {t: i for i, t in enumerate(frames)}
+        results = scan_cached(frames, list(frames), asset_types, workers)
+        try:
+            for res in results:
+                if progress is not None:
+                    progress(done + (len(chunk) - len(frames)) + order[res.ticker] + 1)
+                yield res
+                if cancelled():
+                    return
+        finally:
+            results.close()
+        done += len(chunk)
+        if progress is not None:
+            progress(done)
+
+
+def invalidate(tickers: Optional[Iterable[str]] = None) -> None:
+    """Rimuove i risultati dei ticker indicati (tutti se None)."""
+    with _lock:
+        if tickers is None:
+            _cache.clear()
+            return
+        drop = {t.upper() for t in tickers}
+        for key in [k for k in _cache if k[1] in drop]:
+            del _cache[key]
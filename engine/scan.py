@@ -0,0 +1,192 @@
+"""
+Scan Engine — InvestAI
+Scansione parallela di un universo di ticker: indicatori + scoring
+distribuiti su un pool di processi, risultati restituiti man mano che
+sono pronti.
+
+Il lavoro è CPU-bound (pandas/numpy + backtest), quindi i thread non
+basterebbero per via del GIL. Per universi piccoli il costo di avvio e di
+serializzazione supera il guadagno: sotto _MIN_PARALLEL ticker si resta
+nel processo corrente. Entrambi i percorsi usano la cache indicatori.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, Mapping, Optional, Sequence
+
+import pandas as pd
+
+from engine.indicators import (
+    cached_indicators,
+    compute_indicators,
+    compute_indicators_cached,
+    store_indicators,
+)
+from engine.scoring import AnalysisResult, analyze
+
+logger = logging.getLogger(__name__)
+
+# Numero di processi: INVESTAI_SCAN_WORKERS oppure tutti i core disponibili
+_DEFAULT_WORKERS = int(os.environ.get("INVESTAI_SCAN_WORKERS", "0") or 0) or (os.cpu_count() or 1)
+_MIN_PARALLEL = 24      # sotto questa soglia la scansione resta seriale
+_CHUNK_SIZE   = 6       # ticker per task: ammortizza il costo di pickling
+
+_pool_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool persistente riusato tra le scansioni (l'avvio di un processo con
+    pandas costa centinaia di ms). "forkserver" evita di forkare i thread di
+    Streamlit/Telegram con lock acquisiti.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            methods = mp.get_all_start_methods()
+            ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Chiude il pool di processi (registrato anche con atexit)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _analyze_one(
+    ticker: str, df_raw: pd.DataFrame, df_ind: Optional[pd.DataFrame], asset_type: str, cached: bool,
+) -> tuple[Optional[pd.DataFrame], Optional[AnalysisResult]]:
+    """
+    Indicatori (se `df_ind` è None) + analyze per un ticker. Ritorna
+    (indicatori calcolati qui o None, risultato). Un errore salta il ticker:
+    stessa regola nel percorso seriale e nei worker.
+    """
+    computed = None
+    try:
+        if df_ind is None:
+            df_ind = compute_indicators_cached(df_raw, ticker) if cached else compute_indicators(df_raw)
+            computed = None if cached else df_ind
+        return computed, analyze(df_ind, ticker, asset_type) if df_ind is not None else None
+    except Exception as e:
+        logger.warning(f"[scan] {ticker}: analisi fallita ({e})")
+        return computed, None
+
+
+def _analyze_chunk(
+    items: list[tuple[int, str, pd.DataFrame, Optional[pd.DataFrame], str]],
+) -> list[tuple[int, Optional[pd.DataFrame], Optional[AnalysisResult]]]:
+    """
+    Eseguito nel processo worker: indicatori + analyze per un gruppo di ticker.
+    Gli indicatori calcolati qui (df_ind None in ingresso) vengono restituiti
+    perché il processo principale li metta in cache.
+    """
+    return [(pos, *_analyze_one(ticker, df_raw, df_ind, asset_type, cached=False))
+            for pos, ticker, df_raw, df_ind, asset_type in items]
+
+
+def scan_universe(
+    frames: Mapping[str, pd.DataFrame],
+    tickers: Optional[Sequence[str]] = None,
+    workers: Optional[int] = None,
+    asset_types: Optional[Mapping[str, str]] = None,
+    ordered: bool = False,
+) -> Iterator[AnalysisResult]:
+    """
+    Calcola indicatori e AnalysisResult per ogni ticker di `tickers`
+    presente in `frames`, distribuendo il lavoro su `workers` processi.
+
+    In entrambi i percorsi gli indicatori passano dalla cache di
+    engine.indicators: ai worker vanno calcolati solo i ticker assenti, e i
+    frame che restituiscono riempiono la cache del processo principale.
+    Un ticker la cui analisi fallisce viene registrato nel log e saltato.
+
+    Parameters
+    ----------
+    frames      : { ticker: DataFrame OHLCV } (es. output di get_data_raw)
+    tickers     : ticker da analizzare, nell'ordine desiderato (default: tutti)
+    workers     : numero di processi (default: INVESTAI_SCAN_WORKERS o n. core)
+    asset_types : { ticker: tipo asset } passato ad analyze (default "Azione")
+    ordered     : se True i risultati escono nell'ordine di `tickers`,
+                  altrimenti appena pronti
+
+    Yields
+    ------
+    AnalysisResult per i ticker con dati sufficienti. I risultati sono
+    deterministici: dipendono solo dai dati, non dal numero di worker.
+    """
+    names = [t for t in dict.fromkeys(tickers if tickers is not None else frames) if t in frames]
+    types = asset_types or {}
+    workers = max(1, workers or _DEFAULT_WORKERS)
+
+    if workers == 1 or len(names) < _MIN_PARALLEL:
+        for t in names:
+            _, res = _analyze_one(t, frames[t], None, types.get(t, "Azione"), cached=True)
+            if res is not None:
+                yield res
+        return
+
+    items = []
+    for i, t in enumerate(names):
+        hit, df_ind = cached_indicators(frames[t], t)
+        if hit and df_ind is None:
+            continue   # dati insufficienti, già noto alla cache
+        items.append((i, t, frames[t], df_ind, types.get(t, "Azione")))
+    skipped = set(range(len(names))) - {it[0] for it in items}
+    chunks = [items[i : i + _CHUNK_SIZE] for i in range(0, len(items), _CHUNK_SIZE)]
+    try:
+        futures = {_get_pool(workers).submit(_analyze_chunk, c): c for c in chunks}
+    except BrokenProcessPool:
+        # Un worker è morto in una scansione precedente: si ricrea il pool
+        shutdown_pool()
+        futures = {_get_pool(workers).submit(_analyze_chunk, c): c for c in chunks}
+
+    pending: dict[int, Optional[AnalysisResult]] = dict.fromkeys(skipped)
+    next_pos = 0
+    broken = False
+    try:
+        for fut in as_completed(futures):
+            try:
+                chunk_results = fut.result()
+            except Exception as e:
+                # Pool rotto (worker terminato, OOM...): il gruppo viene rifatto in locale
+                logger.warning(f"[scan] Worker fallito ({e}), ricalcolo locale del gruppo.")
+                broken = broken or isinstance(e, BrokenProcessPool)
+                chunk_results = _analyze_chunk(futures[fut])
+            for pos, df_ind, res in chunk_results:
+                if df_ind is not None:
+                    store_indicators(frames[names[pos]], names[pos], df_ind)
+                if not ordered:
+                    if res is not None:
+                        yield res
+                    continue
+                pending[pos] = res
+                while next_pos in pending:
+                    ready = pending.pop(next_pos)
+                    next_pos += 1
+                    if ready is not None:
+                        yield ready
+    finally:
+        # Scansione interrotta dal chiamante: niente lavoro inutile nel pool
+        for fut in futures:
+            fut.cancel()
+        if broken:
+            shutdown_pool()
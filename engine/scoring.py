@@ -18,6 +18,9 @@ from dataclasses import dataclass, field
 import numpy as np
 import pandas as pd
 
+from core.metrics import timed
+from engine.backtest import event_study
+
 logger = logging.getLogger(__name__)
 
 
@@ -64,6 +67,8 @@ class AnalysisResult:
     backtest_win90: float = 0.0
     backtest_pnl90: float = 0.0
     backtest_n_signals: int = 0   # NUOVO: quanti segnali nel campione
+    backtest_median90:  float = 0.0   # P&L mediano a 90g
+    backtest_mae90:     float = 0.0   # escursione avversa media entro 90g
 
     reasons:  list[str] = field(default_factory=list)
     warnings: list[str] = field(default_factory=list)
@@ -76,6 +81,10 @@ class AnalysisResult:
 # Score componenti
 # ─────────────────────────────────────────────────────────────────────────────
 
+# Pesi dell'Opportunity Score; engine.sweep li usa come profilo di riferimento
+SCORE_WEIGHTS: dict[str, float] = {"trend": 0.35, "momentum": 0.25, "value": 0.20, "volume": 0.20}
+
+
 def _score_trend(df: pd.DataFrame, last: pd.Series) -> tuple[int, list[str], list[str]]:
     """
     FIX P1: usa step discreti per SMA200 invece della formula lineare dist*3.5
@@ -353,67 +362,43 @@ def _score_risk(df: pd.DataFrame, last: pd.Series) -> tuple[int, list[str]]:
     return max(0, min(100, risk)), warnings
 
 
+def component_history(df: pd.DataFrame, window: int = 30) -> pd.DataFrame:
+    """
+    Score componenti (trend, momentum, value, volume) di ogni barra di `df`
+    (output di compute_indicators), con le stesse funzioni usate da analyze.
+    La barra i vede solo le `window` sedute fino a i compresa: nessun look-ahead,
+    stesso risultato di analyze su df.iloc[:i + 1].
+    """
+    out = np.full((len(df), 4), np.nan)
+    for i in range(len(df)):
+        win = df.iloc[max(0, i - window + 1) : i + 1]
+        last = win.iloc[-1]
+        out[i] = (_score_trend(win, last)[0], _score_momentum(win, last)[0],
+                  _score_value(last)[0], _score_volume(win, last)[0])
+    return pd.DataFrame(out, index=df.index, columns=list(SCORE_WEIGHTS))
+
+
 def _run_backtest(df: pd.DataFrame) -> tuple[float, float, float, float, float, float, int]:
     """
     FIX P3: deduplicazione cluster.
     Dopo un segnale, i successivi 5 giorni vengono ignorati per evitare
     che un RSI<40 prolungato generi decine di trade identici.
 
+    Wrapper compatibile su engine.backtest.event_study (implementazione vettoriale).
+
     Returns: (win30, pnl30, win60, pnl60, win90, pnl90, n_segnali_unici)
     """
-    if len(df) < 120:
-        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0
-
-    raw_signals = df[(df["Close"] > df["SMA_200"]) & (df["RSI"] < 40)].index.tolist()
-    if len(raw_signals) < 3:
-        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0
-
-    # FIX: deduplicazione — cooldown 5 giorni di calendario
-    deduped: list = []
-    last_sig = None
-    for sig in raw_signals:
-        if last_sig is None or (sig - last_sig).days >= 5:
-            deduped.append(sig)
-            last_sig = sig
-
-    if len(deduped) < 3:
-        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, len(deduped)
-
-    r30, r60, r90 = [], [], []
-
-    for sig_date in deduped:
-        idx = df.index.get_loc(sig_date)
-        entry = float(df["Close"].iloc[idx])
-        if entry <= 0:
-            continue
-        for days, bucket in [(30, r30), (60, r60), (90, r90)]:
-            exit_idx = idx + days
-            if exit_idx < len(df):
-                exit_p = float(df["Close"].iloc[exit_idx])
-                bucket.append((exit_p - entry) / entry * 100)
-
-    def _agg(res: list[float]) -> tuple[float, float]:
-        if not res:
-            return 0.0, 0.0
-        wr  = sum(1 for x in res if x > 0) / len(res) * 100
-        avg = sum(res) / len(res)
-        # Regressione verso 50% se campione piccolo
-        if len(res) < 12:
-            w = len(res) / 12
-            wr = wr * w + 50 * (1 - w)
-        return round(wr, 1), round(avg, 2)
-
-    w30, p30 = _agg(r30)
-    w60, p60 = _agg(r60)
-    w90, p90 = _agg(r90)
-
-    return w30, p30, w60, p60, w90, p90, len(deduped)
+    bt = event_study(df)
+    h30, h60, h90 = bt.get(30), bt.get(60), bt.get(90)
+    return (h30.win_rate, h30.mean_pnl, h60.win_rate, h60.mean_pnl,
+            h90.win_rate, h90.mean_pnl, bt.n_signals)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Funzione principale
 # ─────────────────────────────────────────────────────────────────────────────
 
+@timed("engine.analyze")
 def analyze(df: pd.DataFrame, ticker: str = "", asset_type: str = "Azione") -> AnalysisResult:
     result = AnalysisResult(ticker=ticker, asset_type=asset_type)
 
@@ -477,8 +462,10 @@ def analyze(df: pd.DataFrame, ticker: str = "", asset_type: str = "Azione") -> A
     result.reasons  = all_reasons
     result.warnings = all_warnings
 
-    # Opportunity Score — pesi: Trend 35%, Momentum 25%, Value 20%, Volume 20%
-    opp_raw = (trend_s * 0.35 + momentum_s * 0.25 + value_s * 0.20 + volume_s * 0.20)
+    # Opportunity Score — pesi (SCORE_WEIGHTS): Trend 35%, Momentum 25%, Value 20%, Volume 20%
+    w = SCORE_WEIGHTS
+    opp_raw = (trend_s * w["trend"] + momentum_s * w["momentum"]
+               + value_s * w["value"] + volume_s * w["volume"])
     result.opportunity_score = max(0, min(100, round(opp_raw)))
 
     # FIX P5 — Confidence Score con ratio pesato (più reasons = penalità minore)
@@ -503,14 +490,18 @@ def analyze(df: pd.DataFrame, ticker: str = "", asset_type: str = "Azione") -> A
     result.confidence_score = max(0, min(100, round(conf_raw)))
 
     # Backtest con deduplicazione
-    w30, p30, w60, p60, w90, p90, n_sig = _run_backtest(df)
-    result.backtest_win30     = w30
-    result.backtest_pnl30     = p30
-    result.backtest_win60     = w60
-    result.backtest_pnl60     = p60
+    bt = event_study(df)
+    h30, h60, h90 = bt.get(30), bt.get(60), bt.get(90)
+    w90, p90, n_sig = h90.win_rate, h90.mean_pnl, bt.n_signals
+    result.backtest_win30     = h30.win_rate
+    result.backtest_pnl30     = h30.mean_pnl
+    result.backtest_win60     = h60.win_rate
+    result.backtest_pnl60     = h60.mean_pnl
     result.backtest_win90     = w90
     result.backtest_pnl90     = p90
     result.backtest_n_signals = n_sig
+    result.backtest_median90  = h90.median_pnl
+    result.backtest_mae90     = h90.mae_mean
 
     # Aggiustamento confidence da backtest
     if n_sig >= 8:
@@ -0,0 +1,139 @@
+"""
+Scan Snapshot — InvestAI
+Risultati dell'ultima scansione dell'universo salvati su disco
+(data/scan_snapshot.json): per ogni ticker score, segnale, target e
+statistiche di backtest (AnalysisResult), più i consigli per le posizioni
+aperte, con timestamp e versione dei dati.
+
+Un solo produttore (engine.warmup, dopo ogni refresh) scrive lo snapshot;
+report giornaliero e /mercato di Telegram, pagina Mercato e pagina Consigli
+lo leggono invece di riscaricare e rianalizzare gli stessi ticker.
+Lo snapshot è valido fino a `valid_until`, cioè fino al refresh successivo
+previsto dal produttore: scaduto o assente, i consumatori calcolano in proprio.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from typing import Iterable, Mapping, Optional
+
+import numpy as np
+
+from core.storage import load_scan_snapshot, save_scan_snapshot, update_scan_snapshot
+from engine.scoring import AnalysisResult, PortfolioAdvice
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+_RESULT_FIELDS = {f.name for f in fields(AnalysisResult)}
+_ADVICE_FIELDS = {f.name for f in fields(PortfolioAdvice)}
+
+
+def _plain(obj):
+    """Tipi NumPy → tipi Python (json.dumps non serializza np.int64/np.bool_)."""
+    if isinstance(obj, dict):
+        return {k: _plain(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_plain(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+@dataclass
+class ScanSnapshot:
+    created_at:   datetime
+    valid_until:  datetime
+    data_version: int
+    tickers:      frozenset[str]                            # universo scansionato (anche senza dati)
+    results:      dict[str, AnalysisResult]
+    advice:       dict[str, tuple[float, PortfolioAdvice]]  # ticker -> (prezzo medio, consiglio)
+
+    def covers(self, tickers: Iterable[str]) -> bool:
+        """True se tutti i `tickers` facevano parte della scansione."""
+        return all(t.upper() in self.tickers for t in tickers)
+
+    def results_for(self, tickers: Iterable[str]) -> list[AnalysisResult]:
+        """Risultati nell'ordine di `tickers`, saltando quelli senza dati sufficienti."""
+        return [self.results[t.upper()] for t in tickers if t.upper() in self.results]
+
+    def advice_for(self, ticker: str, avg_price: float) -> Optional[PortfolioAdvice]:
+        """Consiglio salvato, solo se calcolato con lo stesso prezzo medio della posizione attuale."""
+        hit = self.advice.get(ticker.upper())
+        if hit is None or abs(hit[0] - avg_price) > 1e-6 * max(1.0, abs(avg_price)):
+            return None
+        return hit[1]
+
+
+def write_snapshot(
+    tickers: Iterable[str],
+    results: Mapping[str, AnalysisResult],
+    advice: Mapping[str, tuple[float, PortfolioAdvice]],
+    valid_until: datetime,
+    data_version: int = 0,
+) -> None:
+    """Salva lo snapshot (scrittura atomica via core.storage)."""
+    snap = {
+        "format":       SNAPSHOT_FORMAT,
+        "created_at":   datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "valid_until":  valid_until.astimezone(timezone.utc).isoformat(timespec="seconds"),
+        "data_version": int(data_version),
+        "tickers":      sorted({t.upper() for t in tickers}),
+        "results":      {t: asdict(r) for t, r in results.items()},
+        "advice":       {t: {"avg_price": avg, **asdict(a)} for t, (avg, a) in advice.items()},
+    }
+    save_scan_snapshot(_plain(snap))
+
+
+def read_snapshot(now: Optional[datetime] = None) -> Optional[ScanSnapshot]:
+    """Ultimo snapshot ancora valido; None se assente, scaduto o in un formato diverso."""
+    raw = load_scan_snapshot()
+    if not raw or raw.get("format") != SNAPSHOT_FORMAT:
+        return None
+    try:
+        valid_until = datetime.fromisoformat(raw["valid_until"])
+        if (now or datetime.now(timezone.utc)) > valid_until:
+            return None
+        results = {
+            t: AnalysisResult(**{k: v for k, v in d.items() if k in _RESULT_FIELDS})
+            for t, d in raw.get("results", {}).items()
+        }
+        advice = {
+            t: (float(d["avg_price"]), PortfolioAdvice(**{k: v for k, v in d.items() if k in _ADVICE_FIELDS}))
+            for t, d in raw.get("advice", {}).items()
+        }
+        return ScanSnapshot(
+            created_at=datetime.fromisoformat(raw["created_at"]),
+            valid_until=valid_until,
+            data_version=int(raw.get("data_version", 0)),
+            tickers=frozenset(raw.get("tickers", [])),
+            results=results,
+            advice=advice,
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"[snapshot] Snapshot non leggibile: {e} — ignorato.")
+        return None
+
+
+def discard(tickers: Optional[Iterable[str]] = None) -> None:
+    """
+    Toglie dallo snapshot i ticker indicati (tutti se None), ad es. dopo un
+    refresh manuale: i consumatori li ricalcolano fino al prossimo snapshot.
+    """
+    drop = None if tickers is None else {t.upper() for t in tickers}
+
+    def strip(raw: dict) -> Optional[dict]:
+        if not raw:
+            return None
+        if drop is None:
+            raw["tickers"], raw["results"], raw["advice"] = [], {}, {}
+        else:
+            raw["tickers"] = [t for t in raw.get("tickers", []) if t not in drop]
+            for part in ("results", "advice"):
+                raw[part] = {t: v for t, v in raw.get(part, {}).items() if t not in drop}
+        return raw
+
+    # Sotto il lock dello snapshot: uno snapshot scritto nel frattempo dal warmup non va perso
+    update_scan_snapshot(strip)
@@ -0,0 +1,372 @@
+"""
+Parameter Sweep — InvestAI
+Harness di ottimizzazione per le regole del segnale di backtest e per i
+pesi dell'Opportunity Score di engine.scoring.analyze.
+
+Valuta migliaia di combinazioni (soglia RSI, filtro trend SMA200, cooldown,
+orizzonte di uscita, profilo di pesi trend/momentum/value/volume con soglia
+minima di score) sull'intero universo:
+ - indicatori calcolati una sola volta (pannello vettoriale, engine.panel)
+ - score componenti per barra calcolati una sola volta (scoring.component_history),
+   solo se la griglia contiene una soglia di score > 0
+ - matrici condivise tra i processi via multiprocessing.shared_memory
+   (nessuna copia/pickling per task)
+ - split temporale in-sample / out-of-sample: la classifica usa solo
+   l'in-sample e l'OOS è riportato solo per le prime `top_k` combinazioni
+   selezionate, così la selezione non gonfia i numeri out-of-sample
+
+Uso da riga di comando:
+    python -m engine.sweep --random 2000 --workers 8 --out sweep.csv
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import shared_memory
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from engine.backtest import dedupe_signals, forward_returns, signal_mask
+from engine.indicators import compute_indicators
+from engine.panel import compute_indicators_panel, stack_frames
+from engine.scoring import SCORE_WEIGHTS, component_history
+
+logger = logging.getLogger(__name__)
+
+_BASE_WEIGHTS = tuple(SCORE_WEIGHTS.values())   # (trend, momentum, value, volume)
+
+DEFAULT_GRID: dict[str, list] = {
+    "rsi_max":       [25, 30, 35, 40, 45, 50],
+    "require_trend": [True, False],
+    "cooldown_days": [1, 3, 5, 10, 20],
+    "horizon":       [10, 20, 30, 60, 90],
+    # profili (trend, momentum, value, volume); il primo è quello di analyze
+    "weights":       [_BASE_WEIGHTS, (0.25, 0.25, 0.25, 0.25), (0.45, 0.25, 0.15, 0.15),
+                      (0.25, 0.35, 0.20, 0.20), (0.30, 0.20, 0.30, 0.20)],
+    # Opportunity Score minimo all'ingresso (0 = nessun filtro, i pesi non contano)
+    "min_score":     [0, 40, 50, 60],
+}
+
+_ARRAYS = ("close", "sma200", "rsi", "times")
+_SCORE_ARRAYS = tuple(f"score_{k}" for k in SCORE_WEIGHTS)
+_CHUNK_SIZE = 64   # combinazioni per task
+
+
+@dataclass(frozen=True)
+class SweepParams:
+    rsi_max:       float
+    require_trend: bool
+    cooldown_days: float
+    horizon:       int
+    w_trend:       float = _BASE_WEIGHTS[0]
+    w_momentum:    float = _BASE_WEIGHTS[1]
+    w_value:       float = _BASE_WEIGHTS[2]
+    w_volume:      float = _BASE_WEIGHTS[3]
+    min_score:     float = 0.0
+
+    @property
+    def weights(self) -> tuple[float, float, float, float]:
+        return (self.w_trend, self.w_momentum, self.w_value, self.w_volume)
+
+
+def build_grid(grid: Optional[Mapping[str, Sequence]] = None) -> list[SweepParams]:
+    """
+    Prodotto cartesiano completo della griglia. Con min_score = 0 i pesi non
+    influiscono sul segnale: resta una sola combinazione, con i pesi di analyze.
+    """
+    g = {**DEFAULT_GRID, **(grid or {})}
+    keys = ["rsi_max", "require_trend", "cooldown_days", "horizon", "weights", "min_score"]
+    out: dict[SweepParams, None] = {}
+    for rsi_max, trend, cooldown, horizon, weights, min_score in itertools.product(*(g[k] for k in keys)):
+        if not min_score:
+            weights = _BASE_WEIGHTS
+        out[SweepParams(rsi_max, trend, cooldown, horizon, *weights, min_score=min_score)] = None
+    return list(out)
+
+
+def sample_grid(grid: Optional[Mapping[str, Sequence]], n: int, seed: int = 0) -> list[SweepParams]:
+    """Random search: `n` combinazioni distinte estratte dalla griglia (deterministico con `seed`)."""
+    full = build_grid(grid)
+    if n >= len(full):
+        return full
+    return random.Random(seed).sample(full, n)
+
+
+# ---------------------------------------------------------------------------
+# Preparazione universo
+# ---------------------------------------------------------------------------
+
+def _component_scores(df_raw: pd.DataFrame) -> Optional[pd.DataFrame]:
+    df = compute_indicators(df_raw)
+    return component_history(df) if df is not None else None
+
+
+def _score_arrays(
+    frames: Mapping[str, pd.DataFrame],
+    names: Sequence[str],
+    times: np.ndarray,
+    workers: int = 1,
+) -> dict[str, np.ndarray]:
+    """Score componenti per barra, allineati alla matrice `times` (NaN dove non calcolabili)."""
+    out = {k: np.full(times.shape, np.nan) for k in _SCORE_ARRAYS}
+    raws = [frames[t] for t in names]
+    if workers > 1 and len(raws) > 1:
+        methods = mp.get_all_start_methods()
+        ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            histories = list(pool.map(_component_scores, raws, chunksize=4))
+    else:
+        histories = [_component_scores(df) for df in raws]
+
+    for j, hist in enumerate(histories):
+        if hist is None:
+            continue
+        valid = times[:, j] != np.iinfo(np.int64).min
+        idx = pd.DatetimeIndex(times[valid, j].astype("datetime64[ns]"))
+        if hist.index.tz is not None:   # `times` è in ns UTC
+            idx = idx.tz_localize("UTC").tz_convert(hist.index.tz)
+        aligned = hist.reindex(idx)
+        for k, col in zip(_SCORE_ARRAYS, hist.columns):
+            out[k][valid, j] = aligned[col].to_numpy(dtype=float)
+    return out
+
+
+def prepare_universe(
+    frames: Mapping[str, pd.DataFrame],
+    tickers: Optional[Sequence[str]] = None,
+    scores: bool = False,
+    workers: int = 1,
+) -> tuple[list[str], dict[str, np.ndarray]]:
+    """
+    Calcola una volta sola gli indicatori necessari al segnale su tutto l'universo.
+    Con `scores=True` anche gli score componenti per barra (per i filtri min_score).
+
+    Returns
+    -------
+    (tickers, { "close"|"sma200"|"rsi"[|"score_*"]: float (T, N), "times": int64 ns (T, N) })
+    """
+    names, arr = stack_frames(frames, tickers)
+    panel = compute_indicators_panel(
+        arr["Open"], arr["High"], arr["Low"], arr["Close"], arr["Volume"],
+        tickers=names, history=True,
+    )
+    depth = arr["Close"].shape[0]
+    times = np.full((depth, len(names)), np.iinfo(np.int64).min, dtype=np.int64)
+    for j, t in enumerate(names):
+        idx = frames[t].dropna(subset=["Close", "High", "Low"]).index[-depth:]
+        times[depth - len(idx):, j] = idx.to_numpy(dtype="datetime64[ns]").view("int64")
+    arrays = {
+        "close":  arr["Close"],
+        "sma200": panel.history["SMA_200"],
+        "rsi":    panel.history["RSI"],
+        "times":  times,
+    }
+    if scores:
+        arrays.update(_score_arrays(frames, names, times, workers))
+    return names, arrays
+
+
+# ---------------------------------------------------------------------------
+# Valutazione
+# ---------------------------------------------------------------------------
+
+def _stats(pnl: np.ndarray, prefix: str) -> dict:
+    n = len(pnl)
+    if n == 0:
+        return {f"{prefix}_trades": 0, f"{prefix}_win_rate": 0.0,
+                f"{prefix}_mean_pnl": 0.0, f"{prefix}_median_pnl": 0.0, f"{prefix}_t_stat": 0.0}
+    sd = float(pnl.std(ddof=1)) if n > 1 else 0.0
+    mean = float(pnl.mean())
+    return {
+        f"{prefix}_trades":     n,
+        f"{prefix}_win_rate":   round(float((pnl > 0).mean()) * 100, 1),
+        f"{prefix}_mean_pnl":   round(mean, 2),
+        f"{prefix}_median_pnl": round(float(np.median(pnl)), 2),
+        f"{prefix}_t_stat":     round(mean / sd * math.sqrt(n), 2) if sd > 0 else 0.0,
+    }
+
+
+def evaluate(arrays: Mapping[str, np.ndarray], params: SweepParams, oos_start: int) -> dict:
+    """
+    Backtest di una combinazione su tutti i ticker, trade aggregati.
+    In-sample: ingresso e uscita prima di `oos_start` (ns); out-of-sample: ingresso da `oos_start`.
+    """
+    close, times = arrays["close"], arrays["times"]
+    mask = signal_mask(close, arrays["sma200"], arrays["rsi"], params.rsi_max, params.require_trend)
+    if params.min_score > 0:
+        w = params.weights
+        opp = sum(wk * arrays[k] for wk, k in zip(w, _SCORE_ARRAYS)) / sum(w)
+        with np.errstate(invalid="ignore"):
+            mask &= opp >= params.min_score
+    h = params.horizon
+    is_pnl: list[np.ndarray] = []
+    oos_pnl: list[np.ndarray] = []
+
+    for j in range(close.shape[1]):
+        candidates = np.flatnonzero(mask[:, j])
+        if len(candidates) == 0:
+            continue
+        t = times[:, j]
+        entries = dedupe_signals(t, candidates, params.cooldown_days)
+        entries = entries[entries + h < len(t)]
+        if len(entries) == 0:
+            continue
+        pnl = forward_returns(close[:, j], entries, [h])[:, 0]
+        in_oos = t[entries] >= oos_start
+        exit_in_is = t[entries + h] < oos_start
+        is_pnl.append(pnl[~in_oos & exit_in_is])
+        oos_pnl.append(pnl[in_oos])
+
+    row = asdict(params)
+    row.update(_stats(np.concatenate(is_pnl) if is_pnl else np.empty(0), "is"))
+    row.update(_stats(np.concatenate(oos_pnl) if oos_pnl else np.empty(0), "oos"))
+    return row
+
+
+# ---------------------------------------------------------------------------
+# Memoria condivisa tra processi
+# ---------------------------------------------------------------------------
+
+_worker_arrays: dict[str, np.ndarray] = {}
+_worker_shm: list[shared_memory.SharedMemory] = []
+
+
+def _share(arrays: Mapping[str, np.ndarray]) -> tuple[list[shared_memory.SharedMemory], dict]:
+    """Copia le matrici in blocchi di memoria condivisa; ritorna (blocchi, spec per i worker)."""
+    blocks, specs = [], {}
+    for name in [n for n in (*_ARRAYS, *_SCORE_ARRAYS) if n in arrays]:
+        a = np.ascontiguousarray(arrays[name])
+        shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf)[...] = a
+        blocks.append(shm)
+        specs[name] = (shm.name, a.shape, a.dtype.str)
+    return blocks, specs
+
+
+def _attach(specs: dict) -> None:
+    """Initializer del worker: mappa i blocchi condivisi come array NumPy in sola lettura."""
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        _worker_arrays[name] = arr
+        _worker_shm.append(shm)
+
+
+def _evaluate_chunk(chunk: list[SweepParams], oos_start: int) -> list[dict]:
+    return [evaluate(_worker_arrays, p, oos_start) for p in chunk]
+
+
+# ---------------------------------------------------------------------------
+# Funzione principale
+# ---------------------------------------------------------------------------
+
+def run_sweep(
+    frames: Mapping[str, pd.DataFrame],
+    grid: Optional[Mapping[str, Sequence]] = None,
+    n_random: Optional[int] = None,
+    oos_fraction: float = 0.3,
+    workers: Optional[int] = None,
+    min_trades: int = 30,
+    seed: int = 0,
+    top_k: int = 20,
+) -> pd.DataFrame:
+    """
+    Valuta tutte le combinazioni della griglia (o `n_random` estratte a caso)
+    sull'universo `frames` e ritorna la classifica.
+
+    Parameters
+    ----------
+    frames       : { ticker: DataFrame OHLCV }
+    grid         : override di DEFAULT_GRID
+    n_random     : se valorizzato, random search invece della griglia completa
+    oos_fraction : quota finale del periodo riservata all'out-of-sample
+    workers      : processi (default: n. core; 1 = seriale)
+    min_trades   : trade in-sample minimi per entrare in classifica
+    top_k        : combinazioni selezionate per cui si riportano le metriche OOS
+
+    Returns
+    -------
+    DataFrame ordinato per t-stat in-sample (poi P&L medio in-sample), una riga
+    per combinazione; le combinazioni con meno di `min_trades` trade in-sample
+    finiscono in fondo. Le colonne oos_* sono valorizzate solo per le prime
+    `top_k` combinazioni idonee (colonna `selected`), NaN per le altre: scegliere
+    tra tutte guardando l'OOS lo trasformerebbe in un secondo in-sample.
+    """
+    combos = sample_grid(grid, n_random, seed) if n_random else build_grid(grid)
+    workers = max(1, workers or os.cpu_count() or 1)
+    names, arrays = prepare_universe(frames, scores=any(p.min_score > 0 for p in combos),
+                                     workers=workers)
+    if not names or not combos:
+        return pd.DataFrame()
+
+    valid_t = arrays["times"][arrays["times"] != np.iinfo(np.int64).min]
+    t_min, t_max = int(valid_t.min()), int(valid_t.max())
+    oos_start = int(t_max - oos_fraction * (t_max - t_min))
+
+    logger.info(f"[sweep] {len(combos)} combinazioni × {len(names)} ticker su {workers} processi")
+
+    if workers == 1:
+        rows = [evaluate(arrays, p, oos_start) for p in combos]
+    else:
+        blocks, specs = _share(arrays)
+        try:
+            methods = mp.get_all_start_methods()
+            ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+            chunks = [combos[i : i + _CHUNK_SIZE] for i in range(0, len(combos), _CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                     initializer=_attach, initargs=(specs,)) as pool:
+                rows = [r for part in pool.map(_evaluate_chunk, chunks, itertools.repeat(oos_start))
+                        for r in part]
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    df = pd.DataFrame(rows)
+    df["eligible"] = df["is_trades"] >= min_trades
+    df = df.sort_values(["eligible", "is_t_stat", "is_mean_pnl"], ascending=False, kind="stable")
+    df = df.reset_index(drop=True)
+    df.insert(0, "rank", range(1, len(df) + 1))
+    df["selected"] = df["eligible"] & (df["rank"] <= top_k)
+    df.loc[~df["selected"], [c for c in df.columns if c.startswith("oos_")]] = np.nan
+    return df
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Sweep dei parametri del segnale di backtest.")
+    parser.add_argument("--random", type=int, default=None, help="numero di combinazioni casuali")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--oos", type=float, default=0.3, help="quota out-of-sample (0-1)")
+    parser.add_argument("--min-trades", type=int, default=30)
+    parser.add_argument("--top", type=int, default=20, help="combinazioni con metriche OOS")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="salva la classifica completa in CSV")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    from core.assets import AUTO_SCAN_TICKERS
+    from core.market_data import get_data_raw
+
+    frames = get_data_raw(AUTO_SCAN_TICKERS)
+    table = run_sweep(frames, n_random=args.random, oos_fraction=args.oos,
+                      workers=args.workers, min_trades=args.min_trades, seed=args.seed,
+                      top_k=args.top)
+    with pd.option_context("display.width", 200, "display.max_columns", 30):
+        print(table.head(args.top).to_string(index=False))
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"\nClassifica completa salvata in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Warm-up Service — InvestAI
+Thread in background che tiene caldi dati e analisi dell'universo usato
+dalle pagine: watchlist, ticker in portafoglio (e nello storico transazioni)
+e AUTO_SCAN_TICKERS.
+
+Ogni ciclo scarica i dati (get_data_raw), calcola indicatori e score
+(engine.result_cache) e i consigli per le posizioni aperte; le pagine
+leggono poi lo snapshot in memoria invece di scaricare sul percorso
+della richiesta. I risultati vengono anche salvati su disco
+(engine.snapshot) per Telegram e per le pagine Mercato e Consigli.
+
+Calendario dei refresh, allineato alle chiusure dei mercati:
+ - ogni `interval` secondi mentre almeno un mercato (USA/EU) è aperto
+ - `settle` secondi dopo ogni apertura e chiusura (barra giornaliera definitiva)
+ - al più ogni `idle_interval` secondi a mercati chiusi (crypto, weekend)
+Le festività non sono gestite: nel peggiore dei casi un refresh a vuoto.
+
+Disattivabile con INVESTAI_WARMUP=0.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from core.assets import AUTO_SCAN_TICKERS, classify_asset
+from core.market_data import data_version, get_data_raw
+from core.metrics import timed
+from core.portfolio import get_positions
+from core.storage import load_transactions, load_watchlist
+from engine.result_cache import cached_advice, scan_cached
+from engine.snapshot import write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# mercato -> (timezone, apertura, chiusura), solo giorni feriali
+MARKETS: dict[str, tuple[str, dtime, dtime]] = {
+    "US": ("America/New_York", dtime(9, 30), dtime(16, 0)),
+    "EU": ("Europe/Berlin",    dtime(9, 0),  dtime(17, 30)),
+}
+
+_INTERVAL      = 600                  # a mercati aperti: come il TTL della cache di core.market_data
+_IDLE_INTERVAL = 6 * 3600
+_SETTLE        = 20 * 60              # Yahoo consolida la barra giornaliera dopo la chiusura
+_GRACE         = 5 * 60               # lo snapshot resta valido fino al refresh successivo + margine
+_MAX_INVALIDATIONS = 64               # invalidazioni ricordate per i refresh in corso
+
+
+def _local_events(now: datetime, tz: str, at: dtime, days: int = 8) -> list[datetime]:
+    """Prossime occorrenze (UTC) dell'ora locale `at` nei giorni feriali, a partire da oggi."""
+    zone = ZoneInfo(tz)
+    today = now.astimezone(zone).date()
+    out = []
+    for d in range(days):
+        day = today + timedelta(days=d)
+        if day.weekday() < 5:
+            out.append(datetime.combine(day, at, tzinfo=zone).astimezone(timezone.utc))
+    return out
+
+
+def market_open(now: datetime) -> bool:
+    """True se almeno uno dei MARKETS è in sessione (ora `now`, timezone-aware)."""
+    for tz, open_, close in MARKETS.values():
+        local = now.astimezone(ZoneInfo(tz))
+        if local.weekday() < 5 and open_ <= local.time() < close:
+            return True
+    return False
+
+
+def next_refresh(now: datetime, interval: float = _INTERVAL,
+                 idle_interval: float = _IDLE_INTERVAL, settle: float = _SETTLE) -> datetime:
+    """Istante (UTC) del prossimo refresh secondo il calendario del modulo."""
+    candidates = [now + timedelta(seconds=idle_interval)]
+    if market_open(now):
+        candidates.append(now + timedelta(seconds=interval))
+    for tz, open_, close in MARKETS.values():
+        for at in (open_, close):
+            for ev in _local_events(now, tz, at):
+                ev += timedelta(seconds=settle)
+                if ev > now:
+                    candidates.append(ev)
+                    break
+    return min(candidates)
+
+
+class WarmupService:
+    """Refresh periodico dell'universo in un thread daemon; snapshot in memoria per le pagine."""
+
+    def __init__(self, interval: float = _INTERVAL, idle_interval: float = _IDLE_INTERVAL,
+                 settle: float = _SETTLE, workers: Optional[int] = None):
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.settle = settle
+        self.workers = workers
+        self.frames: dict[str, pd.DataFrame] = {}
+        self.updated_at: Optional[datetime] = None
+        self.valid_until: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._covered: frozenset[str] = frozenset()   # ticker tentati nell'ultimo ciclo
+        # Generazione incrementata da invalidate(), con i ticker tolti (None = tutti):
+        # un refresh partito prima non pubblica i dati scaricati per quei ticker
+        self._generation = 0
+        self._invalidations: deque[tuple[int, Optional[frozenset[str]]]] = deque(maxlen=_MAX_INVALIDATIONS)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Universo e ciclo di refresh
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def universe() -> list[str]:
+        """Watchlist + posizioni + simboli dello storico transazioni + AUTO_SCAN_TICKERS."""
+        names = list(load_watchlist().values()) + list(get_positions())
+        names += [str(t.get("symbol", "")) for t in load_transactions()]
+        names += AUTO_SCAN_TICKERS
+        return list(dict.fromkeys(t.strip().upper() for t in names if t and str(t).strip()))
+
+    @timed("warmup.refresh")
+    def refresh(self) -> None:
+        """Un ciclo completo: download, indicatori + score, consigli per le posizioni, snapshot su disco."""
+        with self._lock:
+            generation = self._generation
+        tickers = self.universe()
+        frames = get_data_raw(tickers)
+        version = data_version()
+        types = {t: classify_asset(t) for t in tickers}
+        results = {r.ticker.upper(): r
+                   for r in scan_cached(frames, tickers, asset_types=types, workers=self.workers)}
+        advice = {}
+        for sym, pos in get_positions().items():
+            if sym in frames:
+                adv = cached_advice(frames[sym], sym, pos["avg_price"])
+                if adv is not None:
+                    advice[sym] = (pos["avg_price"], adv)
+
+        now = datetime.now(timezone.utc)
+        nxt = next_refresh(now, self.interval, self.idle_interval, self.settle)
+        valid_until = nxt + timedelta(seconds=_GRACE)
+        with self._lock:
+            dropped = self._dropped_since(generation)
+            if dropped is not None:
+                self.frames = {t: df for t, df in frames.items() if t not in dropped}
+                self._covered = frozenset(tickers) - dropped
+                self.updated_at = now
+                self.valid_until = valid_until
+                self.last_error = None
+        if dropped is None:
+            # Invalidazione totale durante il download: i dati potrebbero essere vecchi
+            logger.info("[warmup] Snapshot invalidato durante il refresh: ciclo scartato.")
+            self._wake.set()
+            return
+        if dropped:
+            tickers = [t for t in tickers if t not in dropped]
+            results = {t: r for t, r in results.items() if t not in dropped}
+            advice = {t: a for t, a in advice.items() if t not in dropped}
+        try:
+            write_snapshot(tickers, results, advice, valid_until, version)
+        except OSError as e:
+            logger.warning(f"[warmup] Snapshot di scansione non salvato: {e}")
+        logger.info(f"[warmup] {len(frames)}/{len(tickers)} ticker pronti, {len(results)} analizzati; "
+                    f"prossimo refresh {nxt:%Y-%m-%d %H:%M} UTC")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"[warmup] Refresh fallito: {e}")
+            now = datetime.now(timezone.utc)
+            wait = (next_refresh(now, self.interval, self.idle_interval, self.settle) - now).total_seconds()
+            self._wake.wait(max(1.0, wait))
+            self._wake.clear()
+
+    def start(self) -> "WarmupService":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+            logger.info("[warmup] Servizio di warm-up avviato.")
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def request_refresh(self) -> None:
+        """Anticipa il prossimo ciclo (es. dopo un refresh manuale o una nuova posizione)."""
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # Lettura dalle pagine
+    # ------------------------------------------------------------------
+
+    def frames_for(self, tickers: Sequence[str]) -> Optional[dict[str, pd.DataFrame]]:
+        """
+        { ticker: DataFrame } dallo snapshot se tutti i `tickers` sono coperti
+        dall'ultimo ciclo e lo snapshot è ancora valido, altrimenti None
+        (il chiamante scarica normalmente). I ticker non scaricabili restano assenti,
+        come con get_data_raw.
+        """
+        names = {t.strip().upper() for t in tickers if t}
+        with self._lock:
+            if self.valid_until is None or datetime.now(timezone.utc) > self.valid_until:
+                return None
+            if not names <= self._covered:
+                return None
+            return {t: self.frames[t] for t in names if t in self.frames}
+
+    def invalidate(self, tickers: Optional[Sequence[str]] = None) -> None:
+        """
+        Toglie dallo snapshot i ticker indicati (tutti se None): le pagine tornano a scaricarli.
+        Vale anche per un refresh già in corso, che non li pubblicherà.
+        """
+        with self._lock:
+            self._generation += 1
+            if tickers is None:
+                self._invalidations.append((self._generation, None))
+                self._covered = frozenset()
+                self.frames = {}
+                return
+            drop = frozenset(t.strip().upper() for t in tickers if t)
+            self._invalidations.append((self._generation, drop))
+            self._covered = self._covered - drop
+            self.frames = {t: df for t, df in self.frames.items() if t not in drop}
+
+    def _dropped_since(self, generation: int) -> Optional[frozenset[str]]:
+        """Ticker invalidati dopo `generation` (None = tutti o non più ricostruibile). Con _lock acquisito."""
+        if generation == self._generation:
+            return frozenset()
+        if not self._invalidations or self._invalidations[0][0] > generation + 1:
+            return None
+        out: set[str] = set()
+        for gen, drop in self._invalidations:
+            if gen > generation:
+                if drop is None:
+                    return None
+                out |= drop
+        return frozenset(out)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "running":     self._thread is not None and self._thread.is_alive(),
+                "tickers":     len(self.frames),
+                "updated_at":  self.updated_at,
+                "valid_until": self.valid_until,
+                "last_error":  self.last_error,
+            }
+
+
+_service: Optional[WarmupService] = None
+_service_lock = threading.Lock()
+
+
+def start_warmup(**kwargs) -> Optional[WarmupService]:
+    """Avvia (una sola volta per processo) il servizio; None se disattivato con INVESTAI_WARMUP=0."""
+    global _service
+    if os.environ.get("INVESTAI_WARMUP", "1").strip().lower() in ("0", "false", "no", "off"):
+        logger.info("[warmup] Disattivato (INVESTAI_WARMUP=0).")
+        return None
+    with _service_lock:
+        if _service is None:
+            _service = WarmupService(**kwargs)
+        return _service.start()
+
+
+def get_warmup() -> Optional[WarmupService]:
+    """Servizio avviato da start_warmup, se presente."""
+    return _service
@@ -4,6 +4,7 @@ Telegram Bot — InvestAI (Single-User)
 - Il bot è completamente opzionale
 - Non rompe l'app se TELEGRAM_TOKEN è mancante
 - /start salva il chat_id, /stop lo cancella
+- /portafoglio e /mercato girano su un pool dedicato, fuori dal thread di polling
 """
 from __future__ import annotations
 
@@ -11,16 +12,19 @@ import logging
 import os
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Callable, Iterable, Optional
 
 import schedule
 
-from core.storage import get_setting, set_setting, load_settings
+from core.storage import get_setting, set_setting, load_settings, ledger_version
 from core.market_data import get_data_raw
-from core.portfolio import get_portfolio_summary
-from core.assets import AUTO_SCAN_TICKERS
-from engine.indicators import compute_indicators
-from engine.scoring import analyze, portfolio_advice
+from core.portfolio import get_positions
+from core.assets import AUTO_SCAN_TICKERS, classify_asset
+from engine.scoring import AnalysisResult, PortfolioAdvice
+from engine.result_cache import cached_advice, cached_analysis, scan_cached
+from engine.snapshot import ScanSnapshot, read_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -91,77 +95,19 @@ def _register_handlers(b):
 
     @b.message_handler(commands=["portafoglio"])
     def cmd_portfolio(message):
-        chat_id = str(message.chat.id)
-        b.send_message(chat_id, "⏳ Analisi portafoglio in corso...")
-
-        pf, _ = get_portfolio_summary()
-        if not pf:
-            b.send_message(chat_id, "Il portafoglio è vuoto.")
-            return
-
-        all_tickers = list(pf.keys())
-        market_data = get_data_raw(all_tickers)
-
-        msgs: list[str] = []
-        for ticker, pos in pf.items():
-            if ticker not in market_data:
-                continue
-            df_ind = compute_indicators(market_data[ticker])
-            if df_ind is None:
-                continue
-
-            cur_price = float(df_ind["Close"].iloc[-1])
-            adv  = portfolio_advice(df_ind, pos["avg_price"], cur_price)
-            res  = analyze(df_ind, ticker)
-            pnl  = adv.pnl_pct
-            emoji = "🟢" if pnl > 0 else "🔴"
-
-            msgs.append(
-                f"{emoji} <b>{ticker}</b>: {pnl:+.1f}%\n"
-                f"📢 <b>{adv.title}</b>\n"
-                f"🛡️ Trailing Stop: <b>${adv.trailing_stop:.2f}</b>\n"
-                f"🎯 Target: ${res.target:.2f} (+{res.upside_pct:.1f}%)\n"
-                f"🏆 Score: <b>{res.confidence_score}/100</b>\n"
-                f"<i>{adv.advice}</i>"
-            )
-
-        if msgs:
-            b.send_message(chat_id, "💼 <b>PORTAFOGLIO</b>\n\n" + "\n\n".join(msgs))
-        else:
-            b.send_message(chat_id, "Impossibile scaricare i dati.")
+        # Chiave legata alla versione del registro: una nuova transazione invalida la risposta
+        _dispatch_heavy(b, str(message.chat.id), ("portafoglio", ledger_version()),
+                        _portfolio_text, "⏳ Analisi portafoglio in corso...")
 
     @b.message_handler(commands=["mercato"])
     def cmd_market(message):
-        chat_id = str(message.chat.id)
-        b.send_message(chat_id, "🔎 Scansione mercato in corso...")
-
-        market_data = get_data_raw(AUTO_SCAN_TICKERS)
-        opportunities: list[tuple[int, str]] = []
-
-        for ticker in AUTO_SCAN_TICKERS:
-            if ticker not in market_data:
-                continue
-            df_ind = compute_indicators(market_data[ticker])
-            if df_ind is None:
-                continue
-            res = analyze(df_ind, ticker)
-            if res.signal in ("BUY_STRONG", "BUY") and res.confidence_score >= 40:
-                icon = "💎" if res.signal == "BUY_STRONG" else "🟢"
-                msg  = (
-                    f"{icon} <b>{ticker}</b>: {res.action_label}\n"
-                    f"🏆 Score: <b>{res.confidence_score}/100</b>\n"
-                    f"Prezzo: ${res.last_price:.2f} | RSI: {res.rsi:.0f}\n"
-                    f"🎯 Upside: +{res.upside_pct:.1f}%\n"
-                    f"<i>{res.reasons[0] if res.reasons else ''}</i>"
-                )
-                opportunities.append((res.confidence_score, msg))
-
-        if opportunities:
-            opportunities.sort(reverse=True)
-            text = "🚀 <b>TOP OPPORTUNITÀ</b>\n\n" + "\n\n".join(m for _, m in opportunities[:10])
-            b.send_message(chat_id, text)
-        else:
-            b.send_message(chat_id, "Nessuna occasione rilevata al momento.")
+        # Snapshot della scansione ancora valido: risposta immediata, senza pool
+        snap = _snapshot_for(AUTO_SCAN_TICKERS)
+        if snap is not None:
+            b.send_message(message.chat.id, _format_market(snap.results_for(AUTO_SCAN_TICKERS)))
+            return
+        _dispatch_heavy(b, str(message.chat.id), ("mercato",),
+                        _market_text, "🔎 Scansione mercato in corso...")
 
     @b.message_handler(commands=["help"])
     def cmd_help(message):
@@ -177,6 +123,149 @@ def _register_handlers(b):
         )
 
 
+# ---------------------------------------------------------------------------
+# Comandi pesanti: pool dedicato, deduplica e risposte recenti
+# ---------------------------------------------------------------------------
+# /portafoglio e /mercato scaricano e analizzano fino a ~180 ticker: eseguiti
+# nel thread di infinity_polling bloccherebbero tutti gli altri comandi.
+
+_HEAVY_WORKERS = 2       # comandi pesanti eseguiti in parallelo
+_MAX_PENDING   = 8       # comandi pesanti distinti in coda o in corso
+_FRESH_SECONDS = 300     # una risposta più recente viene riusata senza ricalcolo
+
+_heavy_pool = ThreadPoolExecutor(max_workers=_HEAVY_WORKERS, thread_name_prefix="tg-heavy")
+_heavy_lock = threading.Lock()
+_inflight: dict[tuple, list[str]] = {}          # chiave comando -> chat in attesa
+_recent: dict[tuple, tuple[float, str]] = {}    # chiave comando -> (istante monotonic, testo)
+
+
+def _dispatch_heavy(b, chat_id: str, key: tuple, compute: Callable[[], str], ack: str) -> None:
+    """
+    Esegue `compute()` (→ testo della risposta) sul pool dedicato.
+    Se la stessa chiave è già in corso la chat riceverà la stessa risposta;
+    se esiste una risposta più recente di _FRESH_SECONDS viene inviata subito.
+    """
+    with _heavy_lock:
+        now = time.monotonic()
+        hit = _recent.get(key)
+        if hit is not None and now - hit[0] < _FRESH_SECONDS:
+            state, text = "fresh", hit[1]
+        elif key in _inflight:
+            if chat_id not in _inflight[key]:
+                _inflight[key].append(chat_id)
+            state, text = "joined", "⏳ Richiesta già in corso, ti rispondo appena pronta."
+        elif len(_inflight) >= _MAX_PENDING:
+            state, text = "busy", "⚠️ Troppe richieste in corso, riprova tra poco."
+        else:
+            _inflight[key] = [chat_id]
+            state, text = "started", ack
+
+    b.send_message(chat_id, text)
+    if state == "started":
+        _heavy_pool.submit(_run_heavy, b, key, compute)
+
+
+def _run_heavy(b, key: tuple, compute: Callable[[], str]) -> None:
+    try:
+        text, ok = compute(), True
+    except Exception as e:
+        logger.error(f"[telegram] Comando {key[0]} fallito: {e}")
+        text, ok = "❌ Analisi non riuscita, riprova più tardi.", False
+
+    with _heavy_lock:
+        chats = _inflight.pop(key, [])
+        if ok:
+            now = time.monotonic()
+            for k in [k for k, (ts, _) in _recent.items() if now - ts >= _FRESH_SECONDS]:
+                del _recent[k]
+            _recent[key] = (now, text)
+
+    for chat_id in chats:
+        try:
+            b.send_message(chat_id, text)
+        except Exception as e:
+            logger.warning(f"[telegram] Invio a {chat_id} fallito: {e}")
+
+
+def _portfolio_text() -> str:
+    pf = get_positions()
+    if not pf:
+        return "Il portafoglio è vuoto."
+
+    market_data = get_data_raw(list(pf.keys()))
+
+    msgs: list[str] = []
+    for ticker, pos in pf.items():
+        if ticker not in market_data:
+            continue
+        res = cached_analysis(market_data[ticker], ticker, classify_asset(ticker))
+        if res is None:
+            continue
+        adv = cached_advice(market_data[ticker], ticker, pos["avg_price"])
+        pnl = adv.pnl_pct
+        emoji = "🟢" if pnl > 0 else "🔴"
+
+        msgs.append(
+            f"{emoji} <b>{ticker}</b>: {pnl:+.1f}%\n"
+            f"📢 <b>{adv.title}</b>\n"
+            f"🛡️ Trailing Stop: <b>${adv.trailing_stop:.2f}</b>\n"
+            f"🎯 Target: ${res.target:.2f} (+{res.upside_pct:.1f}%)\n"
+            f"🏆 Score: <b>{res.confidence_score}/100</b>\n"
+            f"<i>{adv.advice}</i>"
+        )
+
+    if msgs:
+        return "💼 <b>PORTAFOGLIO</b>\n\n" + "\n\n".join(msgs)
+    return "Impossibile scaricare i dati."
+
+
+def _market_text() -> str:
+    market_data = get_data_raw(AUTO_SCAN_TICKERS)
+    types = {t: classify_asset(t) for t in AUTO_SCAN_TICKERS}
+    return _format_market(scan_cached(market_data, AUTO_SCAN_TICKERS, asset_types=types))
+
+
+def _format_market(results: Iterable[AnalysisResult]) -> str:
+    opportunities: list[tuple[int, str]] = []
+
+    for res in results:
+        ticker = res.ticker
+        if res.signal in ("BUY_STRONG", "BUY") and res.confidence_score >= 40:
+            icon = "💎" if res.signal == "BUY_STRONG" else "🟢"
+            msg  = (
+                f"{icon} <b>{ticker}</b>: {res.action_label}\n"
+                f"🏆 Score: <b>{res.confidence_score}/100</b>\n"
+                f"Prezzo: ${res.last_price:.2f} | RSI: {res.rsi:.0f}\n"
+                f"🎯 Upside: +{res.upside_pct:.1f}%\n"
+                f"<i>{res.reasons[0] if res.reasons else ''}</i>"
+            )
+            opportunities.append((res.confidence_score, msg))
+
+    if opportunities:
+        opportunities.sort(reverse=True)
+        return "🚀 <b>TOP OPPORTUNITÀ</b>\n\n" + "\n\n".join(m for _, m in opportunities[:10])
+    return "Nessuna occasione rilevata al momento."
+
+
+def _snapshot_for(tickers: list[str]) -> Optional[ScanSnapshot]:
+    """Snapshot della scansione (engine.snapshot) se valido e se copre tutti i `tickers`."""
+    snap = read_snapshot()
+    return snap if snap is not None and snap.covers(tickers) else None
+
+
+def _position_advice(ticker: str, avg_price: float, snap: Optional[ScanSnapshot],
+                     market_data: dict) -> Optional[PortfolioAdvice]:
+    """Consiglio dallo snapshot se calcolato con lo stesso prezzo medio, altrimenti dai dati."""
+    if snap is not None:
+        adv = snap.advice_for(ticker, avg_price)
+        if adv is not None:
+            return adv
+        market_data.update(get_data_raw([ticker]))
+    if ticker not in market_data:
+        return None
+    return cached_advice(market_data[ticker], ticker, avg_price)
+
+
 # ---------------------------------------------------------------------------
 # Report giornaliero
 # ---------------------------------------------------------------------------
@@ -193,34 +282,31 @@ def _send_daily_report():
 
     logger.info(f"[telegram] Report giornaliero: {datetime.now()}")
 
-    pf, _ = get_portfolio_summary()
+    pf = get_positions()
     owned_tickers = list(pf.keys())
-    all_tickers   = list(set(owned_tickers + AUTO_SCAN_TICKERS))
-    market_data   = get_data_raw(all_tickers)
+    scan_tickers  = [t for t in AUTO_SCAN_TICKERS if t not in owned_tickers]
+    # Con uno snapshot valido si scaricano solo le posizioni con prezzo medio cambiato
+    snap          = _snapshot_for(owned_tickers + scan_tickers)
+    market_data   = {} if snap is not None else get_data_raw(list(set(owned_tickers + AUTO_SCAN_TICKERS)))
 
     messages: list[str] = []
 
     # Portafoglio: solo alert urgenti
     for ticker, pos in pf.items():
-        if ticker not in market_data:
-            continue
-        df_ind = compute_indicators(market_data[ticker])
-        if df_ind is None:
+        adv = _position_advice(ticker, pos["avg_price"], snap, market_data)
+        if adv is None:
             continue
-        cur_price = float(df_ind["Close"].iloc[-1])
-        adv = portfolio_advice(df_ind, pos["avg_price"], cur_price)
         if any(k in adv.title for k in ["PERICOLO", "INCASSA", "PROTEGGI", "LASCIA CORRERE"]):
             pnl = adv.pnl_pct
             messages.append(f"🚨 <b>{ticker}</b> ({pnl:+.1f}%): {adv.title}")
 
     # Mercato: Golden + alta confidence
-    for ticker in AUTO_SCAN_TICKERS:
-        if ticker in owned_tickers or ticker not in market_data:
-            continue
-        df_ind = compute_indicators(market_data[ticker])
-        if df_ind is None:
-            continue
-        res = analyze(df_ind, ticker)
+    if snap is not None:
+        results = snap.results_for(scan_tickers)
+    else:
+        results = scan_cached(market_data, scan_tickers, asset_types={t: classify_asset(t) for t in scan_tickers})
+    for res in results:
+        ticker = res.ticker
         if res.signal == "BUY_STRONG":
             messages.append(f"💎 <b>{ticker} – GOLDEN!</b> (+{res.upside_pct:.1f}%) [Score: {res.confidence_score}]")
         elif res.signal == "BUY" and res.confidence_score >= 60:
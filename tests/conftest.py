@@ -0,0 +1,37 @@
+"""
+Fixture comuni dei test: nessun accesso alla rete e nessuna scrittura in data/.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.fixtures import synthetic_ohlcv  # noqa: E402
+from core import market_data, storage  # noqa: E402
+from core.providers import FixtureProvider, set_provider  # noqa: E402
+from core.tx_store import SqliteTransactionStore  # noqa: E402
+
+
+@pytest.fixture
+def fixture_provider():
+    """Installa un FixtureProvider (ticker sintetici AAA, BBB, CCC) e ripristina il precedente."""
+    frames = {t: synthetic_ohlcv(300, seed=i) for i, t in enumerate(("AAA", "BBB", "CCC"))}
+    provider = FixtureProvider(frames=frames, retry_backoff=0.0)
+    previous = set_provider(provider)
+    market_data.clear_cache()
+    yield provider
+    set_provider(previous)
+    market_data.clear_cache()
+
+
+@pytest.fixture
+def tx_store(tmp_path, monkeypatch):
+    """Registro transazioni SQLite in una cartella temporanea, usato da core.storage."""
+    store = SqliteTransactionStore(tmp_path / "transactions.db", legacy_json=tmp_path / "transactions.json")
+    monkeypatch.setattr(storage, "_tx_store", store)
+    yield store
+    store.close()
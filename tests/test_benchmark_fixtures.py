@@ -0,0 +1,29 @@
+"""benchmarks.fixtures: dati sintetici deterministici e registri coerenti."""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from benchmarks.fixtures import synthetic_transactions, synthetic_universe
+
+
+def test_transactions_never_sell_more_than_held():
+    frames = synthetic_universe(5, 400, seed=2)
+    txs = synthetic_transactions(frames, 2000, seed=3)
+
+    assert [t["date"] for t in txs] == sorted(t["date"] for t in txs)
+    assert [t["id"] for t in txs] == list(range(1, len(txs) + 1))
+    held: dict[str, float] = defaultdict(float)
+    n_sells = 0
+    for tx in txs:
+        if tx["type"] == "SELL":
+            n_sells += 1
+            assert tx["quantity"] <= held[tx["symbol"]] + 1e-9
+            held[tx["symbol"]] -= tx["quantity"]
+        else:
+            held[tx["symbol"]] += tx["quantity"]
+    assert n_sells > 100
+
+
+def test_transactions_are_deterministic():
+    frames = synthetic_universe(3, 300, seed=1)
+    assert synthetic_transactions(frames, 200, seed=7) == synthetic_transactions(frames, 200, seed=7)
@@ -0,0 +1,64 @@
+"""engine.indicators: percorso incrementale di compute_indicators_cached contro il calcolo batch."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from engine import indicators
+
+batch = indicators.compute_indicators
+
+
+@pytest.fixture
+def full_runs(monkeypatch):
+    """Lunghezze dei frame ricalcolati da zero da compute_indicators_cached."""
+    indicators.clear_indicator_cache()
+    runs = []
+
+    def counting(df_raw):
+        runs.append(len(df_raw))
+        return batch(df_raw)
+
+    monkeypatch.setattr(indicators, "compute_indicators", counting)
+    yield runs
+    indicators.clear_indicator_cache()
+
+
+def _assert_same(got: pd.DataFrame, ref: pd.DataFrame) -> None:
+    assert got.index.equals(ref.index)
+    assert list(got.columns) == list(ref.columns)
+    for col in ref.columns:
+        np.testing.assert_allclose(got[col].to_numpy(float), ref[col].to_numpy(float),
+                                   rtol=1e-9, atol=1e-9, err_msg=col)
+
+
+def _run(df: pd.DataFrame, windows: list[tuple[int, int]]) -> None:
+    for start, end in windows:
+        frame = df.iloc[start:end]
+        _assert_same(indicators.compute_indicators_cached(frame, "AAA"), batch(frame))
+
+
+def test_extend_matches_batch(full_runs):
+    df = synthetic_ohlcv(600, seed=4)
+    indicators.compute_indicators_cached(df.iloc[:500], "AAA")
+    _run(df, [(0, 501), (0, 504), (0, 509)])
+    if not indicators._HAS_TA:
+        assert full_runs == [500]
+
+
+def test_trimmed_head_matches_batch(full_runs):
+    # Come core.price_store.merge_tail: barre nuove in coda, finestra di 2 anni che perde la testa
+    df = synthetic_ohlcv(600, seed=5)
+    indicators.compute_indicators_cached(df.iloc[:500], "AAA")
+    _run(df, [(1, 501), (3, 504), (3, 505), (60, 509)])
+    if not indicators._HAS_TA:
+        assert full_runs == [500]
+
+
+def test_longer_head_is_recomputed(full_runs):
+    df = synthetic_ohlcv(600, seed=6)
+    indicators.compute_indicators_cached(df.iloc[10:500], "AAA")
+    _run(df, [(0, 502)])
+    assert full_runs == [490, 502]
@@ -0,0 +1,132 @@
+"""Registro transazioni in modalità journal: replay, compattazione, errori di lettura."""
+from __future__ import annotations
+
+import json
+import multiprocessing as mp
+
+import pytest
+
+from core import storage
+from core.tx_store import JournalTransactionStore
+
+
+def _tx(symbol="AAPL", qty=1.0, price=100.0, **extra):
+    return {"symbol": symbol, "date": "2024-01-02", "type": "BUY", "quantity": qty, "price": price,
+            "fee": 0.0, **extra}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return JournalTransactionStore(tmp_path / "snap.json", tmp_path / "journal.jsonl",
+                                   legacy_json=tmp_path / "transactions.json", compact_events=1000)
+
+
+def _reopen(store: JournalTransactionStore) -> JournalTransactionStore:
+    return JournalTransactionStore(store.snapshot, store.journal, legacy_json=store.legacy_json,
+                                   compact_events=store.compact_events)
+
+
+def test_replay_after_reopen(journal):
+    ids = [journal.add(_tx(qty=i + 1)) for i in range(3)]
+    journal.apply_changes({ids[1]: {"price": 120.0}}, [ids[0]])
+    expected = journal.load()
+
+    fresh = _reopen(journal)
+    assert fresh.load() == expected
+    assert fresh.version() == journal.version() == 4
+
+
+def test_ids_are_not_reused(journal):
+    a = journal.add(_tx())
+    b = journal.add(_tx())
+    journal.apply_changes({}, [b])
+    c = journal.add(_tx())
+    assert (a, b, c) == (1, 2, 3)
+
+    # Anche dopo la compattazione (l'ID 3 non compare più nel log) e la riapertura
+    journal.apply_changes({}, [c])
+    journal.compact()
+    assert _reopen(journal).add(_tx()) == 4
+
+
+def test_truncated_last_line_is_ignored(journal):
+    journal.add(_tx("AAPL"))
+    journal.add(_tx("MSFT"))
+    with journal.journal.open("a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "op": "add", "tx": {"id": 3, "sym')     # crash durante l'append
+
+    fresh = _reopen(journal)
+    assert [t["symbol"] for t in fresh.load()] == ["AAPL", "MSFT"]
+    # L'append successivo chiude la riga troncata e prosegue
+    assert fresh.add(_tx("NVDA")) == 3
+    assert [t["symbol"] for t in _reopen(journal).load()] == ["AAPL", "MSFT", "NVDA"]
+
+
+@pytest.mark.parametrize("content", [
+    "{not json",
+    json.dumps({"seq": 1, "transactions": [{"symbol": "AAPL"}]}),      # riga senza id
+    json.dumps({"seq": 1, "transactions": [{"id": "x"}]}),
+    json.dumps([1, 2, 3]),
+])
+def test_corrupt_snapshot_raises_value_error(journal, content):
+    journal.snapshot.write_text(content, encoding="utf-8")
+    with pytest.raises(ValueError):
+        journal.load()
+
+
+def test_bad_event_raises_value_error(journal):
+    journal.add(_tx())
+    with journal.journal.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"seq": 2, "op": "add", "tx": {"symbol": "MSFT"}}) + "\n")
+    with pytest.raises(ValueError):
+        _reopen(journal).load()
+
+
+def test_corrupt_snapshot_falls_back_in_storage(journal, monkeypatch):
+    journal.snapshot.write_text(json.dumps({"seq": 1, "transactions": [{"symbol": "AAPL"}]}), encoding="utf-8")
+    monkeypatch.setattr(storage, "_tx_store", journal)
+    assert storage.load_transactions() == []
+
+
+def test_legacy_migration_assigns_missing_ids(journal):
+    rows = [{"id": 5, **_tx("AAPL")}, _tx("MSFT"), {"id": None, **_tx("NVDA")}]
+    journal.legacy_json.write_text(json.dumps(rows), encoding="utf-8")
+
+    loaded = journal.load()
+    assert [(t["id"], t["symbol"]) for t in loaded] == [(5, "AAPL"), (6, "MSFT"), (7, "NVDA")]
+    assert not journal.legacy_json.exists()
+    assert journal.add(_tx("TSLA")) == 8
+
+
+def test_compaction_keeps_state(journal):
+    journal.compact_events = 5
+    for i in range(12):
+        journal.add(_tx(qty=i + 1))
+    journal.apply_changes({3: {"quantity": 99.0}}, [1])
+    expected = journal.load()
+    assert journal.journal.stat().st_size < 2000
+    assert _reopen(journal).load() == expected
+
+
+def _add_many(snapshot, journal, n):
+    store = JournalTransactionStore(snapshot, journal, compact_events=7)
+    for i in range(n):
+        store.add(_tx(qty=i + 1))
+
+
+def test_concurrent_processes_keep_every_event(tmp_path):
+    # App e bot scrivono sullo stesso journal da processi diversi, con compattazioni frequenti
+    if "fork" not in mp.get_all_start_methods():
+        pytest.skip("serve il fork")
+    ctx = mp.get_context("fork")
+    snapshot, journal = tmp_path / "snap.json", tmp_path / "journal.jsonl"
+    procs = [ctx.Process(target=_add_many, args=(snapshot, journal, 40)) for _ in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+
+    store = JournalTransactionStore(snapshot, journal)
+    assert [t["id"] for t in store.load()] == list(range(1, 121))
+    assert store.version() == 120
@@ -0,0 +1,141 @@
+"""core.lots: confronto con un'implementazione lotto per lotto su registri casuali."""
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+import pytest
+
+from core.lots import COST_METHODS, Ledger, Lots
+
+
+class NaiveLots:
+    """Riferimento: lista di lotti [quantità, costo unitario] consumati uno alla volta."""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.lots: deque[list[float]] = deque()
+        self.realized = 0.0
+
+    @property
+    def qty(self) -> float:
+        return sum(q for q, _ in self.lots)
+
+    @property
+    def cost(self) -> float:
+        return sum(q * u for q, u in self.lots)
+
+    def buy(self, qty: float, price: float, fee: float) -> None:
+        unit = (qty * price + fee) / qty
+        if self.method == "average" and self.lots:
+            q, c = self.qty, self.cost
+            self.lots = deque([[q + qty, (c + qty * unit) / (q + qty)]])
+        else:
+            self.lots.append([qty, unit])
+
+    def sell(self, qty: float, price: float, fee: float) -> float:
+        sold = min(qty, self.qty)
+        if sold <= 0:
+            return 0.0
+        removed, left = 0.0, sold
+        while left > 1e-12 and self.lots:
+            lot = self.lots[-1] if self.method == "lifo" else self.lots[0]
+            take = min(lot[0], left)
+            removed += take * lot[1]
+            lot[0] -= take
+            left -= take
+            if lot[0] <= 1e-12:
+                self.lots.pop() if self.method == "lifo" else self.lots.popleft()
+        pnl = sold * price - fee - removed
+        self.realized += pnl
+        return pnl
+
+    def open_lots(self) -> list[tuple[float, float]]:
+        return [(q, u) for q, u in self.lots if q > 1e-9]
+
+
+def _random_ledger(rng: np.random.Generator, n: int) -> list[tuple[str, float, float, float]]:
+    """Sequenza di (tipo, quantità, prezzo, fee) con vendite parziali, uscite totali e vendite oltre il posseduto."""
+    ops, held = [], 0.0
+    for _ in range(n):
+        price = float(np.round(rng.uniform(5, 500), 2))
+        fee = float(np.round(rng.choice([0.0, rng.uniform(0, 5)]), 2))
+        r = rng.random()
+        if held <= 0 or r < 0.55:
+            qty = float(np.round(rng.uniform(0.01, 50), rng.integers(0, 4)) or 1.0)
+            ops.append(("BUY", qty, price, fee))
+            held += qty
+        elif r < 0.7:
+            ops.append(("SELL", held, price, fee))                      # uscita totale
+            held = 0.0
+        elif r < 0.75:
+            ops.append(("SELL", held * 1.5 + 1, price, fee))            # oltre il posseduto
+            held = 0.0
+        else:
+            qty = float(held * rng.uniform(0.05, 0.95))
+            ops.append(("SELL", qty, price, fee))
+            held -= qty
+    return ops
+
+
+@pytest.mark.parametrize("method", COST_METHODS)
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_naive_reference(method, seed):
+    rng = np.random.default_rng(seed)
+    lots, ref = Lots(method, capacity=2), NaiveLots(method)     # capacità minima: forza _grow
+
+    for tx_type, qty, price, fee in _random_ledger(rng, 300):
+        if tx_type == "BUY":
+            lots.buy(qty, price, fee)
+            ref.buy(qty, price, fee)
+        else:
+            assert lots.sell(qty, price, fee) == pytest.approx(ref.sell(qty, price, fee), rel=1e-9, abs=1e-6)
+
+        assert lots.qty == pytest.approx(ref.qty, rel=1e-9, abs=1e-8)
+        assert lots.cost == pytest.approx(ref.cost, rel=1e-9, abs=1e-6)
+        assert lots.realized == pytest.approx(ref.realized, rel=1e-9, abs=1e-6)
+        if method != "average":
+            got, want = lots.open_lots(), ref.open_lots()
+            assert len(got) == len(want)
+            for (gq, gu), (wq, wu) in zip(got, want):
+                assert gq == pytest.approx(wq, rel=1e-9, abs=1e-8)
+                assert gu == pytest.approx(wu, rel=1e-9)
+
+
+def test_fifo_and_lifo_pick_different_lots():
+    fifo, lifo = Lots("fifo"), Lots("lifo")
+    for lots in (fifo, lifo):
+        lots.buy(10, 100.0)
+        lots.buy(10, 200.0)
+        lots.sell(15, 300.0)
+    assert fifo.open_lots() == [(5.0, 200.0)]
+    assert lifo.open_lots() == [(5.0, 100.0)]
+    assert fifo.realized == pytest.approx(15 * 300 - (10 * 100 + 5 * 200))
+    assert lifo.realized == pytest.approx(15 * 300 - (10 * 200 + 5 * 100))
+
+
+def test_full_exit_then_rebuy_starts_fresh():
+    for method in COST_METHODS:
+        lots = Lots(method)
+        lots.buy(3, 50.0, fee=1.5)
+        lots.sell(3, 60.0)
+        assert lots.qty == 0.0 and lots.cost == 0.0 and lots.open_lots() == []
+        lots.buy(2, 10.0)
+        assert lots.avg_price == pytest.approx(10.0)
+
+
+def test_ledger_positions_and_invalid_rows():
+    ledger = Ledger("fifo")
+    assert ledger.apply({"symbol": "", "quantity": 1, "price": 1}) is None
+    assert ledger.apply({"symbol": "aapl", "quantity": 0, "price": 1}) is None
+    ledger.apply({"symbol": "aapl", "type": "BUY", "quantity": 4, "price": 10.0, "fee": 2.0})
+    ledger.apply({"symbol": "AAPL", "type": "SELL", "quantity": 1, "price": 20.0})
+    ledger.apply({"symbol": "MSFT", "type": "BUY", "quantity": 1, "price": 5.0})
+    ledger.apply({"symbol": "MSFT", "type": "SELL", "quantity": 1, "price": 6.0})
+
+    pos = ledger.positions()
+    assert list(pos) == ["AAPL"]
+    assert pos["AAPL"]["qty"] == pytest.approx(3)
+    assert pos["AAPL"]["avg_price"] == pytest.approx(10.5)
+    assert pos["AAPL"]["realized_pnl"] == pytest.approx(20 - 10.5)
+    assert ledger.positions(include_closed=True)["MSFT"]["realized_pnl"] == pytest.approx(1.0)
@@ -0,0 +1,244 @@
+"""core.market_data: single-flight di get_data_raw e iter_data, pannello Close, storico su disco, rate limiter."""
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import market_data
+
+
+def _wait_released(timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with market_data._inflight_lock:
+            if not market_data._inflight:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_concurrent_callers_share_one_fetch(fixture_provider):
+    fixture_provider.latency = 0.2
+    barrier = threading.Barrier(4)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(market_data.get_data_raw(["AAA", "BBB"]))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert fixture_provider.stats["calls"] == 1
+    assert all(set(r) == {"AAA", "BBB"} for r in results)
+    assert all(r["AAA"] is results[0]["AAA"] for r in results)
+    assert _wait_released()
+
+
+def test_failed_fetch_releases_claim(fixture_provider):
+    fixture_provider.failure_rate = 1.0
+    assert market_data.get_data_raw(["AAA", "BBB"]) == {}
+    assert _wait_released()
+
+    fixture_provider.failure_rate = 0.0
+    assert set(market_data.get_data_raw(["AAA", "BBB"])) == {"AAA", "BBB"}
+
+
+def test_waiter_of_failed_fetch_gets_nothing(fixture_provider):
+    fixture_provider.failure_rate = 1.0
+    fixture_provider.latency = 0.2
+    barrier = threading.Barrier(2)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(market_data.get_data_raw(["AAA"]))
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [{}, {}]
+    assert _wait_released()
+
+
+def test_iter_data_releases_when_consumer_stops(fixture_provider):
+    fixture_provider.latency = 0.1
+    stream = market_data.iter_data(["AAA", "BBB", "CCC"], batch_size=1)
+    first = next(stream)
+    assert len(first) == 1
+    stream.close()
+
+    # I batch ancora in corso liberano i propri ticker al termine
+    assert _wait_released()
+    assert set(market_data.get_data_raw(["AAA", "BBB", "CCC"])) == {"AAA", "BBB", "CCC"}
+    assert fixture_provider.stats["tickers"] == 3
+
+
+def test_iter_data_failed_batch_yields_none(fixture_provider):
+    fixture_provider.failure_rate = 1.0
+    chunks = list(market_data.iter_data(["AAA", "BBB"]))
+    merged = {t: df for chunk in chunks for t, df in chunk.items()}
+    assert merged == {"AAA": None, "BBB": None}
+    assert _wait_released()
+
+
+def test_session_returns_keep_monday_for_equities():
+    days = pd.date_range("2024-01-01", periods=14, freq="D")          # include due weekend
+    crypto = pd.DataFrame({"Close": np.linspace(100, 113, 14)}, index=days)
+    bdays = days[days.dayofweek < 5]
+    equity = pd.DataFrame({"Close": np.arange(len(bdays), dtype=float) + 50}, index=bdays)
+    panel = market_data.build_close_panel({"BTC-USD": crypto, "AAPL": equity})
+
+    naive = panel.pct_change(fill_method=None)
+    rets = market_data.session_returns(panel)
+    monday = pd.Timestamp("2024-01-08")
+
+    assert np.isnan(naive.loc[monday, "AAPL"])
+    assert rets.loc[monday, "AAPL"] == panel.loc[monday, "AAPL"] / panel.loc["2024-01-05", "AAPL"] - 1
+    assert rets["AAPL"].notna().sum() == len(bdays) - 1
+    assert rets["BTC-USD"].notna().sum() == len(days) - 1
+    assert rets.index.equals(panel.index)
+
+
+def test_stream_scan_counts_tickers_without_results(fixture_provider):
+    from engine.result_cache import stream_scan
+
+    chunks = [{"AAA": None, "BBB": market_data.get_data_raw(["BBB"])["BBB"]}, {"CCC": None}]
+    seen = []
+    results = list(stream_scan(iter(chunks), progress=seen.append))
+
+    assert [r.ticker for r in results] == ["BBB"]
+    assert seen[-1] == 3
+    assert seen == sorted(seen)
+
+
+def test_stream_scan_stops_between_groups(fixture_provider):
+    from engine.result_cache import stream_scan
+
+    frames = market_data.get_data_raw(["AAA", "BBB"])
+    cancel = threading.Event()
+    pulled = []
+
+    def source():
+        for t in ("AAA", "BBB"):
+            pulled.append(t)
+            yield {t: frames[t]}
+
+    stream = stream_scan(source(), cancel=cancel)
+    assert next(stream).ticker == "AAA"
+    cancel.set()
+    assert list(stream) == []
+    assert pulled == ["AAA"]
+
+
+def _saving(monkeypatch, provider):
+    """Provider persistente con save_prices intercettato: ritorna la lista dei salvataggi."""
+    saved = []
+    provider.persistent = True
+    monkeypatch.setattr(market_data, "save_prices", lambda t, df: saved.append((t, df)))
+    return saved
+
+
+def test_unchanged_merge_is_not_rewritten(fixture_provider, monkeypatch):
+    saved = _saving(monkeypatch, fixture_provider)
+    full = fixture_provider._frame("AAA")
+    stored = full.iloc[:-1]
+
+    # Coda già tutta su disco (es. weekend): nessuna scrittura
+    assert market_data._finalize("AAA", stored.iloc[-5:].copy(), stored) is not None
+    assert market_data._finalize("AAA", None, stored) is not None
+    assert saved == []
+
+    # Una barra nuova: una scrittura
+    df = market_data._finalize("AAA", full.iloc[-5:].copy(), stored)
+    assert len(saved) == 1 and df.index[-1] == full.index[-1]
+
+
+def test_rebased_tail_refetches_full_history(fixture_provider, monkeypatch):
+    saved = _saving(monkeypatch, fixture_provider)
+    full = fixture_provider._frame("AAA")
+    # Storico salvato prima di uno split 2:1 (prezzi doppi rispetto alla base attuale)
+    stored = full.iloc[:-2].copy()
+    stored[["Open", "High", "Low", "Close"]] *= 2.0
+
+    df = market_data._finalize("AAA", full.iloc[-8:].copy(), stored)
+
+    assert fixture_provider.stats["calls"] == 1
+    pd.testing.assert_frame_equal(df, full, check_freq=False)
+    assert len(saved) == 1 and saved[0][1] is df
+
+
+def test_dividend_adjustment_is_detected():
+    from core.price_store import adjustment_changed
+
+    days = pd.bdate_range("2024-01-01", periods=10)
+    close = np.linspace(100.0, 109.0, 10)
+    stored = pd.DataFrame({"Close": close, "Adj Close": close}, index=days)
+    fresh = stored.iloc[-4:].copy()
+    assert not adjustment_changed(stored, fresh)
+
+    # Ultima barra salvata (parziale) riallineata: non è un ribasamento
+    fresh.iloc[-1, 0] += 0.5
+    assert not adjustment_changed(stored, fresh)
+
+    # Stacco del dividendo: Adj Close delle barre precedenti ribasato
+    fresh["Adj Close"] *= 0.99
+    assert adjustment_changed(stored, fresh)
+
+
+class _FakeClock:
+    """Sostituisce il modulo time in core.market_data: sleep avanza l'orologio senza attendere."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_burst_then_rate(monkeypatch):
+    clock = _FakeClock()
+    monkeypatch.setattr(market_data, "time", clock)
+    bucket = market_data._TokenBucket(rate=4.0, burst=3)
+
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == [] and clock.now == 1000.0     # burst senza attese
+
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(1001.0)             # poi 4 richieste al secondo
+    assert clock.sleeps == pytest.approx([0.25] * 4)
+
+    # Dopo una lunga pausa i token si ricaricano solo fino al burst
+    clock.now += 60.0
+    clock.sleeps.clear()
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.sleeps == pytest.approx([0.25])
+
+
+def test_only_rate_limited_providers_use_the_bucket(fixture_provider, monkeypatch):
+    acquired = []
+    monkeypatch.setattr(market_data._bucket, "acquire", lambda: acquired.append(1))
+    market_data._yf_download("AAA", period="1y")
+    assert acquired == []
+
+    fixture_provider.rate_limited = True
+    market_data._yf_download("AAA", period="1y")
+    assert acquired == [1]
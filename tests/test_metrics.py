@@ -0,0 +1,72 @@
+"""core.metrics: istogrammi cumulativi ed esportazione Prometheus."""
+from __future__ import annotations
+
+import pytest
+
+from core import metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    was = metrics.is_enabled()
+    metrics.reset()
+    yield
+    metrics.reset()
+    metrics.enable(was)
+
+
+def _samples(text: str) -> dict[str, float]:
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+            for line in text.splitlines() if line and not line.startswith("#")}
+
+
+def test_prometheus_buckets_are_cumulative():
+    for seconds in (0.001, 0.003, 0.2, 0.2, 100.0):
+        metrics.record("scan", seconds)
+    metrics.record("scan", 0.04, error=True)
+
+    got = _samples(metrics.to_prometheus())
+    bucket = lambda le: got[f'investai_stage_seconds_bucket{{stage="scan",le="{le}"}}']
+
+    assert bucket("0.001") == 1                  # limite superiore incluso (le)
+    assert bucket("0.005") == 2
+    assert bucket("0.025") == 2
+    assert bucket("0.05") == 3
+    assert bucket("0.25") == 5
+    assert bucket("30.0") == 5
+    assert bucket("+Inf") == 6
+    assert got['investai_stage_seconds_count{stage="scan"}'] == 6
+    assert got['investai_stage_seconds_sum{stage="scan"}'] == pytest.approx(100.444)
+    assert got['investai_stage_errors_total{stage="scan"}'] == 1
+
+    les = [float(k.split('le="')[1][:-2]) for k in got if k.startswith("investai_stage_seconds_bucket")]
+    assert les == sorted(les) and len(les) == len(metrics.BUCKETS) + 1
+
+
+def test_prometheus_escapes_labels_and_types():
+    metrics.record('ui."page"\\x', 0.5)
+    text = metrics.to_prometheus()
+    assert 'stage="ui.\\"page\\"\\\\x"' in text
+    assert "# TYPE investai_stage_seconds histogram" in text
+    assert "# TYPE investai_stage_errors_total counter" in text
+
+
+def test_timed_records_only_when_enabled():
+    @metrics.timed("work")
+    def work(fail=False):
+        if fail:
+            raise ValueError("boom")
+
+    metrics.enable(False)
+    work()
+    assert metrics.snapshot() == {}
+
+    metrics.enable(True)
+    work()
+    with pytest.raises(ValueError):
+        work(fail=True)
+    with metrics.timed("work"):
+        pass
+    stage = metrics.snapshot()["work"]
+    assert stage["count"] == 3 and stage["errors"] == 1
+    assert stage["buckets"]["+Inf"] == 3
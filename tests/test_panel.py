@@ -0,0 +1,47 @@
+"""engine.panel: pannello vettoriale contro compute_indicators ticker per ticker."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from engine import panel
+from engine import indicators
+from engine.indicators import compute_indicators
+
+
+@pytest.mark.skipif(indicators._HAS_TA, reason="il pannello replica i fallback manuali, non pandas_ta")
+def test_panel_matches_compute_indicators():
+    frames = {
+        "AAA": synthetic_ohlcv(420, seed=1),
+        "BBB": synthetic_ohlcv(300, seed=2, start_price=25_000.0, sigma=0.6),
+        "CCC": synthetic_ohlcv(260, seed=3, start_price=1.0, sigma=0.05),
+        "DDD": synthetic_ohlcv(150, seed=4),                      # storico troppo corto
+    }
+    frames["AAA"].iloc[50, frames["AAA"].columns.get_loc("Volume")] = np.nan
+    res = panel.compute_indicators_frames(frames, history=True)
+    depth = res.history["SMA_200"].shape[0]
+
+    assert res.tickers == list(frames)
+    assert res.valid.tolist() == [True, True, True, False]
+    for j, t in enumerate(res.tickers[:3]):
+        ref = compute_indicators(frames[t])
+        rows = depth - len(frames[t]) + frames[t].index.get_indexer(ref.index)
+        for col in panel.PANEL_COLUMNS:
+            np.testing.assert_allclose(res.history[col][rows, j], ref[col].to_numpy(float),
+                                       rtol=1e-8, atol=1e-8, err_msg=f"{t} {col}")
+        snap = res.snapshot().loc[t]
+        assert np.allclose(snap[panel.PANEL_COLUMNS].to_numpy(float),
+                           ref[panel.PANEL_COLUMNS].iloc[-1].to_numpy(float), rtol=1e-8, equal_nan=True)
+
+
+def test_rolling_std_matches_pandas_with_gaps():
+    rng = np.random.default_rng(0)
+    x = rng.normal(1_000.0, 0.01, size=(400, 3))
+    x[:37, 1] = np.nan                                           # testa corta
+    x[120, 2] = np.nan                                           # buco isolato
+    x[200, 0] = np.inf
+    got = panel._rolling(x, 20, "std")
+    ref = pd.DataFrame(np.where(np.isinf(x), np.nan, x)).rolling(20).std().to_numpy()
+    np.testing.assert_allclose(got, ref, rtol=1e-7, atol=1e-12)
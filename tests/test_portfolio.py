@@ -0,0 +1,126 @@
+"""core.portfolio: posizioni materializzate aggiornate dai listener del registro, valore storico."""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from core import portfolio, storage
+
+
+def _tx(symbol, day, kind, qty, price=100.0):
+    return {"symbol": symbol, "date": day, "type": kind, "quantity": qty, "price": price, "fee": 0.0}
+
+
+@pytest.fixture
+def book(tx_store, monkeypatch):
+    """_PositionBook nuovo, unico listener del registro temporaneo."""
+    monkeypatch.setattr(storage, "_tx_listeners", [])
+    monkeypatch.setattr(portfolio, "cost_basis_method", lambda: "average")
+    fresh = portfolio._PositionBook()
+    storage.subscribe_transactions(fresh.on_change)
+    monkeypatch.setattr(portfolio, "_book", fresh)
+    return fresh
+
+
+def _replayed():
+    ledger, _ = portfolio._replay(storage.load_transactions(), "average")
+    return ledger.positions()
+
+
+def test_appends_update_positions_incrementally(book):
+    storage.add_transaction(_tx("AAA", "2024-01-02", "BUY", 10))
+    assert portfolio.get_positions()["AAA"]["qty"] == 10
+
+    rebuilt = book._ledger
+    storage.add_transaction(_tx("AAA", "2024-01-05", "BUY", 5, 110.0))
+    storage.add_transaction(_tx("AAA", "2024-01-09", "SELL", 3, 120.0))
+    storage.add_transaction(_tx("BBB", "2024-01-09", "BUY", 1))
+
+    assert book._ledger is rebuilt                    # nessun replay completo
+    assert portfolio.get_positions() == _replayed()
+
+
+def test_backdated_add_and_delete_trigger_replay(book):
+    storage.add_transaction(_tx("AAA", "2024-02-01", "BUY", 10))
+    assert portfolio.get_positions()["AAA"]["qty"] == 10
+
+    storage.add_transaction(_tx("AAA", "2024-01-01", "SELL", 4))
+    assert portfolio.get_positions() == _replayed()
+
+    first = storage.load_transactions()[0]
+    storage.delete_transaction(first["id"])
+    assert portfolio.get_positions() == _replayed()
+
+
+def test_add_committed_during_rebuild_is_applied_once(book, tx_store, monkeypatch):
+    storage.add_transaction(_tx("AAA", "2024-01-02", "BUY", 1))
+    real_load = portfolio.load_transactions
+    late = _tx("AAA", "2024-01-03", "BUY", 1)
+
+    def load_with_concurrent_add():
+        # Un'altra scrittura fa commit tra la lettura della versione e quella del registro
+        if "id" not in late:
+            late["id"] = tx_store.add(late)
+        return real_load()
+
+    monkeypatch.setattr(portfolio, "load_transactions", load_with_concurrent_add)
+    assert portfolio.get_positions()["AAA"]["qty"] == 2
+
+    storage._notify("add", dict(late))                # notifica arrivata dopo il rebuild
+    assert portfolio.get_positions()["AAA"]["qty"] == 2
+
+
+def _baseline_history(transactions, market_data):
+    """Simulazione giorno per giorno a costo medio (versione originale), con simboli in maiuscolo."""
+    df_tx = pd.DataFrame(transactions)
+    df_tx["date"] = pd.to_datetime(df_tx["date"])
+    df_tx = df_tx.sort_values("date", kind="stable")
+    date_range = pd.date_range(df_tx["date"].min().normalize(), pd.Timestamp.today().normalize(), freq="D")
+    symbols = list(dict.fromkeys(df_tx["symbol"].str.upper()))
+    prices = {s: (market_data[s]["Close"].reindex(date_range).ffill().bfill() if s in market_data
+                  else pd.Series(0.0, index=date_range)) for s in symbols}
+    state = {s: {"qty": 0.0, "cost": 0.0} for s in symbols}
+    by_day = df_tx.groupby(df_tx["date"].dt.normalize())
+    records = []
+    for day in date_range:
+        if day in by_day.groups:
+            for _, tx in by_day.get_group(day).iterrows():
+                pos, qty = state[tx["symbol"].upper()], float(tx["quantity"])
+                if tx["type"] == "BUY":
+                    pos["qty"] += qty
+                    pos["cost"] += qty * float(tx["price"]) + float(tx["fee"])
+                else:
+                    sold = min(qty, pos["qty"])
+                    if pos["qty"] > 1e-9:
+                        pos["cost"] = max(0.0, pos["cost"] - pos["cost"] / pos["qty"] * sold)
+                    pos["qty"] = max(0.0, pos["qty"] - sold)
+        values = {s: state[s]["qty"] * prices[s][day] for s in symbols}
+        records.append({"Total Value": sum(values.values()),
+                        "Total Invested": sum(p["cost"] for p in state.values()), **values})
+    return pd.DataFrame(records, index=date_range)
+
+
+def test_historical_value_matches_daily_loop():
+    frames = {"AAA": synthetic_ohlcv(200, seed=1, end="2024-06-28"),
+              "BBB": synthetic_ohlcv(200, seed=2, end="2024-06-28")}
+    txs = [
+        _tx("AAA", "2024-01-03", "BUY", 10, 90.0),
+        _tx("aaa", "2024-01-10", "BUY", 5, 95.0),         # stesso ticker, grafia diversa
+        _tx("BBB", "2024-01-10", "BUY", 4, 50.0),
+        _tx("Aaa", "2024-02-01", "SELL", 6, 110.0),        # vendita parziale
+        _tx("BBB", "2024-03-04", "SELL", 10, 60.0),        # vendita oltre la quantità posseduta
+        _tx("CCC", "2024-03-05", "BUY", 2, 10.0),          # nessun prezzo disponibile
+        _tx("AAA", "2024-04-02", "BUY", 3, 100.0),
+        _tx("BBB", "2024-05-06", "BUY", 1, 55.0),
+    ]
+    txs[1]["fee"] = 1.5
+
+    expected = _baseline_history(txs, frames)
+    got = portfolio.get_historical_portfolio_value(txs, frames, method="average")
+
+    assert list(got.columns) == ["Total Value", "Total Invested", "AAA", "BBB", "CCC"]
+    assert got.index.equals(expected.index)
+    for col in expected.columns:
+        np.testing.assert_allclose(got[col].to_numpy(), expected[col].to_numpy(), rtol=1e-12, err_msg=col)
@@ -0,0 +1,65 @@
+"""core.providers.FixtureProvider: errori e risposte parziali riproducibili dato il seme."""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fixtures import synthetic_ohlcv
+from core.providers import FixtureProvider
+
+NAMES = [f"T{i:02d}" for i in range(12)]
+# Ogni richiesta ripetuta due volte: la seconda ha un esito proprio (n-esima ripetizione nel seme)
+REQUESTS = [NAMES[i : i + 3] for i in range(0, len(NAMES), 3)] * 2 + [[t] for t in NAMES]
+
+
+def _provider(seed: int, failure_rate: float = 0.3, partial_rate: float = 0.3) -> FixtureProvider:
+    return FixtureProvider(factory=lambda t: synthetic_ohlcv(40, seed=int(t[1:])),
+                           failure_rate=failure_rate, partial_rate=partial_rate, seed=seed)
+
+
+def _outcome(provider: FixtureProvider, names: list[str]):
+    try:
+        df = provider.download(names if len(names) > 1 else names[0], period="1mo", group_by="ticker")
+    except ConnectionError:
+        return "error"
+    if len(names) == 1:
+        return "single"
+    return tuple(sorted(set(df.columns.get_level_values(0))))
+
+
+def _run(provider: FixtureProvider, order=None) -> dict:
+    out: dict = {}
+    for i in order or range(len(REQUESTS)):
+        out.setdefault(tuple(REQUESTS[i]), []).append(_outcome(provider, REQUESTS[i]))
+    return out
+
+
+def test_same_seed_same_failures():
+    first, second = _provider(seed=3), _provider(seed=3)
+    assert _run(first) == _run(second)
+    assert first.stats == second.stats
+    assert first.stats["failures"] > 0 and first.stats["dropped"] > 0
+    assert _run(_provider(seed=4)) != _run(_provider(seed=3))
+
+
+def test_outcomes_do_not_depend_on_thread_order():
+    expected = _run(_provider(seed=5))
+    provider = _provider(seed=5)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Ripetizioni della stessa richiesta nello stesso ordine relativo, richieste diverse mescolate
+        outcomes = list(pool.map(lambda i: (i, _outcome(provider, REQUESTS[i])), reversed(range(len(REQUESTS)))))
+    got: dict = {}
+    for i, res in sorted(outcomes, key=lambda x: x[0]):
+        got.setdefault(tuple(REQUESTS[i]), []).append(res)
+    assert {k: sorted(v, key=repr) for k, v in got.items()} == {k: sorted(v, key=repr) for k, v in expected.items()}
+
+
+def test_rates_are_respected():
+    base = synthetic_ohlcv(40, seed=1)
+    provider = FixtureProvider(factory=lambda t: base, failure_rate=0.25, seed=0)
+    failures = sum(_outcome(provider, [f"X{i}", f"Y{i}"]) == "error" for i in range(400))
+    assert 60 <= failures <= 140
+
+    provider = FixtureProvider(factory=lambda t: base, partial_rate=0.5, seed=0)
+    kept = sum(len(_outcome(provider, [f"X{i}", f"Y{i}"])) for i in range(200))
+    assert 140 <= kept <= 260
+    assert provider.stats["dropped"] == 400 - kept
@@ -0,0 +1,58 @@
+"""engine.scan: percorso seriale e pool di processi danno gli stessi risultati e condividono la cache indicatori."""
+from __future__ import annotations
+
+from dataclasses import asdict
+
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from engine import indicators, scan
+
+
+@pytest.fixture
+def frames():
+    indicators.clear_indicator_cache()
+    data = {f"T{i:02d}": synthetic_ohlcv(320, seed=100 + i) for i in range(8)}
+    data["SHORT"] = synthetic_ohlcv(50, seed=99)   # dati insufficienti: saltato
+    yield data
+    indicators.clear_indicator_cache()
+
+
+def _summary(results) -> list[dict]:
+    # repr: i campi NaN restano confrontabili
+    return [{k: repr(v) for k, v in asdict(r).items()} for r in results]
+
+
+def test_parallel_matches_serial(frames, monkeypatch):
+    monkeypatch.setattr(scan, "_MIN_PARALLEL", 1)
+    serial = _summary(scan.scan_universe(frames, workers=1, ordered=True))
+    indicators.clear_indicator_cache()
+    try:
+        parallel = _summary(scan.scan_universe(frames, workers=2, ordered=True))
+        # I frame calcolati nei worker riempiono la cache del processo principale
+        for t in frames:
+            if t != "SHORT":
+                hit, df_ind = indicators.cached_indicators(frames[t], t)
+                assert hit and df_ind is not None
+        again = _summary(scan.scan_universe(frames, workers=2, ordered=True))
+        unordered = _summary(scan.scan_universe(frames, workers=2))
+    finally:
+        scan.shutdown_pool()
+
+    assert [r["ticker"] for r in serial] == [repr(t) for t in frames if t != "SHORT"]
+    assert parallel == serial
+    assert again == serial
+    assert sorted(unordered, key=lambda r: r["ticker"]) == serial
+
+
+def test_failing_ticker_is_skipped(frames, monkeypatch):
+    real = scan.analyze
+
+    def flaky(df_ind, ticker, asset_type="Azione"):
+        if ticker == "T03":
+            raise ValueError("boom")
+        return real(df_ind, ticker, asset_type)
+
+    monkeypatch.setattr(scan, "analyze", flaky)
+    got = [r.ticker for r in scan.scan_universe(frames, workers=1, ordered=True)]
+    assert got == [t for t in frames if t not in ("T03", "SHORT")]
@@ -0,0 +1,127 @@
+"""Cache dei JSON di core.storage: rivalidazione per firma e letture concorrenti."""
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from core import storage
+
+
+@pytest.fixture
+def json_file(tmp_path, monkeypatch):
+    path = tmp_path / "settings.json"
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setitem(storage._locks, path, threading.Lock())
+    yield path
+    storage._json_cache.pop(path, None)
+
+
+def test_write_then_read_sees_new_data(json_file):
+    storage._write(json_file, {"v": 1})
+    assert storage._read(json_file, {}) == {"v": 1}
+    storage._write(json_file, {"v": 2})
+    assert storage._read(json_file, {}) == {"v": 2}
+
+
+def test_external_change_invalidates_cache(json_file):
+    storage._write(json_file, {"v": 1})
+    assert storage._read(json_file, {}) == {"v": 1}
+    json_file.write_text('{"v": 2, "extra": true}', encoding="utf-8")   # altro processo
+    assert storage._read(json_file, {}) == {"v": 2, "extra": True}
+
+
+def test_read_returns_copy(json_file):
+    storage._write(json_file, {"items": [1, 2]})
+    storage._read(json_file, {})["items"].append(3)
+    assert storage._read(json_file, {}) == {"items": [1, 2]}
+
+
+def test_write_during_read_is_not_cached_under_old_signature(json_file, monkeypatch):
+    storage._write(json_file, {"v": 1})
+    storage._json_cache.pop(json_file, None)
+
+    real_load = storage.json.load
+
+    def load_then_write(f):
+        data = real_load(f)
+        storage._write(json_file, {"v": 2})      # scrittura tra la stat e il salvataggio in cache
+        return data
+
+    monkeypatch.setattr(storage.json, "load", load_then_write)
+    assert storage._read_shared(json_file, {}) == {"v": 1}
+    monkeypatch.setattr(storage.json, "load", real_load)
+
+    cached_sig, cached = storage._json_cache[json_file]
+    assert cached_sig == storage._stat_signature(json_file)
+    assert cached == {"v": 2}
+    assert storage._read(json_file, {}) == {"v": 2}
+
+
+def test_concurrent_readers_and_writer_converge(json_file):
+    storage._write(json_file, {"v": 0})
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            storage._read_shared(json_file, {})
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(1, 200):
+        storage._write(json_file, {"v": i})
+    stop.set()
+    for t in threads:
+        t.join()
+    assert storage._read(json_file, {}) == {"v": 199}
+
+
+@pytest.fixture
+def snapshot_file(tmp_path, monkeypatch):
+    path = tmp_path / "scan_snapshot.json"
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(storage, "_FILE_SCAN_SNAPSHOT", path)
+    monkeypatch.setitem(storage._locks, path, threading.Lock())
+    yield path
+    storage._json_cache.pop(path, None)
+
+
+def test_update_scan_snapshot_is_not_overwritten_by_concurrent_save(snapshot_file):
+    storage.save_scan_snapshot({"tickers": ["AAA", "BBB"], "gen": 1})
+    inside, release = threading.Event(), threading.Event()
+
+    def drop_aaa(raw):
+        inside.set()
+        release.wait(5)
+        raw["tickers"] = [t for t in raw["tickers"] if t != "AAA"]
+        return raw
+
+    updater = threading.Thread(target=storage.update_scan_snapshot, args=(drop_aaa,))
+    updater.start()
+    assert inside.wait(5)
+    # Il nuovo snapshot del warmup attende la fine della lettura-modifica-scrittura
+    writer = threading.Thread(target=storage.save_scan_snapshot, args=({"tickers": ["CCC"], "gen": 2},))
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+    release.set()
+    updater.join()
+    writer.join()
+
+    assert storage.load_scan_snapshot() == {"tickers": ["CCC"], "gen": 2}
+
+
+def test_discard_drops_tickers_from_snapshot(snapshot_file):
+    from engine.snapshot import discard
+
+    storage.save_scan_snapshot({
+        "tickers": ["AAA", "BBB"],
+        "results": {"AAA": {}, "BBB": {}},
+        "advice":  {"AAA": {}},
+    })
+    discard(["aaa"])
+    assert storage.load_scan_snapshot() == {"tickers": ["BBB"], "results": {"BBB": {}}, "advice": {}}
+
+    discard()
+    assert storage.load_scan_snapshot() == {"tickers": [], "results": {}, "advice": {}}
@@ -0,0 +1,24 @@
+"""engine.sweep: classifica in-sample, metriche out-of-sample solo per le combinazioni selezionate."""
+from __future__ import annotations
+
+from benchmarks.fixtures import synthetic_ohlcv
+from engine.sweep import run_sweep
+
+GRID = {"rsi_max": [40, 50, 60], "require_trend": [False], "cooldown_days": [1, 5],
+        "horizon": [10, 20], "min_score": [0]}
+
+
+def test_ranked_in_sample_oos_only_for_selected():
+    frames = {f"T{i}": synthetic_ohlcv(700, seed=200 + i) for i in range(4)}
+    table = run_sweep(frames, grid=GRID, workers=1, min_trades=5, top_k=3)
+
+    assert len(table) == 12
+    eligible = table[table["eligible"]]
+    assert list(eligible.index) == list(range(len(eligible)))   # idonee in testa
+    t_stats = eligible["is_t_stat"].tolist()
+    assert t_stats == sorted(t_stats, reverse=True)
+
+    selected = table["selected"]
+    assert selected.sum() == min(3, len(eligible))
+    assert table.loc[selected, "oos_trades"].notna().all()
+    assert table.loc[~selected, [c for c in table.columns if c.startswith("oos_")]].isna().all().all()
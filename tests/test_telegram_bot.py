@@ -0,0 +1,94 @@
+"""telegram.bot: deduplica dei comandi pesanti, risposte recenti e limite di richieste in coda."""
+from __future__ import annotations
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("schedule")
+from telegram import bot as tg  # noqa: E402
+
+
+class _FakeBot:
+    def __init__(self):
+        self.sent: list[tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        with self._lock:
+            self.sent.append((str(chat_id), text))
+
+    def texts_for(self, chat_id):
+        with self._lock:
+            return [t for c, t in self.sent if c == chat_id]
+
+
+@pytest.fixture
+def heavy(monkeypatch):
+    """Stato dei comandi pesanti isolato; i calcoli bloccati vengono sempre rilasciati."""
+    monkeypatch.setattr(tg, "_inflight", {})
+    monkeypatch.setattr(tg, "_recent", {})
+    gates: list[threading.Event] = []
+
+    def blocking(text, calls):
+        gate = threading.Event()
+        gates.append(gate)
+
+        def compute():
+            calls.append(text)
+            gate.wait(10)
+            return text
+        return compute, gate
+
+    yield blocking
+    for gate in gates:
+        gate.set()
+    _wait_idle()
+
+
+def _wait_idle(timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with tg._heavy_lock:
+            if not tg._inflight:
+                return True
+        time.sleep(0.01)
+    return False
+
+
+def test_same_command_runs_once_for_all_chats(heavy):
+    b, calls = _FakeBot(), []
+    compute, gate = heavy("report", calls)
+    for chat in ("A", "B", "A"):
+        tg._dispatch_heavy(b, chat, ("mercato",), compute, "ack")
+    gate.set()
+    assert _wait_idle()
+
+    assert calls == ["report"]
+    assert b.texts_for("A")[0] == "ack"
+    assert b.texts_for("A").count("report") == 1
+    assert b.texts_for("B")[-1] == "report"
+
+    # Risposta recente: riusata subito, senza ricalcolo
+    tg._dispatch_heavy(b, "C", ("mercato",), compute, "ack")
+    assert b.texts_for("C") == ["report"]
+    assert calls == ["report"]
+
+
+def test_pending_commands_are_capped(heavy, monkeypatch):
+    monkeypatch.setattr(tg, "_MAX_PENDING", 2)
+    b, calls = _FakeBot(), []
+    for i in range(2):
+        compute, _ = heavy(f"r{i}", calls)
+        tg._dispatch_heavy(b, "A", ("portafoglio", i), compute, "ack")
+
+    refused, _ = heavy("r2", calls)
+    tg._dispatch_heavy(b, "B", ("portafoglio", 2), refused, "ack")
+    assert b.texts_for("B") == ["⚠️ Troppe richieste in corso, riprova tra poco."]
+    assert ("portafoglio", 2) not in tg._inflight
+
+    # Una chat che si aggiunge a un comando già in corso non conta nel limite
+    tg._dispatch_heavy(b, "B", ("portafoglio", 0), refused, "ack")
+    assert tg._inflight[("portafoglio", 0)] == ["A", "B"]
+    assert "r2" not in calls
@@ -0,0 +1,137 @@
+"""Registro transazioni: migrazione dal JSON legacy, versioni, modifiche multiple."""
+from __future__ import annotations
+
+import json
+
+import pytest
+
+from core import storage
+from core.tx_store import SqliteTransactionStore
+
+LEGACY = [
+    {"id": 3, "symbol": "AAPL", "date": "2024-01-02", "type": "BUY", "quantity": 10, "price": 185.5, "fee": 1.0},
+    {"id": 7, "symbol": "MSFT", "date": "2024-02-01", "type": "BUY", "quantity": 2.5, "price": 400.0,
+     "fee": 0.0, "note": "campo extra"},
+    {"id": 9, "symbol": "AAPL", "date": "2024-03-01", "type": "SELL", "quantity": 4, "price": 170.0, "fee": 1.0},
+]
+
+
+def _write_legacy(path, rows):
+    path.write_text(json.dumps(rows), encoding="utf-8")
+
+
+def test_legacy_json_round_trip(tmp_path):
+    src = tmp_path / "transactions.json"
+    _write_legacy(src, LEGACY)
+    store = SqliteTransactionStore(tmp_path / "transactions.db", legacy_json=src)
+    try:
+        loaded = store.load()
+    finally:
+        store.close()
+
+    assert loaded == [{**t, "quantity": float(t["quantity"]), "price": float(t["price"]),
+                       "fee": float(t["fee"])} for t in LEGACY]
+    assert not src.exists()
+    assert (tmp_path / "transactions.json.migrated").exists()
+
+    # Riapertura: nessuna seconda importazione, dati persistiti
+    store = SqliteTransactionStore(tmp_path / "transactions.db", legacy_json=src)
+    try:
+        assert store.load() == loaded
+        assert store.version() == 1
+    finally:
+        store.close()
+
+
+def test_legacy_rows_without_id_get_one(tmp_path):
+    src = tmp_path / "transactions.json"
+    _write_legacy(src, [LEGACY[0], {k: v for k, v in LEGACY[1].items() if k != "id"}])
+    store = SqliteTransactionStore(tmp_path / "transactions.db", legacy_json=src)
+    try:
+        ids = [t["id"] for t in store.load()]
+    finally:
+        store.close()
+    assert ids == [3, 4]
+
+
+def test_empty_legacy_file_is_left_alone(tmp_path):
+    src = tmp_path / "transactions.json"
+    _write_legacy(src, [])
+    store = SqliteTransactionStore(tmp_path / "transactions.db", legacy_json=src)
+    try:
+        assert store.load() == []
+    finally:
+        store.close()
+    assert src.exists()
+
+
+def test_version_bumps_on_every_write(tx_store):
+    v0 = tx_store.version()
+    tx_id = tx_store.add(dict(LEGACY[0]))
+    v1 = tx_store.version()
+    assert v1 == v0 + 1
+
+    assert tx_store.apply_changes({tx_id: {"price": 190.0}}) == (1, 0)
+    v2 = tx_store.version()
+    assert v2 == v1 + 1
+
+    # Nessuna riga toccata → nessun bump
+    assert tx_store.apply_changes({999: {"price": 1.0}}, [998]) == (0, 0)
+    assert tx_store.version() == v2
+
+    assert tx_store.apply_changes({}, [tx_id]) == (0, 1)
+    assert tx_store.version() == v2 + 1
+
+    tx_store.replace_all(LEGACY)
+    assert tx_store.version() == v2 + 2
+
+
+def test_apply_changes_merges_fields(tx_store):
+    tx_store.replace_all(LEGACY)
+    assert tx_store.apply_changes({7: {"quantity": 3}}, [9]) == (1, 1)
+    rows = {t["id"]: t for t in tx_store.load()}
+    assert set(rows) == {3, 7}
+    assert rows[7]["quantity"] == 3.0
+    assert rows[7]["note"] == "campo extra"
+    assert rows[7]["symbol"] == "MSFT"
+
+
+def test_bulk_edit_unchanged_rows_is_noop(tx_store):
+    storage.save_transactions([dict(t) for t in LEGACY])
+    version = storage.ledger_version()
+
+    # La griglia restituisce int dove il registro ha float (e viceversa): nessuna modifica
+    grid = {t["id"]: {k: v for k, v in t.items() if k != "id"} for t in LEGACY}
+    grid[3]["quantity"] = 10
+    grid[7]["quantity"] = 2.5
+    grid[9]["price"] = 170
+    assert storage.bulk_edit_transactions([], grid) == (0, 0)
+    assert storage.ledger_version() == version
+
+
+def test_bulk_edit_writes_only_changed_rows(tx_store):
+    storage.save_transactions([dict(t) for t in LEGACY])
+    version = storage.ledger_version()
+
+    grid = {t["id"]: {k: v for k, v in t.items() if k != "id"} for t in LEGACY}
+    grid[7]["price"] = 410.0
+    grid[9]["price"] = 999.0          # cancellata: la modifica viene ignorata
+    assert storage.bulk_edit_transactions([9, 12345], grid) == (1, 1)
+    assert storage.ledger_version() == version + 1
+    rows = {t["id"]: t for t in storage.load_transactions()}
+    assert set(rows) == {3, 7}
+    assert rows[7]["price"] == 410.0
+
+
+@pytest.mark.parametrize("a, b, same", [
+    (10, 10.0, True),
+    (0.1 + 0.2, 0.3, True),
+    (185.5, 185.50000000001, True),
+    (185.5, 185.51, False),
+    (0, 1e-12, True),
+    ("AAPL", "AAPL", True),
+    ("10", 10, False),
+    (None, 0, False),
+])
+def test_same_value(a, b, same):
+    assert storage._same_value(a, b) is same
@@ -0,0 +1,57 @@
+"""engine.warmup: un refresh in corso non ripubblica i ticker invalidati nel frattempo."""
+from __future__ import annotations
+
+import pytest
+
+from benchmarks.fixtures import synthetic_ohlcv
+from engine import warmup
+
+TICKERS = ["AAA", "BBB"]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    svc = warmup.WarmupService()
+    snapshots = []
+    monkeypatch.setattr(warmup.WarmupService, "universe", staticmethod(lambda: list(TICKERS)))
+    monkeypatch.setattr(warmup, "scan_cached", lambda *a, **k: iter(()))
+    monkeypatch.setattr(warmup, "get_positions", lambda: {})
+    monkeypatch.setattr(warmup, "write_snapshot", lambda tickers, *a: snapshots.append(list(tickers)))
+    svc.snapshots = snapshots
+    return svc
+
+
+def _download_then(monkeypatch, action):
+    """get_data_raw che esegue `action` a metà download (prima della pubblicazione)."""
+    def fake(tickers):
+        action()
+        return {t: synthetic_ohlcv(60, seed=i) for i, t in enumerate(tickers)}
+    monkeypatch.setattr(warmup, "get_data_raw", fake)
+
+
+def test_refresh_publishes_snapshot(service, monkeypatch):
+    _download_then(monkeypatch, lambda: None)
+    service.refresh()
+    assert set(service.frames_for(TICKERS)) == set(TICKERS)
+    assert service.snapshots == [TICKERS]
+
+
+def test_invalidated_ticker_not_republished(service, monkeypatch):
+    _download_then(monkeypatch, lambda: service.invalidate(["aaa"]))
+    service.refresh()
+    assert service.frames_for(["AAA"]) is None
+    assert set(service.frames_for(["BBB"])) == {"BBB"}
+    assert service.snapshots == [["BBB"]]
+
+
+def test_full_invalidation_discards_cycle(service, monkeypatch):
+    _download_then(monkeypatch, lambda: None)
+    service.refresh()
+    _download_then(monkeypatch, lambda: service.invalidate())
+    service.refresh()
+    assert service.frames_for(["BBB"]) is None
+    assert service.snapshots == [TICKERS]
+    # Il ciclo successivo, senza invalidazioni, ripubblica tutto
+    _download_then(monkeypatch, lambda: None)
+    service.refresh()
+    assert set(service.frames_for(TICKERS)) == set(TICKERS)